@@ -35,10 +35,13 @@ import inspect
 import types
 import threading
 
+# For --profile-startup
+_boot_start = time.perf_counter()
+_startup_times = [] # (what, seconds)
+
 import pox.core
 core = None
 
-import pox.openflow
 from pox.lib.util import str_to_bool, first_of
 
 # Function to run on main thread
@@ -124,9 +127,11 @@ def _do_imports (components):
   done = {}
   for name in components:
     if name in done: continue
+    start = time.perf_counter()
     r = _do_import(name)
     if r is False:
       return False
+    _startup_times.append(("import " + name, time.perf_counter() - start))
     members = dict(inspect.getmembers(sys.modules[r]))
     done[name] = (r,sys.modules[r],members)
 
@@ -164,11 +169,16 @@ def _do_launch (argv, skip_startup=False):
       core = pox.core.core
       core.getLogger('boot').debug('Using existing POX core')
     else:
+      start = time.perf_counter()
       core = pox.core.initialize(_options.threaded_selecthub,
                                  _options.epoll_selecthub,
-                                 _options.handle_signals)
+                                 _options.handle_signals,
+                                 _options.asyncio)
+      _startup_times.append(("initialize core", time.perf_counter() - start))
 
+    start = time.perf_counter()
     _pre_startup()
+    _startup_times.append(("pre-startup", time.perf_counter() - start))
 
   modules = _do_imports(n.split("=")[0].split(':')[0] for n in component_order)
   if modules is False:
@@ -232,9 +242,12 @@ def _do_launch (argv, skip_startup=False):
           pparams = (first_arg,)
         else:
           pparams = ()
+        start = time.perf_counter()
         if f(*pparams, **params) is False:
           # Abort startup
           return False
+        _startup_times.append(("launch " + cname,
+                               time.perf_counter() - start))
       except TypeError as exc:
         instText = ''
         if inst[cname] > 0:
@@ -351,6 +364,10 @@ Notable POX options include:
   --verbose       Print more debugging information (especially useful for
                   problems on startup)
   --no-openflow   Don't automatically load the OpenFlow module
+  --asyncio       Run the core scheduler on an asyncio event loop (uses
+                  uvloop if it's installed)
+  --profile-startup
+                  Log how long it took to import and launch each component
   --log-config=F  Load a Python log configuration file (if you include the
                   option without specifying F, it defaults to logging.cfg)
 
@@ -374,6 +391,8 @@ class POXOptions (Options):
     self.threaded_selecthub = True
     self.epoll_selecthub = False
     self.handle_signals = True
+    self.asyncio = False
+    self.profile_startup = False
 
   def _set_h (self, given_name, name, value):
     self._set_help(given_name, name, value)
@@ -436,6 +455,8 @@ def _pre_startup ():
     logging.getLogger().setLevel(logging.DEBUG)
 
   if _options.enable_openflow:
+    # (Only imported if it's wanted, since it pulls in a lot.)
+    import pox.openflow
     pox.openflow._launch() # Default OpenFlow launch
 
 
@@ -450,6 +471,23 @@ def _post_startup ():
       logging.getLogger("boot").debug("Not launching of_01")
 
 
+def _log_startup_times ():
+  """
+  Logs the times collected for --profile-startup
+
+  A component's import time includes that of any modules it was the first
+  to import (e.g., the first OpenFlow component pays for the OpenFlow
+  library).
+  """
+  lines = ["Startup times:"]
+  for what,t in _startup_times:
+    lines.append("  %-50s %8.1f ms" % (what, t * 1000))
+  lines.append("  %-50s %8.1f ms" % ("Total (since POX was imported)",
+                                     (time.perf_counter() - _boot_start)
+                                     * 1000))
+  logging.getLogger("boot").info("\n".join(lines))
+
+
 
 def _setup_logging ():
   # First do some basic log config...
@@ -521,9 +559,17 @@ def boot (argv = None):
         break
     argv = pre + "py --disable".split() + argv
 
+    _startup_times.append(("import POX core", time.perf_counter()
+                                              - _boot_start))
     if _do_launch(argv):
+      start = time.perf_counter()
       _post_startup()
+      _startup_times.append(("post-startup", time.perf_counter() - start))
+      start = time.perf_counter()
       core.goUp()
+      _startup_times.append(("go up", time.perf_counter() - start))
+      if _options.profile_startup:
+        _log_startup_times()
     else:
       #return
       quiet = True
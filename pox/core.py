@@ -29,6 +29,7 @@ import inspect
 import time
 import os
 import signal
+import types
 
 _path = inspect.stack()[0][1]
 _ext_path = _path[0:_path.rindex(os.sep)]
@@ -180,6 +181,38 @@ class RereadConfiguration (Event):
   pass
 
 import pox.lib.recoco as recoco
+from collections import deque
+
+
+class _Waiter (object):
+  """
+  A callback waiting for components (see POXCore.call_when_ready())
+  """
+  __slots__ = ['callback', 'name', 'components', 'args', 'kw', 'missing',
+               'requested']
+
+  def __init__ (self, callback, name, components, args, kw, missing):
+    self.callback = callback
+    self.name = name
+    self.components = components
+    self.args = args
+    self.kw = kw
+    self.missing = missing # Components not registered yet
+    self.requested = time.time()
+
+
+# Component names that a class's _handle_component_event methods refer to
+# (see POXCore.listen_to_dependencies())
+_handler_dependency_cache = {}
+
+def _handler_dependencies (names):
+  components = set()
+  for c in names:
+    if not c.startswith("_handle_"): continue
+    if c.count("_") < 3: continue
+    components.add('_'.join(c.split("_")[2:-1]))
+  return components
+
 
 class POXCore (EventMixin):
   """
@@ -213,8 +246,12 @@ class POXCore (EventMixin):
   version = (0,7,0)
   version_name = "gar"
 
+  # How many satisfied call_when_ready() callbacks to remember for
+  # dependency_graph()
+  dependency_log_size = 1000
+
   def __init__ (self, threaded_selecthub=True, epoll_selecthub=False,
-                handle_signals=True):
+                handle_signals=True, use_asyncio=False):
     self.debug = False
     self.running = True
     self.starting_up = True
@@ -230,11 +267,23 @@ class POXCore (EventMixin):
 
     print(self.banner)
 
-    self.scheduler = recoco.Scheduler(daemon=True,
-                                      threaded_selecthub=threaded_selecthub,
-                                      use_epoll=epoll_selecthub)
-
-    self._waiters = [] # List of waiting components
+    if use_asyncio:
+      from pox.lib.recoco.asyncio_scheduler import AsyncioScheduler
+      scheduler_class = AsyncioScheduler
+    else:
+      scheduler_class = recoco.Scheduler
+    self.scheduler = scheduler_class(daemon=True,
+                                     threaded_selecthub=threaded_selecthub,
+                                     use_epoll=epoll_selecthub)
+
+    # Waiting callbacks (as dict keys, so they stay in order)
+    self._waiters = {}
+    # Component name -> list of _Waiters which are waiting for it
+    self._waiting_on = {}
+    # Startup dependency timing (see dependency_graph())
+    self._created = time.time()
+    self._registered_at = {'core':self._created} # Component name -> time
+    self._dependency_log = deque(maxlen=self.dependency_log_size)
 
   @property
   def banner (self):
@@ -281,6 +330,16 @@ class POXCore (EventMixin):
     """
     _self.scheduler.callLater(_func, *args, **kw)
 
+  def call_later_many (self, calls):
+    """
+    Like call_later(), but for a bunch of calls at once
+
+    Each of calls is a callable or a tuple of (callable, args[, kw]).  This
+    is cheaper than calling call_later() for each of them when you have a
+    lot to submit from another thread.
+    """
+    self.scheduler.callLaterMany(calls)
+
   def raiseLater (_self, _obj, *args, **kw):
     # first arg is `_self` rather than `self` in case the user wants
     # to specify self as a keyword argument
@@ -445,18 +504,11 @@ class POXCore (EventMixin):
 
   def _waiter_notify (self):
     if len(self._waiters):
-      waiting_for = set()
-      for entry in self._waiters:
-        _, name, components, _, _ = entry
-        components = [c for c in components if not self.hasComponent(c)]
-        waiting_for.update(components)
-        log.debug("%s still waiting for: %s"
-                  % (name, " ".join(components)))
-      names = set([n for _,n,_,_,_ in self._waiters])
-
-      #log.info("%i things still waiting on %i components"
-      #         % (names, waiting_for))
-      log.warn("Still waiting on %i component(s)" % (len(waiting_for),))
+      if log.isEnabledFor(logging.DEBUG):
+        for w in self._waiters:
+          log.debug("%s still waiting for: %s"
+                    % (w.name, " ".join(sorted(w.missing))))
+      log.warn("Still waiting on %i component(s)" % (len(self._waiting_on),))
 
   def hasComponent (self, name):
     """
@@ -500,9 +552,11 @@ class POXCore (EventMixin):
 
     if name in self.components:
       log.warn("Warning: Registered '%s' multipled times" % (name,))
+    else:
+      self._registered_at[name] = time.time()
     self.components[name] = component
     self.raiseEventNoErrors(ComponentRegistered, name, component)
-    self._try_waiters()
+    self._wake_waiters(name)
 
   def call_when_ready (self, callback, components=[], name=None, args=(),
                        kw={}):
@@ -533,30 +587,38 @@ class POXCore (EventMixin):
           name = getattr(callback.__self__.__class__,'__name__','')+'.'+name
       if hasattr(callback, '__module__'):
         # Is this a good idea?  If not here, we should do it in the
-        # exception printing in try_waiter().
+        # exception printing in _run_waiter().
         name += " in " + callback.__module__
-    entry = (callback, name, components, args, kw)
-    self._waiters.append(entry)
-    self._try_waiter(entry)
+    missing = set(c for c in components if not self.hasComponent(c))
+    w = _Waiter(callback, name, components, args, kw, missing)
+    if not missing:
+      self._run_waiter(w)
+      return
+    self._waiters[w] = None
+    for c in missing:
+      self._waiting_on.setdefault(c, []).append(w)
 
-  def _try_waiter (self, entry):
+  def _wake_waiters (self, name):
     """
-    Tries a waiting callback.
-
-    Calls the callback, removes from _waiters, and returns True if
-    all are satisfied.
+    Runs the waiting callbacks which were only waiting for name
     """
-    if entry not in self._waiters:
-      # Already handled
-      return
-    callback, name, components, args_, kw_ = entry
-    for c in components:
-      if not self.hasComponent(c):
-        return False
-    self._waiters.remove(entry)
+    waiters = self._waiting_on.pop(name, None)
+    if not waiters: return
+    for w in waiters:
+      w.missing.discard(name)
+      if not w.missing:
+        del self._waiters[w]
+        self._run_waiter(w)
+
+  def _run_waiter (self, w):
+    """
+    Calls a waiting callback whose components are all ready
+    """
+    start = time.time()
+    callback, name = w.callback, w.name
     try:
       if callback is not None:
-        callback(*args_,**kw_)
+        callback(*w.args,**w.kw)
     except:
       import traceback
       msg = "Exception while trying to notify " + name
@@ -567,19 +629,65 @@ class POXCore (EventMixin):
       except:
         pass
       log.exception(msg)
-    return True
+    self._dependency_log.append((w.name, w.components, w.requested, start,
+                                 time.time() - start))
 
-  def _try_waiters (self):
+  def dependency_graph (self):
     """
-    Tries to satisfy all component-waiting callbacks
+    Returns startup dependency timing as a JSON-friendly dictionary
+
+    "components" maps each registered component to when it was registered
+    and "waiters" lists call_when_ready() callbacks (including those from
+    listen_to_dependencies()), each with the components it depended on,
+    when it was requested, when it was run (None if it's still waiting),
+    and how long it took to run.  Times are in seconds since core was
+    created.  Only the last dependency_log_size callbacks which ran are
+    included.  See also dependency_dot().
     """
-    changed = True
+    t0 = self._created
+    waiters = []
+    for name,components,requested,ready,run_time in self._dependency_log:
+      waiters.append(dict(name=name, depends_on=list(components),
+                          requested=requested-t0, ready=ready-t0,
+                          run_time=run_time))
+    for w in self._waiters:
+      waiters.append(dict(name=w.name, depends_on=list(w.components),
+                          requested=w.requested-t0, ready=None,
+                          run_time=None, missing=sorted(w.missing)))
+    return dict(
+        components = {n:t-t0 for n,t in self._registered_at.items()},
+        waiters = waiters)
+
+  def dependency_dot (self):
+    """
+    Returns the dependency graph in Graphviz "dot" format
 
-    while changed:
-      changed = False
-      for entry in list(self._waiters):
-        if self._try_waiter(entry):
-          changed = True
+    Edges go from callbacks to the components they waited for, and are
+    labeled with how long the callback ended up waiting for that component
+    (from when it was requested until the component was registered).
+    """
+    g = self.dependency_graph()
+    components = g['components']
+    lines = ["digraph dependencies {"]
+    for n,t in sorted(components.items(), key=lambda x: x[1]):
+      lines.append('  "%s" [shape=box label="%s\\n@%.3fs"];' % (n, n, t))
+    for i,w in enumerate(g['waiters']):
+      node = "w%i" % (i,)
+      if w['ready'] is None:
+        label = "%s\\nwaiting" % (w['name'],)
+      else:
+        label = "%s\\n@%.3fs (%.1fms)" % (w['name'], w['ready'],
+                                            w['run_time'] * 1000)
+      lines.append('  %s [label="%s"];' % (node, label.replace('"', "'")))
+      for c in w['depends_on']:
+        if c in components:
+          wait = max(0, components[c] - w['requested'])
+          lines.append('  %s -> "%s" [label="%.1fms"];'
+                       % (node, c, wait * 1000))
+        else:
+          lines.append('  %s -> "%s" [style=dashed];' % (node, c))
+    lines.append("}")
+    return "\n".join(lines) + "\n"
 
   def listen_to_dependencies (self, sink, components=None, attrs=True,
                               short_attrs=False, listen_args={}):
@@ -611,11 +719,18 @@ class POXCore (EventMixin):
     else:
       components = set(components)
 
-    for c in dir(sink):
-      if not c.startswith("_handle_"): continue
-      if c.count("_") < 3: continue
-      c = '_'.join(c.split("_")[2:-1])
-      components.add(c)
+    if isinstance(sink, (type, types.ModuleType)):
+      components.update(_handler_dependencies(dir(sink)))
+    else:
+      # Handler names on the class don't change, so just look them up once
+      # per class (but also check the instance itself)
+      cls = type(sink)
+      deps = _handler_dependency_cache.get(cls)
+      if deps is None:
+        deps = frozenset(_handler_dependencies(dir(cls)))
+        _handler_dependency_cache[cls] = deps
+      components.update(deps)
+      components.update(_handler_dependencies(getattr(sink, '__dict__', ())))
 
     if None in listen_args:
       # This means add it to all...
@@ -664,11 +779,12 @@ class POXCore (EventMixin):
 core = None
 
 def initialize (threaded_selecthub=True, epoll_selecthub=False,
-                handle_signals=True):
+                handle_signals=True, use_asyncio=False):
   global core
   core = POXCore(threaded_selecthub=threaded_selecthub,
                  epoll_selecthub=epoll_selecthub,
-                 handle_signals=handle_signals)
+                 handle_signals=handle_signals,
+                 use_asyncio=use_asyncio)
   return core
 
 # The below is a big hack to make tests and doc tools work.
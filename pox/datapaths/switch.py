@@ -61,15 +61,46 @@ class DpPacketOut (Event):
     self.switch = node # For backwards compatability
 
 
+def _flow_cache_key (packet, in_port):
+  """
+  Returns a microflow cache key for a packet
+
+  The key holds (at least) every header field that ofp_match.from_packet()
+  looks at, so packets with the same key get the same flow table entry.
+  Building it is much cheaper than building a match.
+  """
+  p = packet.next
+  key = [in_port, packet.src, packet.dst, packet.type]
+  if isinstance(p, llc):
+    key.append((llc, p.has_snap, p.oui, p.eth_type))
+    p = p.next
+  if isinstance(p, vlan):
+    key.append((vlan, p.id, p.pcp, p.eth_type))
+    p = p.next
+  if isinstance(p, ipv4):
+    key.append((ipv4, p.srcip, p.dstip, p.protocol, p.tos,
+                bool(p.flags & p.MF_FLAG) or p.frag != 0))
+    p = p.next
+    if isinstance(p, (udp, tcp)):
+      key.append((udp, p.srcport, p.dstport))
+    elif isinstance(p, icmp):
+      key.append((icmp, p.type, p.code))
+  elif isinstance(p, arp):
+    key.append((arp, p.opcode, p.protosrc, p.protodst))
+  return tuple(key)
+
+
 class SoftwareSwitchBase (object):
   def __init__ (self, dpid, name=None, ports=4, miss_send_len=128,
-                max_buffers=100, max_entries=0x7fFFffFF, features=None):
+                max_buffers=100, max_entries=0x7fFFffFF, features=None,
+                flow_cache_size=4096):
     """
     Initialize switch
      - ports is a list of ofp_phy_ports or a number of ports
      - miss_send_len is number of bytes to send to controller on table miss
      - max_buffers is number of buffered packets to store
      - max_entries is max flows entries per table
+     - flow_cache_size is the max number of microflows to cache (0 disables)
     """
     if name is None: name = dpid_to_str(dpid)
     self.name = name
@@ -91,6 +122,16 @@ class SoftwareSwitchBase (object):
     self._lookup_count = 0
     self._matched_count = 0
 
+    # Microflow cache: exact packet headers -> TableEntry
+    # Any flow added to the table may take precedence over cached results, so
+    # the whole cache is dropped when that happens.  When entries are removed,
+    # only the microflows which resolved to them are dropped.
+    self.flow_cache_size = flow_cache_size
+    self._flow_cache = {}
+    self._flow_cache_keys = {} # TableEntry -> [microflow keys]
+    self.flow_cache_hits = 0
+    self.flow_cache_misses = 0
+
     self.log = logging.getLogger(self.name)
     self._connection = None
 
@@ -212,11 +253,25 @@ class SoftwareSwitchBase (object):
     """
     return time.time()
 
+  def flush_flow_cache (self):
+    """
+    Drops all cached microflows
+    """
+    self._flow_cache.clear()
+    self._flow_cache_keys.clear()
+
   def _handle_FlowTableModification (self, event):
     """
     Handle flow table modification events
     """
-    # Currently, we only use this for sending flow_removed messages
+    if event.added:
+      self.flush_flow_cache()
+    elif self._flow_cache:
+      for entry in event.removed:
+        for key in self._flow_cache_keys.pop(entry, ()):
+          del self._flow_cache[key]
+
+    # Otherwise, we only use this for sending flow_removed messages
     if not event.removed: return
 
     if event.reason in (OFPRR_IDLE_TIMEOUT,OFPRR_HARD_TIMEOUT,OFPRR_DELETE):
@@ -511,7 +566,27 @@ class SoftwareSwitchBase (object):
       self.port_stats[in_port].rx_bytes += len(packet.pack()) # Expensive
 
     self._lookup_count += 1
-    entry = self.table.entry_for_packet(packet, in_port)
+    if self.flow_cache_size:
+      key = _flow_cache_key(packet, in_port)
+      entry = self._flow_cache.get(key)
+      if entry is not None:
+        self.flow_cache_hits += 1
+      else:
+        self.flow_cache_misses += 1
+        entry = self.table.entry_for_packet(packet, in_port)
+        if entry is not None:
+          cache = self._flow_cache
+          if len(cache) >= self.flow_cache_size:
+            # Evict the oldest microflow
+            old_key = next(iter(cache))
+            old_entry = cache.pop(old_key)
+            old_keys = self._flow_cache_keys[old_entry]
+            old_keys.remove(old_key)
+            if not old_keys: del self._flow_cache_keys[old_entry]
+          cache[key] = entry
+          self._flow_cache_keys.setdefault(entry, []).append(key)
+    else:
+      entry = self.table.entry_for_packet(packet, in_port)
     if entry is not None:
       self._matched_count += 1
       entry.touch_packet(len(packet))
@@ -22,6 +22,7 @@ exact-match rules for each flow.
 
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
+from pox.lib.packet.ethernet import ethernet
 from pox.lib.util import dpid_to_str, str_to_dpid
 from pox.lib.util import str_to_bool
 import time
@@ -96,7 +97,11 @@ class LearningSwitch (object):
     Handle packet in messages from the switch to implement above algorithm.
     """
 
-    packet = event.parsed
+    # We only need the headers that go into the match, so get them straight
+    # from the packet data rather than parsing the whole thing.
+    match = of.ofp_match.from_packet_data(event.data)
+    src = match.dl_src
+    dst = match.dl_dst
 
     def flood (message = None):
       """ Floods the packet """
@@ -111,7 +116,7 @@ class LearningSwitch (object):
               dpid_to_str(event.dpid))
 
         if message is not None: log.debug(message)
-        #log.debug("%i: flood %s -> %s", event.dpid,packet.src,packet.dst)
+        #log.debug("%i: flood %s -> %s", event.dpid,src,dst)
         # OFPP_FLOOD is optional; on some switches you may need to change
         # this to OFPP_ALL.
         msg.actions.append(of.ofp_action_output(port = of.OFPP_FLOOD))
@@ -131,7 +136,7 @@ class LearningSwitch (object):
         if not isinstance(duration, tuple):
           duration = (duration,duration)
         msg = of.ofp_flow_mod()
-        msg.match = of.ofp_match.from_packet(packet)
+        msg.match = match
         msg.idle_timeout = duration[0]
         msg.hard_timeout = duration[1]
         msg.buffer_id = event.ofp.buffer_id
@@ -142,31 +147,35 @@ class LearningSwitch (object):
         msg.in_port = event.port
         self.connection.send(msg)
 
-    self.macToPort[packet.src] = event.port # 1
+    self.macToPort[src] = event.port # 1
 
     if not self.transparent: # 2
-      if packet.type == packet.LLDP_TYPE or packet.dst.isBridgeFiltered():
+      # (The match's dl_type is from inside the VLAN tag if there is one)
+      if ((match.dl_type == ethernet.LLDP_TYPE
+           and match.dl_vlan == of.OFP_VLAN_NONE)
+          or dst.isBridgeFiltered()):
         drop() # 2a
         return
 
-    if packet.dst.is_multicast:
+    if dst.is_multicast:
       flood() # 3a
     else:
-      if packet.dst not in self.macToPort: # 4
-        flood("Port for %s unknown -- flooding" % (packet.dst,)) # 4a
+      if dst not in self.macToPort: # 4
+        flood("Port for %s unknown -- flooding" % (dst,)) # 4a
       else:
-        port = self.macToPort[packet.dst]
+        port = self.macToPort[dst]
         if port == event.port: # 5
           # 5a
           log.warning("Same port for packet from %s -> %s on %s.%s.  Drop."
-              % (packet.src, packet.dst, dpid_to_str(event.dpid), port))
+              % (src, dst, dpid_to_str(event.dpid), port))
           drop(10)
           return
         # 6
         log.debug("installing flow for %s.%i -> %s.%i" %
-                  (packet.src, event.port, packet.dst, port))
+                  (src, event.port, dst, port))
         msg = of.ofp_flow_mod()
-        msg.match = of.ofp_match.from_packet(packet, event.port)
+        msg.match = match
+        match.in_port = event.port
         msg.idle_timeout = 10
         msg.hard_timeout = 30
         msg.actions.append(of.ofp_action_output(port = port))
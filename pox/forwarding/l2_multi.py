@@ -29,12 +29,16 @@ Works with openflow.spanning_tree
 
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
+from pox.lib.packet.ethernet import ethernet
 from pox.lib.revent import *
 from pox.lib.recoco import Timer
 from collections import defaultdict
 from pox.openflow.discovery import Discovery
+from pox.lib.graph.paths import ShortestPaths
 from pox.lib.util import dpid_to_str
 import time
+import zlib
+import struct
 
 log = core.getLogger()
 
@@ -47,12 +51,23 @@ switches = {}
 # ethaddr -> (switch, port)
 mac_map = {}
 
-# [sw1][sw2] -> (distance, intermediate)
-path_map = defaultdict(lambda:defaultdict(lambda:(None,None)))
+# Shortest paths between switches (kept in sync with adjacency)
+paths = ShortestPaths()
 
 # Waiting path.  (dpid,xid)->WaitingPath
 waiting_paths = {}
 
+# Paths with flows installed.  cookie -> InstalledPath
+installed_paths = {}
+
+# Installed paths by their match (without in_port).  match -> InstalledPath
+match_paths = {}
+
+# Installed paths crossing each switch-to-switch port, and entering or
+# leaving the network at each host port.
+# (Switch,port) -> set of InstalledPath
+port_paths = defaultdict(set)
+
 # Time to not flood in seconds
 FLOOD_HOLDDOWN = 5
 
@@ -63,62 +78,80 @@ FLOW_HARD_TIMEOUT = 30
 # How long is allowable to set up a path?
 PATH_SETUP_TIME = 4
 
+# How often to get port stats for ECMP rebalancing, in seconds
+ECMP_STATS_INTERVAL = 5
 
-def _calc_paths ():
-  """
-  Essentially Floyd-Warshall algorithm
-  """
+# ECMP mode: None (one shortest path), "hash" or "stats" (see launch())
+_ecmp = None
 
-  def dump ():
-    for i in sws:
-      for j in sws:
-        a = path_map[i][j][0]
-        #a = adjacency[i][j]
-        if a is None: a = "*"
-        print(a, end=' ')
-      print()
-
-  sws = switches.values()
-  path_map.clear()
-  for k in sws:
-    for j,port in adjacency[k].items():
-      if port is None: continue
-      path_map[k][j] = (1,None)
-    path_map[k][k] = (0,None) # distance, intermediate
-
-  #dump()
-
-  for k in sws:
-    for i in sws:
-      for j in sws:
-        if path_map[i][k][0] is not None:
-          if path_map[k][j][0] is not None:
-            # i -> k -> j exists
-            ikj_dist = path_map[i][k][0]+path_map[k][j][0]
-            if path_map[i][j][0] is None or ikj_dist < path_map[i][j][0]:
-              # i -> k -> j is better than existing
-              path_map[i][j] = (ikj_dist, k)
-
-  #print "--------------------"
-  #dump()
+# Transmit rates for ECMP rebalancing.
+# (dpid,port) -> (tx_bytes, time, bytes per second)
+port_load = {}
 
 
 def _get_raw_path (src, dst):
   """
-  Get a raw path (just a list of nodes to traverse)
+  Get a raw path (just a list of intermediate nodes to traverse)
   """
-  if len(path_map) == 0: _calc_paths()
   if src is dst:
     # We're here!
     return []
-  if path_map[src][dst][0] is None:
-    return None
-  intermediate = path_map[src][dst][1]
-  if intermediate is None:
-    # Directly connected
-    return []
-  return _get_raw_path(src, intermediate) + [intermediate] + \
-         _get_raw_path(intermediate, dst)
+  path = paths.path(src, dst)
+  if path is None: return None
+  return path[1:-1]
+
+
+def _flow_hash (match):
+  """
+  Hashes a flow's 5-tuple (or its Ethernet addresses if it's not IP)
+  """
+  if match.nw_proto is None:
+    key = "%s %s" % (match.dl_src, match.dl_dst)
+  else:
+    key = "%s %s %s %s %s" % (match.nw_src, match.nw_dst, match.nw_proto,
+                              match.tp_src, match.tp_dst)
+  return zlib.crc32(key.encode())
+
+
+def _pick_next_hop (sw, hops, flow_hash):
+  """
+  Picks one of several equal-cost next hops for a flow
+
+  The choice is by hash, mixing in the switch so that choices at
+  successive hops aren't all the same.  In "stats" mode, the hash is
+  weighted away from next hops whose ports are transmitting more.
+  """
+  h = zlib.crc32(struct.pack("!Q", sw.dpid), flow_hash)
+  if _ecmp != "stats":
+    return hops[h % len(hops)]
+
+  loads = [port_load.get((sw.dpid, adjacency[sw][hop]), (0,0,0))[2]
+           for hop in hops]
+  mean = sum(loads) / float(len(loads))
+  weights = [1.0 / (1.0 + load / (mean + 1.0)) for load in loads]
+  x = (h & 0xffff) / 65536.0 * sum(weights)
+  for hop,w in zip(hops, weights):
+    x -= w
+    if x < 0: return hop
+  return hops[-1]
+
+
+def _get_ecmp_raw_path (src, dst, flow_hash):
+  """
+  Like _get_raw_path(), but picks among equal-cost paths by flow hash
+  """
+  path = []
+  sw = src
+  while sw is not dst:
+    hops = paths.next_hops(sw, dst)
+    if not hops: return None
+    if len(hops) == 1:
+      sw = hops[0]
+    else:
+      hops.sort(key=lambda s: s.dpid)
+      sw = _pick_next_hop(sw, hops, flow_hash)
+    path.append(sw)
+  return path[:-1]
 
 
 def _check_path (p):
@@ -135,15 +168,20 @@ def _check_path (p):
   return True
 
 
-def _get_path (src, dst, first_port, final_port):
+def _get_path (src, dst, first_port, final_port, flow_hash = None):
   """
   Gets a cooked path -- a list of (node,in_port,out_port)
+
+  If flow_hash is given, it picks among equal-cost paths (for ECMP).
   """
   # Start with a raw path...
   if src == dst:
     path = [src]
   else:
-    path = _get_raw_path(src, dst)
+    if flow_hash is None:
+      path = _get_raw_path(src, dst)
+    else:
+      path = _get_ecmp_raw_path(src, dst, flow_hash)
     if path is None: return None
     path = [src] + path + [dst]
 
@@ -218,6 +256,131 @@ class WaitingPath (object):
       log.error("%i paths failed to install" % (killed,))
 
 
+class InstalledPath (object):
+  """
+  A path which we've installed flows for
+
+  The flows are tagged with the path's cookie.  We keep track of the
+  switch-to-switch ports each path uses, so that when a link goes away,
+  we can delete just the flows which used it instead of all of them.
+  The same goes for the ports where it enters and leaves the network, for
+  when the destination moves or a port turns out to go to another switch.
+  """
+  _next_cookie = 1
+
+  def __init__ (self, path, match):
+    self.path = path
+    self.match = match.clone()
+    self.match.in_port = None
+    self.cookie = InstalledPath._next_cookie
+    InstalledPath._next_cookie = (self.cookie + 1) & 0xffFFffFFffFFffFF or 1
+    self.expires_at = time.time() + FLOW_HARD_TIMEOUT
+
+  @property
+  def hops (self):
+    return len(self.path) - 1
+
+  @property
+  def is_expired (self):
+    return time.time() >= self.expires_at
+
+  def _ports (self):
+    """
+    The (Switch,port)s this path is indexed by in port_paths
+    """
+    sw,in_port,_ = self.path[0]
+    yield (sw,in_port)
+    for (s1,_,out_port),(s2,in_port,_) in zip(self.path[:-1], self.path[1:]):
+      yield (s1,out_port)
+      yield (s2,in_port)
+    sw,_,out_port = self.path[-1]
+    yield (sw,out_port)
+
+  def register (self):
+    old = match_paths.get(self.match)
+    if old is not None:
+      # Superseded.  The new path's flows overwrite the old one's where
+      # they're on the same switch and in_port; delete the rest.
+      old.uninstall(keep=set((sw,in_port) for sw,in_port,_ in self.path))
+    installed_paths[self.cookie] = self
+    match_paths[self.match] = self
+    for p in self._ports():
+      port_paths[p].add(self)
+
+  def unregister (self):
+    if installed_paths.pop(self.cookie, None) is None: return
+    if match_paths.get(self.match) is self:
+      del match_paths[self.match]
+    for p in self._ports():
+      paths_here = port_paths.get(p)
+      if paths_here is None: continue
+      paths_here.discard(self)
+      if not paths_here: del port_paths[p]
+
+  def uninstall (self, keep = ()):
+    """
+    Deletes this path's flows
+
+    keep is a set of (Switch,in_port) hops to leave the flows of.
+    """
+    self.unregister()
+    for sw,in_port,out_port in self.path:
+      if sw.connection is None: continue
+      if (sw,in_port) in keep: continue
+      msg = of.ofp_flow_mod(command=of.OFPFC_DELETE_STRICT)
+      msg.match = self.match.clone()
+      msg.match.in_port = in_port
+      msg.out_port = out_port
+      sw.connection.send(msg)
+
+  @staticmethod
+  def uninstall_crossing (sw, port):
+    """
+    Deletes the flows for all paths using a port
+
+    That's paths crossing it if it's a switch-to-switch port, and paths
+    entering or leaving the network there if it's not.
+    """
+    paths_here = list(port_paths.get((sw,port), ()))
+    for p in paths_here:
+      p.uninstall()
+    return len(paths_here)
+
+  @staticmethod
+  def uninstall_leaving (sw, port, dl_dst = None):
+    """
+    Deletes the flows for all paths leaving the network at a port
+
+    If dl_dst is given, only paths to that address are deleted.
+    """
+    paths_here = [p for p in port_paths.get((sw,port), ())
+                  if p.path[-1][0] is sw and p.path[-1][2] == port
+                  and (dl_dst is None or p.match.dl_dst == dl_dst)]
+    for p in paths_here:
+      p.uninstall()
+    return len(paths_here)
+
+  @staticmethod
+  def uninstall_improvable ():
+    """
+    Deletes the flows for all paths which now have shorter alternatives
+    """
+    count = 0
+    for p in list(installed_paths.values()):
+      d = paths.distance(p.path[0][0], p.path[-1][0])
+      if d is not None and d < p.hops:
+        p.uninstall()
+        count += 1
+    return count
+
+  @staticmethod
+  def expire_installed_paths ():
+    # The flows time out by themselves; just forget about them.
+    for p in list(installed_paths.values()):
+      if p.is_expired:
+        p.unregister()
+
+
 class PathInstalled (Event):
   """
   Fired when a path is installed
@@ -237,8 +400,10 @@ class Switch (EventMixin):
   def __repr__ (self):
     return dpid_to_str(self.dpid)
 
-  def _install (self, switch, in_port, out_port, match, buf = None):
+  def _install (self, switch, in_port, out_port, match, buf = None,
+                cookie = 0):
     msg = of.ofp_flow_mod()
+    msg.cookie = cookie
     msg.match = match
     msg.match.in_port = in_port
     msg.idle_timeout = FLOW_IDLE_TIMEOUT
@@ -249,8 +414,10 @@ class Switch (EventMixin):
 
   def _install_path (self, p, match, packet_in=None):
     wp = WaitingPath(p, packet_in)
+    ip = InstalledPath(p, match)
+    ip.register()
     for sw,in_port,out_port in p:
-      self._install(sw, in_port, out_port, match)
+      self._install(sw, in_port, out_port, match, cookie=ip.cookie)
       msg = of.ofp_barrier_request()
       sw.connection.send(msg)
       wp.add_xid(sw.dpid,msg.xid)
@@ -259,7 +426,8 @@ class Switch (EventMixin):
     """
     Attempts to install a path between this switch and some destination
     """
-    p = _get_path(self, dst_sw, event.port, last_port)
+    flow_hash = _flow_hash(match) if _ecmp else None
+    p = _get_path(self, dst_sw, event.port, last_port, flow_hash)
     if p is None:
       log.warning("Can't get from %s to %s", match.dl_src, match.dl_dst)
 
@@ -307,7 +475,7 @@ class Switch (EventMixin):
 
     # Now reverse it and install it backwards
     # (we'll just assume that will work)
-    p = [(sw,out_port,in_port) for sw,in_port,out_port in p]
+    p = [(sw,out_port,in_port) for sw,in_port,out_port in reversed(p)]
     self._install_path(p, match.flip())
 
 
@@ -332,55 +500,67 @@ class Switch (EventMixin):
         msg.in_port = event.port
         self.connection.send(msg)
 
-    packet = event.parsed
+    # Most of what we need is in the match, which we can get without
+    # parsing the whole packet.
+    match = of.ofp_match.from_packet_data(event.data)
+    src = match.dl_src
+    dst = match.dl_dst
 
     loc = (self, event.port) # Place we saw this ethaddr
-    oldloc = mac_map.get(packet.src) # Place we last saw this ethaddr
+    oldloc = mac_map.get(src) # Place we last saw this ethaddr
 
-    if packet.effective_ethertype == packet.LLDP_TYPE:
+    ethertype = match.dl_type
+    if ethertype < 1536 or ethertype == ethernet.VLAN_TYPE:
+      # LLC, stacked VLAN tags or a runt; let the parser sort it out
+      ethertype = event.parsed.effective_ethertype
+    if ethertype == ethernet.LLDP_TYPE:
       drop()
       return
 
     if oldloc is None:
-      if packet.src.is_multicast == False:
-        mac_map[packet.src] = loc # Learn position for ethaddr
-        log.debug("Learned %s at %s.%i", packet.src, loc[0], loc[1])
+      if src.is_multicast == False:
+        mac_map[src] = loc # Learn position for ethaddr
+        log.debug("Learned %s at %s.%i", src, loc[0], loc[1])
     elif oldloc != loc:
       # ethaddr seen at different place!
       if core.openflow_discovery.is_edge_port(loc[0].dpid, loc[1]):
         # New place is another "plain" port (probably)
-        log.debug("%s moved from %s.%i to %s.%i?", packet.src,
+        log.debug("%s moved from %s.%i to %s.%i?", src,
                   dpid_to_str(oldloc[0].dpid), oldloc[1],
                   dpid_to_str(   loc[0].dpid),    loc[1])
-        if packet.src.is_multicast == False:
-          mac_map[packet.src] = loc # Learn position for ethaddr
-          log.debug("Learned %s at %s.%i", packet.src, loc[0], loc[1])
-      elif packet.dst.is_multicast == False:
+        if src.is_multicast == False:
+          mac_map[src] = loc # Learn position for ethaddr
+          log.debug("Learned %s at %s.%i", src, loc[0], loc[1])
+          # Paths to the old place are no good anymore
+          removed = InstalledPath.uninstall_leaving(oldloc[0], oldloc[1],
+                                                    src)
+          if removed:
+            log.debug("Removed %i paths to %s's old place", removed, src)
+      elif dst.is_multicast == False:
         # New place is a switch-to-switch port!
         # Hopefully, this is a packet we're flooding because we didn't
         # know the destination, and not because it's somehow not on a
         # path that we expect it to be on.
         # If spanning_tree is running, we might check that this port is
         # on the spanning tree (it should be).
-        if packet.dst in mac_map:
+        if dst in mac_map:
           # Unfortunately, we know the destination.  It's possible that
           # we learned it while it was in flight, but it's also possible
           # that something has gone wrong.
           log.warning("Packet from %s to known destination %s arrived "
-                      "at %s.%i without flow", packet.src, packet.dst,
+                      "at %s.%i without flow", src, dst,
                       dpid_to_str(self.dpid), event.port)
 
 
-    if packet.dst.is_multicast:
-      log.debug("Flood multicast from %s", packet.src)
+    if dst.is_multicast:
+      log.debug("Flood multicast from %s", src)
       flood()
     else:
-      if packet.dst not in mac_map:
-        log.debug("%s unknown -- flooding" % (packet.dst,))
+      if dst not in mac_map:
+        log.debug("%s unknown -- flooding" % (dst,))
         flood()
       else:
-        dest = mac_map[packet.dst]
-        match = of.ofp_match.from_packet(packet)
+        dest = mac_map[dst]
         self.install_path(dest[0], dest[1], match, event)
 
   def disconnect (self):
@@ -431,22 +611,18 @@ class l2_multi (EventMixin):
     sw1 = switches[l.dpid1]
     sw2 = switches[l.dpid2]
 
-    # Invalidate all flows and path info.
-    # For link adds, this makes sure that if a new link leads to an
-    # improved path, we use it.
-    # For link removals, this makes sure that we don't use a
-    # path that may have been broken.
-    #NOTE: This could be radically improved! (e.g., not *ALL* paths break)
-    clear = of.ofp_flow_mod(command=of.OFPFC_DELETE)
-    for sw in switches.values():
-      if sw.connection is None: continue
-      sw.connection.send(clear)
-    path_map.clear()
-
     if event.removed:
-      # This link no longer okay
+      # This link no longer okay, so get rid of flows using it
+      removed = InstalledPath.uninstall_crossing(sw1, l.port1)
+      removed += InstalledPath.uninstall_crossing(sw2, l.port2)
+      if removed:
+        log.debug("Removed %i paths using link %s.%i <-> %s.%i", removed,
+                  sw1, l.port1, sw2, l.port2)
+
       if sw2 in adjacency[sw1]: del adjacency[sw1][sw2]
       if sw1 in adjacency[sw2]: del adjacency[sw2][sw1]
+      paths.remove_edge(sw1, sw2)
+      paths.remove_edge(sw2, sw1)
 
       # But maybe there's another way to connect these...
       for ll in core.openflow_discovery.adjacency:
@@ -456,6 +632,8 @@ class l2_multi (EventMixin):
             # Yup, link goes both ways
             adjacency[sw1][sw2] = ll.port1
             adjacency[sw2][sw1] = ll.port2
+            paths.set_edge(sw1, sw2)
+            paths.set_edge(sw2, sw1)
             # Fixed -- new link chosen to connect these
             break
     else:
@@ -469,9 +647,19 @@ class l2_multi (EventMixin):
           # Yup, link goes both ways -- connected!
           adjacency[sw1][sw2] = l.port1
           adjacency[sw2][sw1] = l.port2
+          paths.set_edge(sw1, sw2)
+          paths.set_edge(sw2, sw1)
+
+          # If this gives a path we've installed a shortcut, get rid of
+          # the path's flows so that the next packet gets the new path.
+          removed = InstalledPath.uninstall_improvable()
+          if removed:
+            log.debug("Removed %i paths which %s <-> %s shortens", removed,
+                      sw1, sw2)
 
       # If we have learned a MAC on this port which we now know to
-      # be connected to a switch, unlearn it.
+      # be connected to a switch, unlearn it (and get rid of the paths
+      # which went to or came from it there).
       bad_macs = set()
       for mac,(sw,port) in mac_map.items():
         if sw is sw1 and port == l.port1: bad_macs.add(mac)
@@ -479,6 +667,11 @@ class l2_multi (EventMixin):
       for mac in bad_macs:
         log.debug("Unlearned %s", mac)
         del mac_map[mac]
+      removed = InstalledPath.uninstall_crossing(sw1, l.port1)
+      removed += InstalledPath.uninstall_crossing(sw2, l.port2)
+      if removed:
+        log.debug("Removed %i paths with hosts at %s.%i or %s.%i", removed,
+                  sw1, l.port1, sw2, l.port2)
 
   def _handle_openflow_ConnectionUp (self, event):
     sw = switches.get(event.dpid)
@@ -490,6 +683,25 @@ class l2_multi (EventMixin):
     else:
       sw.connect(event.connection)
 
+  def _handle_openflow_PortStatsReceived (self, event):
+    if _ecmp != "stats": return
+    now = time.time()
+    for ps in event.stats:
+      key = (event.dpid, ps.port_no)
+      old = port_load.get(key)
+      rate = 0
+      if old is not None and now > old[1] and ps.tx_bytes >= old[0]:
+        rate = (ps.tx_bytes - old[0]) / (now - old[1])
+      port_load[key] = (ps.tx_bytes, now, rate)
+
+  def _handle_openflow_ConnectionDown (self, event):
+    for key in [k for k in port_load if k[0] == event.dpid]:
+      del port_load[key]
+
+  def _handle_openflow_PortStatus (self, event):
+    if event.deleted:
+      port_load.pop((event.dpid, event.port), None)
+
   def _handle_openflow_BarrierIn (self, event):
     wp = waiting_paths.pop((event.dpid,event.xid), None)
     if not wp:
@@ -499,8 +711,40 @@ class l2_multi (EventMixin):
     wp.notify(event)
 
 
-def launch ():
+def _request_port_stats ():
+  for sw in switches.values():
+    if sw.connection is None: continue
+    sw.connection.send(of.ofp_stats_request(body=of.ofp_port_stats_request()))
+
+
+def launch (dense_paths = False, ecmp = False):
+  """
+  Starts l2_multi
+
+  --dense-paths computes paths with NumPy, which is faster for big,
+  densely-connected networks.
+
+  --ecmp spreads flows across all equal-cost shortest paths by hashing
+  their 5-tuples.  --ecmp=stats also periodically gets port stats, and
+  weights the choices away from busier links.
+  """
+  global _ecmp
+  if ecmp is True:
+    _ecmp = "hash"
+  elif ecmp in ("hash", "stats"):
+    _ecmp = ecmp
+  elif ecmp is not False:
+    raise RuntimeError("Unknown ECMP mode: %s" % (ecmp,))
+
+  if dense_paths:
+    global paths
+    paths = ShortestPaths(dense=True)
   core.registerNew(l2_multi)
 
+  if _ecmp == "stats":
+    Timer(ECMP_STATS_INTERVAL, _request_port_stats, recurring=True)
+
   timeout = min(max(PATH_SETUP_TIME, 5) * 2, 15)
   Timer(timeout, WaitingPath.expire_waiting_paths, recurring=True)
+  Timer(FLOW_HARD_TIMEOUT, InstalledPath.expire_installed_paths,
+        recurring=True)
@@ -0,0 +1,337 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Profiles the scheduler and event handlers
+
+Records, for each kind of recoco Task, each Timer callback and each
+revent handler, how many times it ran, the total and maximum time it
+took, and (for Tasks) how long it waited in the run queue.  A summary of
+the busiest ones is logged every so often:
+
+  ./pox.py info.profiler --interval=60 --top=10 forwarding.l2_learning
+
+Options:
+  --interval=S    Seconds between log summaries (0 to not log them)
+  --top=N         How many entries to show in each part of the summary
+  --sample=N      Only time one in N handler calls (counts are still exact,
+                  and total times are scaled up)
+  --slow=MS       Remember time slices longer than this many milliseconds
+                  (the last few hundred are kept and logged)
+  --flamegraph=F  Sample the scheduler thread's stack and write the
+                  results to F in the "collapsed" format that
+                  flamegraph.pl and speedscope read (rewritten each interval)
+  --sample-hz=N   How often to sample the stack for --flamegraph
+
+If the web server (web.webcore) is running, the statistics are also
+available as JSON from /profiler/stats.json.
+
+Times are wall-clock times, in seconds in the JSON and milliseconds in
+the log.
+"""
+
+from pox.core import core
+import pox.lib.revent.revent as revent
+from pox.lib.recoco import Timer
+from pox.lib.recoco.recoco import _TimerTask
+from collections import deque, defaultdict
+import json
+import sys
+import threading
+import time
+
+log = core.getLogger()
+
+_clock = time.perf_counter
+
+
+def _task_name (task):
+  """
+  A name for a Task which is the same for all Tasks doing the same job
+  """
+  target = getattr(task, "target", None)
+  if target is not None:
+    return "%s.%s" % (getattr(target, "__module__", "?"),
+                      getattr(target, "__qualname__", target))
+  t = type(task)
+  return "%s.%s" % (t.__module__, t.__qualname__)
+
+
+def _handler_name (handler):
+  """
+  A name for an event handler (e.g., "pox.foo.Bar._handle_PacketIn")
+  """
+  method = getattr(handler, "method", None) # Weak handlers (CallProxy)
+  if method is not None: handler = method
+  f = getattr(handler, "__func__", handler)
+  module = getattr(f, "__module__", None)
+  name = getattr(f, "__qualname__", None)
+  if module is None or name is None:
+    return repr(handler)
+  return "%s.%s" % (module, name)
+
+
+class Stat (object):
+  """
+  Counts and times for one Task or handler
+  """
+  __slots__ = ['count', 'timed', 'total', 'max', 'queue_total', 'queue_max']
+
+  def __init__ (self):
+    self.count = 0
+    self.timed = 0 # Number of count which were actually timed
+    self.total = 0.0
+    self.max = 0.0
+    self.queue_total = 0.0
+    self.queue_max = 0.0
+
+  @property
+  def estimated_total (self):
+    if self.timed == 0: return 0.0
+    return self.total * self.count / self.timed
+
+  def to_dict (self):
+    d = dict(count=self.count, total=self.estimated_total, max=self.max)
+    if self.timed:
+      d['mean'] = self.total / self.timed
+    if self.queue_total or self.queue_max:
+      d['queue_total'] = self.queue_total
+      d['queue_max'] = self.queue_max
+      d['queue_mean'] = self.queue_total / self.count
+    return d
+
+
+class Profiler (object):
+  """
+  Collects the statistics
+
+  Tasks are timed with the scheduler's slice_hook, Timer callbacks with
+  its timer_hook, and handlers by wrapping them when revent compiles its
+  dispatch functions, so there's no cost to any of this unless a Profiler
+  is started.  Timer callbacks are listed with the Tasks (under the
+  callback's name) rather than as the Task which runs them.
+  """
+  _core_name = "profiler"
+
+  def __init__ (self, sample = 1, slow = None, history = 256):
+    self.sample = max(1, int(sample))
+    self.slow = slow # Seconds
+    self.tasks = defaultdict(Stat)
+    self.handlers = defaultdict(Stat)
+    self.slow_slices = deque(maxlen=history) # (time, name, duration)
+    self.started = None
+    self._stack_samples = defaultdict(int)
+    self._sampler = None
+
+  def start (self):
+    self.started = time.time()
+    core.scheduler.slice_hook = self._slice_hook
+    core.scheduler.timer_hook = self._timer_hook
+    revent.set_handler_wrapper(self._wrap_handler)
+
+  def stop (self):
+    if core.scheduler.slice_hook == self._slice_hook:
+      core.scheduler.slice_hook = None
+    if core.scheduler.timer_hook == self._timer_hook:
+      core.scheduler.timer_hook = None
+    revent.set_handler_wrapper(None)
+    if self._sampler:
+      self._sampler.stop()
+      self._sampler = None
+
+  def reset (self):
+    self.started = time.time()
+    self.tasks.clear()
+    self.handlers.clear()
+    self.slow_slices.clear()
+    self._stack_samples.clear()
+    if core.scheduler.slice_hook == self._slice_hook:
+      # Rewrap the handlers so they use the new Stats
+      revent.set_handler_wrapper(self._wrap_handler)
+
+  def _slice_hook (self, task, elapsed, waited):
+    if type(task) is _TimerTask: return # See _timer_hook()
+    name = _task_name(task)
+    s = self._time(name, elapsed)
+    s.queue_total += waited
+    if waited > s.queue_max: s.queue_max = waited
+
+  def _timer_hook (self, timer, elapsed):
+    self._time(_handler_name(timer._callback), elapsed)
+
+  def _time (self, name, elapsed):
+    s = self.tasks[name]
+    s.count += 1
+    s.timed += 1
+    s.total += elapsed
+    if elapsed > s.max: s.max = elapsed
+    if self.slow is not None and elapsed > self.slow:
+      self.slow_slices.append((time.time(), name, elapsed))
+    return s
+
+  def _wrap_handler (self, handler):
+    s = self.handlers[_handler_name(handler)]
+    sample = self.sample
+    if sample == 1:
+      def profiled (*args, **kw):
+        start = _clock()
+        try:
+          return handler(*args, **kw)
+        finally:
+          elapsed = _clock() - start
+          s.count += 1
+          s.timed += 1
+          s.total += elapsed
+          if elapsed > s.max: s.max = elapsed
+    else:
+      def profiled (*args, **kw):
+        s.count += 1
+        if s.count % sample: return handler(*args, **kw)
+        start = _clock()
+        try:
+          return handler(*args, **kw)
+        finally:
+          elapsed = _clock() - start
+          s.timed += 1
+          s.total += elapsed
+          if elapsed > s.max: s.max = elapsed
+    profiled.__wrapped__ = handler
+    return profiled
+
+  def start_stack_sampler (self, hz):
+    self._sampler = _StackSampler(self._stack_samples, hz)
+    self._sampler.start()
+
+  def snapshot (self):
+    """
+    Returns all the statistics as a JSON-friendly dictionary
+
+    This can be called from any thread.
+    """
+    now = time.time()
+    return dict(
+        started = self.started,
+        duration = now - self.started if self.started else 0,
+        sample = self.sample,
+        tasks = {k:v.to_dict() for k,v in list(self.tasks.items())},
+        handlers = {k:v.to_dict() for k,v in list(self.handlers.items())},
+        slow_slices = [dict(time=t, task=n, duration=d)
+                       for t,n,d in list(self.slow_slices)])
+
+  def summary (self, top = 10):
+    """
+    Returns a multi-line summary of the busiest Tasks and handlers
+    """
+    lines = []
+    def section (title, stats, queue):
+      items = sorted(list(stats.items()),
+                     key = lambda kv: kv[1].estimated_total, reverse=True)
+      if not items: return
+      header = "%-56s %9s %10s %9s" % (title, "count", "total ms", "max ms")
+      if queue: header += " %9s" % ("queue max",)
+      lines.append(header)
+      for name,s in items[:top]:
+        if len(name) > 56: name = "..." + name[-53:]
+        l = "%-56s %9i %10.1f %9.2f" % (name, s.count,
+                                         s.estimated_total * 1000,
+                                         s.max * 1000)
+        if queue: l += " %9.2f" % (s.queue_max * 1000,)
+        lines.append(l)
+    section("Task", self.tasks, True)
+    section("Handler", self.handlers, False)
+    slow = list(self.slow_slices)[-top:]
+    if slow:
+      lines.append("Recent slow slices:")
+      for t,name,d in slow:
+        lines.append("  %s %-50s %9.2f ms"
+                     % (time.strftime("%H:%M:%S", time.localtime(t)),
+                        name, d * 1000))
+    return "\n".join(lines)
+
+  def collapsed_stacks (self):
+    """
+    Returns stack samples in the "collapsed" flamegraph format
+    """
+    samples = list(self._stack_samples.items()) # (Sampler may be adding)
+    return "".join("%s %i\n" % (stack, count)
+                   for stack,count in sorted(samples))
+
+  def write_flamegraph (self, filename):
+    data = self.collapsed_stacks()
+    with open(filename, "w") as f:
+      f.write(data)
+
+
+class _StackSampler (threading.Thread):
+  """
+  Samples the stack of the scheduler thread every so often
+  """
+  def __init__ (self, counts, hz):
+    super(_StackSampler,self).__init__()
+    self.daemon = True
+    self.counts = counts
+    self.period = 1.0 / hz
+    self.running = True
+
+  def stop (self):
+    self.running = False
+
+  def run (self):
+    while self.running and core.running:
+      time.sleep(self.period)
+      thread = core.scheduler._thread
+      if thread is None: continue
+      frame = sys._current_frames().get(thread.ident)
+      stack = []
+      while frame is not None:
+        code = frame.f_code
+        stack.append("%s:%s" % (code.co_filename.rsplit("/",1)[-1],
+                                code.co_name))
+        frame = frame.f_back
+      if stack:
+        stack.reverse()
+        self.counts[";".join(stack)] += 1
+
+
+def launch (interval = 60, top = 10, sample = 1, slow = None,
+            flamegraph = None, sample_hz = 100):
+  interval = float(interval)
+  top = int(top)
+  p = Profiler(sample = int(sample),
+               slow = None if slow is None else float(slow) / 1000)
+  core.register(p)
+  p.start()
+
+  if flamegraph:
+    p.start_stack_sampler(float(sample_hz))
+
+  def report ():
+    log.info("Profile (%i seconds):\n%s", time.time() - p.started,
+             p.summary(top))
+    if flamegraph:
+      p.write_flamegraph(flamegraph)
+
+  if interval:
+    Timer(interval, report, recurring=True)
+  if flamegraph:
+    core.addListenerByName("DownEvent",
+                           lambda e: p.write_flamegraph(flamegraph))
+
+  def up (event):
+    # Only if the web server is running (and without waiting for it)
+    if not core.hasComponent("WebServer"): return
+    from pox.web.webcore import InternalContentHandler
+    def stats (request):
+      return ("application/json", json.dumps(p.snapshot(), indent=2))
+    core.WebServer.set_handler("/profiler", InternalContentHandler,
+                               {"/stats.json":stats})
+  core.addListenerByName("UpEvent", up)
@@ -20,7 +20,9 @@ from __future__ import print_function
 import struct
 import socket
 
-_eth_oui_to_name = {} # OUI (3 bytes) -> name
+# OUI (3 bytes) -> name.  This is None until the names are first needed
+# (see _get_oui_names()), since loading them noticeably slows startup.
+_eth_oui_to_name = None
 
 def _load_oui_names ():
   """
@@ -28,9 +30,11 @@ def _load_oui_names ():
 
   Assumes the textfile is adjacent to this source file.
   """
-  import inspect
   import os.path
-  filename = os.path.join(os.path.dirname(inspect.stack()[0][1]), 'oui.txt')
+  global _eth_oui_to_name
+  names = {}
+  filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'oui.txt')
   f = None
   try:
     f = open(filename, "r", encoding = "latin-1")
@@ -49,13 +53,20 @@ def _load_oui_names ():
       end = end.split('\t')
       end.remove('(hex)')
       oui_name = ' '.join(end)
-      _eth_oui_to_name[oui] = oui_name.strip()
+      names[oui] = oui_name.strip()
   except:
-    raise
     import logging
     logging.getLogger().warn("Could not load OUI list")
   if f: f.close()
-_load_oui_names()
+  _eth_oui_to_name = names
+
+def _get_oui_names ():
+  """
+  Returns the OUI name dictionary, loading it if need be
+  """
+  if _eth_oui_to_name is None:
+    _load_oui_names()
+  return _eth_oui_to_name
 
 
 def _compare_helper (self, other, f, rf):
@@ -229,7 +240,7 @@ class EthAddr (_AddrBase):
     """
     if resolve_names and self.is_global:
       # Don't even bother for local (though it should never match and OUI!)
-      name = _eth_oui_to_name.get(self._value[:3])
+      name = _get_oui_names().get(self._value[:3])
       if name:
         rest = separator.join('%02x' % (x,) for x in self._value[3:])
         return name + separator + rest
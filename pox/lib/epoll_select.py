@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import select
+import selectors
+from pox.lib.util import make_pinger
 
 class EpollSelect(object):
   """ a class that implements select.select() type behavior on top of epoll.
@@ -67,12 +69,13 @@ class EpollSelect(object):
       return current_fd_set
 
     # optimization assumptions
-    # rl is large and rarely changes
-    if rl != self.lastrl:
+    # rl is large and rarely changes (and callers which keep handing us the
+    # same list object, like SelectHub, don't modify it in between)
+    if rl is not self.lastrl and rl != self.lastrl:
       self.lastrl_set = modify_table(rl, self.lastrl_set, select.EPOLLIN|select.EPOLLPRI)
       self.lastrl = rl
 
-    if wl != self.lastwl:
+    if wl is not self.lastwl and wl != self.lastwl:
       self.lastwl_set = modify_table(wl, self.lastwl_set, select.EPOLLOUT)
       self.lastwl = wl
 
@@ -114,3 +117,122 @@ class EpollSelect(object):
 
   def close(self):
     self.epoll.close()
+
+
+class SelectorSet (object):
+  """ a persistent set of file objects which can be polled for readiness.
+
+      EpollSelect emulates select() by diffing the lists it is handed on
+      every call, which is still O(N) in the number of file objects.  Here,
+      objects are registered once (and unregistered when they go away), and
+      poll() only returns the ones which are actually ready, so the cost of
+      a poll is proportional to the number of ready objects.
+
+      The best mechanism from the selectors module is used (i.e., epoll on
+      Linux).  When that mechanism has a file descriptor of its own (epoll,
+      kqueue, devpoll), the SelectorSet can itself be waited on with select()
+      and friends -- it becomes readable when any registered object is ready.
+      If it doesn't (or use_selectors is False), .pollable is False and users
+      should fall back to handing read_list/write_list to select().  In that
+      case, .waker is a pinger which is pinged whenever the set changes, so
+      it should be selected on too (so that changes take effect promptly).
+  """
+
+  def __init__(self, use_selectors=True):
+    self._read = set()
+    self._write = set()
+    self._selector = None
+    self.waker = None
+    if use_selectors:
+      sel = selectors.DefaultSelector()
+      try:
+        sel.fileno()
+        self._selector = sel
+      except (AttributeError, NotImplementedError):
+        sel.close()
+    if self._selector is None:
+      self.waker = make_pinger()
+
+  @property
+  def pollable(self):
+    return self._selector is not None
+
+  def fileno(self):
+    if self._selector is None:
+      raise RuntimeError("SelectorSet has no file descriptor")
+    return self._selector.fileno()
+
+  @property
+  def read_list(self):
+    return list(self._read)
+
+  @property
+  def write_list(self):
+    return list(self._write)
+
+  def __len__(self):
+    return len(self._read | self._write)
+
+  def __contains__(self, obj):
+    return obj in self._read or obj in self._write
+
+  def register(self, obj, read=True, write=False):
+    """ start watching obj (or change what it's watched for) """
+    if not (read or write):
+      self.unregister(obj)
+      return
+    known = obj in self
+    if read: self._read.add(obj)
+    else: self._read.discard(obj)
+    if write: self._write.add(obj)
+    else: self._write.discard(obj)
+    if self._selector is None:
+      if self.waker: self.waker.ping()
+      return
+    events = ((selectors.EVENT_READ if read else 0)
+              | (selectors.EVENT_WRITE if write else 0))
+    if known:
+      self._selector.modify(obj, events)
+    else:
+      self._selector.register(obj, events)
+
+  def unregister(self, obj):
+    """ stop watching obj; it's fine if it has already been closed """
+    if obj not in self: return
+    self._read.discard(obj)
+    self._write.discard(obj)
+    if self._selector is None:
+      if self.waker: self.waker.ping()
+      return
+    try:
+      self._selector.unregister(obj)
+    except (KeyError, ValueError):
+      pass
+
+  def poll(self, timeout=0):
+    """ returns (rlist, wlist, xlist) of objects which are ready.
+
+        Errors and hangups are reported as readable (the subsequent read
+        fails), so xlist is only ever populated when not using selectors.
+    """
+    if self._selector is None:
+      rl = list(self._read)
+      wl = list(self._write)
+      return select.select(rl, wl, list(self._read | self._write), timeout)
+
+    rl = []
+    wl = []
+    for key, events in self._selector.select(timeout):
+      if events & selectors.EVENT_READ:
+        rl.append(key.fileobj)
+      if events & selectors.EVENT_WRITE:
+        wl.append(key.fileobj)
+    return (rl, wl, [])
+
+  def close(self):
+    if self._selector is not None:
+      self._selector.close()
+      self._selector = None
+    self._read.clear()
+    self._write.clear()
+    self.waker = None
@@ -0,0 +1,332 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shortest paths over a graph which changes now and then
+
+ShortestPaths keeps a directed graph and works out shortest-path trees
+one source at a time, when a path from that source is first asked for
+(using BFS when all the edges have a weight of 1, and Dijkstra's
+algorithm otherwise).  Trees are kept until a change to the graph could
+affect them: adding an edge only throws away the trees it makes shorter
+paths in, and removing an edge only throws away the trees which used it.
+Trees of shortest paths *to* a node are kept the same way, which is
+what next_hops() uses to find all the equal-cost ways onward (e.g., for
+ECMP).
+
+For big, densely-connected fabrics, passing dense=True keeps the graph
+in a NumPy adjacency matrix too, and computes trees with a vectorized
+BFS over it (when all weights are 1).  This needs NumPy.
+
+  paths = ShortestPaths()
+  paths.set_edge("s1", "s2")
+  paths.set_edge("s2", "s1")
+  ...
+  paths.path("s1", "s3")  # -> ["s1", "s2", "s3"] or None
+"""
+
+import heapq
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+class _DenseAdjacency (object):
+  """
+  A boolean adjacency matrix with a row/column for each node
+  """
+  def __init__ (self):
+    self.index = {} # node -> row
+    self.nodes = [] # row -> node (None if free)
+    self.free = []
+    self.matrix = numpy.zeros((16,16), dtype=bool)
+
+  def add_node (self, node):
+    if node in self.index: return
+    if self.free:
+      i = self.free.pop()
+      self.nodes[i] = node
+    else:
+      i = len(self.nodes)
+      self.nodes.append(node)
+      if i >= len(self.matrix):
+        size = len(self.matrix) * 2
+        m = numpy.zeros((size,size), dtype=bool)
+        m[:i,:i] = self.matrix[:i,:i]
+        self.matrix = m
+    self.index[node] = i
+
+  def remove_node (self, node):
+    i = self.index.pop(node)
+    self.matrix[i,:] = False
+    self.matrix[:,i] = False
+    self.nodes[i] = None
+    self.free.append(i)
+
+  def set (self, u, v, value):
+    self.matrix[self.index[u], self.index[v]] = value
+
+  def bfs (self, source, reverse = False):
+    nodes = self.nodes
+    n = len(nodes)
+    a = self.matrix[:n,:n]
+    if reverse: a = a.T
+    visited = numpy.zeros(n, dtype=bool)
+    s = self.index[source]
+    visited[s] = True
+    dist = {source:0}
+    parent = {source:None}
+    frontier = numpy.array([s])
+    d = 0
+    while len(frontier):
+      d += 1
+      rows = a[frontier]
+      new = numpy.flatnonzero(rows.any(axis=0) & ~visited)
+      if not len(new): break
+      visited[new] = True
+      # For each newly-reached node, the first frontier node leading to it
+      parents = frontier[rows[:,new].argmax(axis=0)]
+      for i,p in zip(new.tolist(), parents.tolist()):
+        v = nodes[i]
+        dist[v] = d
+        parent[v] = nodes[p]
+      frontier = new
+    return dist,parent
+
+
+class ShortestPaths (object):
+  """
+  Lazily-computed, incrementally-invalidated shortest paths
+
+  Nodes can be any hashable objects.  Edges are directed, so for an
+  undirected link, set an edge in each direction.
+
+  The computed and invalidated attributes count how many shortest-path
+  trees have been computed and thrown away.
+  """
+  def __init__ (self, dense = False):
+    self._adj = {} # node -> {neighbor:weight}
+    self._preds = {} # node -> {node with an edge to it:weight}
+    self._non_unit = 0 # Number of edges with a weight other than 1
+    self._trees = {} # source -> (distances, parents)
+    self._rtrees = {} # destination -> (distances, next nodes)
+    self._dense = None
+    if dense:
+      if numpy is None:
+        raise RuntimeError("Dense ShortestPaths require NumPy")
+      self._dense = _DenseAdjacency()
+    self.computed = 0
+    self.invalidated = 0
+
+  def __contains__ (self, node):
+    return node in self._adj
+
+  def nodes (self):
+    return list(self._adj)
+
+  def neighbors (self, node):
+    return list(self._adj.get(node, ()))
+
+  def has_edge (self, u, v):
+    return v in self._adj.get(u, ())
+
+  def add_node (self, node):
+    if node in self._adj: return
+    self._adj[node] = {}
+    self._preds[node] = {}
+    if self._dense: self._dense.add_node(node)
+
+  def remove_node (self, node):
+    """
+    Removes a node and all the edges to and from it
+    """
+    if node not in self._adj: return
+    for v in list(self._adj[node]):
+      self.remove_edge(node, v)
+    for u in list(self._preds[node]):
+      self.remove_edge(u, node)
+    del self._adj[node]
+    del self._preds[node]
+    if self._trees.pop(node, None) is not None:
+      self.invalidated += 1
+    if self._rtrees.pop(node, None) is not None:
+      self.invalidated += 1
+    if self._dense: self._dense.remove_node(node)
+
+  def set_edge (self, u, v, weight = 1):
+    """
+    Adds an edge from u to v (or changes its weight)
+
+    Nodes are added if need be.
+    """
+    assert weight >= 0
+    old = self._adj.get(u, {}).get(v)
+    if old == weight: return
+    if old is not None:
+      self.remove_edge(u, v)
+    self.add_node(u)
+    self.add_node(v)
+    self._adj[u][v] = weight
+    self._preds[v][u] = weight
+    if weight != 1: self._non_unit += 1
+    if self._dense: self._dense.set(u, v, True)
+
+    # Only trees where this edge makes a path to v (or from u, for trees
+    # of paths to a destination) shorter are affected
+    self._invalidate_shorter(self._trees, u, v, weight)
+    self._invalidate_shorter(self._rtrees, v, u, weight)
+
+  def remove_edge (self, u, v):
+    """
+    Removes the edge from u to v
+
+    Returns False if there wasn't one.
+    """
+    adj = self._adj.get(u)
+    if not adj or v not in adj: return False
+    if adj.pop(v) != 1: self._non_unit -= 1
+    del self._preds[v][u]
+    if self._dense: self._dense.set(u, v, False)
+
+    # Only trees which used this edge are affected
+    self._invalidate_using(self._trees, u, v)
+    self._invalidate_using(self._rtrees, v, u)
+    return True
+
+  def _invalidate_shorter (self, trees, u, v, weight):
+    for source,(dist,parent) in list(trees.items()):
+      du = dist.get(u)
+      if du is None: continue
+      dv = dist.get(v)
+      if dv is None or du + weight < dv:
+        del trees[source]
+        self.invalidated += 1
+
+  def _invalidate_using (self, trees, u, v):
+    for source,(dist,parent) in list(trees.items()):
+      if v in parent and parent[v] == u:
+        del trees[source]
+        self.invalidated += 1
+
+  def clear (self):
+    self._trees.clear()
+    self._rtrees.clear()
+
+  def tree (self, source):
+    """
+    Returns the shortest-path tree from source
+
+    This is (distances, parents), where distances maps each node reachable
+    from source to its distance, and parents maps each to the previous
+    node on a shortest path to it (None for the source itself).  Don't
+    modify them.
+    """
+    return self._tree(source, self._trees, self._adj, False)
+
+  def reverse_tree (self, dest):
+    """
+    Returns the tree of shortest paths to dest
+
+    Like tree(), except that the distances are to dest, and instead of
+    parents, it maps each node to the next node on a shortest path from it
+    to dest.
+    """
+    return self._tree(dest, self._rtrees, self._preds, True)
+
+  def _tree (self, source, trees, adj, reverse):
+    t = trees.get(source)
+    if t is not None: return t
+    if source not in adj:
+      return {source:0},{source:None}
+    if self._non_unit:
+      t = self._dijkstra(source, adj)
+    elif self._dense:
+      t = self._dense.bfs(source, reverse)
+    else:
+      t = self._bfs(source, adj)
+    trees[source] = t
+    self.computed += 1
+    return t
+
+  def distance (self, src, dst):
+    """
+    Returns the distance from src to dst, or None if unreachable
+    """
+    return self.tree(src)[0].get(dst)
+
+  def path (self, src, dst):
+    """
+    Returns a list of the nodes on a shortest path from src to dst
+
+    The list starts with src and ends with dst.  Returns None if there's
+    no path.
+    """
+    dist,parent = self.tree(src)
+    if dst not in dist: return None
+    p = [dst]
+    n = dst
+    while True:
+      n = parent[n]
+      if n is None: break
+      p.append(n)
+    p.reverse()
+    return p
+
+  def next_hops (self, node, dst):
+    """
+    Returns all the neighbors of node which are on a shortest path to dst
+
+    These are the equal-cost next hops from node toward dst.  The list is
+    empty if node is dst or can't reach it.
+    """
+    dist = self.reverse_tree(dst)[0]
+    d = dist.get(node)
+    if not d: return []
+    return [v for v,w in self._adj[node].items() if dist.get(v) == d - w]
+
+  def _bfs (self, source, adj):
+    dist = {source:0}
+    parent = {source:None}
+    frontier = [source]
+    d = 0
+    while frontier:
+      d += 1
+      next_frontier = []
+      for u in frontier:
+        for v in adj[u]:
+          if v not in dist:
+            dist[v] = d
+            parent[v] = u
+            next_frontier.append(v)
+      frontier = next_frontier
+    return dist,parent
+
+  def _dijkstra (self, source, adj):
+    dist = {source:0}
+    parent = {source:None}
+    done = set()
+    heap = [(0, 0, source)]
+    counter = 1 # Nodes may not be orderable, so break ties with this
+    while heap:
+      d,_,u = heapq.heappop(heap)
+      if u in done: continue
+      done.add(u)
+      for v,w in adj[u].items():
+        nd = d + w
+        if v not in dist or nd < dist[v]:
+          dist[v] = nd
+          parent[v] = u
+          heapq.heappush(heap, (nd, counter, v))
+          counter += 1
+    return dist,parent
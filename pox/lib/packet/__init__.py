@@ -22,47 +22,84 @@ assembly easier.
 Could still use more work.
 """
 
-# None of this is probably that big, and almost all of it gets loaded
-# under most circumstances anyway.  Let's just load all of it.
-from . import arp as ARP
-from . import dhcp as DHCP
-from . import dns as DNS
-from . import eap as EAP
-from . import eapol as EAPOL
-from . import ethernet as ETHERNET
-from . import ipv4 as IPV4
-from . import ipv6 as IPV6
-from . import icmp as ICMP
-from . import icmpv6 as ICMPV6
-from . import lldp as LLDP
-from . import tcp as TCP
-from . import udp as UDP
-from . import vlan as VLAN
-from . import mpls as MPLS
-from . import llc as LLC
-from . import rip as RIP
-from . import gre as GRE
-from . import vxlan as VXLAN
-
-from .gre import *
-from .vxlan import *
-from .rip import *
-from .arp import *
-from .dhcp import *
-from .dns import *
-from .eap import *
-from .eapol import *
-from .ethernet import *
-from .ipv6 import *
-from .ipv4 import *
-from .icmpv6 import *
-from .icmp import *
-from .lldp import *
-from .tcp import *
-from .udp import *
-from .vlan import *
-from .mpls import *
-from .llc import *
+# The protocol modules are imported when something first asks for one of
+# their names (e.g., pkt.ethernet or pkt.ARP) rather than all up front,
+# which speeds up startup for things that don't use most of them.  From
+# the outside, it should look the same as if we'd done:
+#   from . import arp as ARP
+#   ...
+#   from .arp import *
+#   ...
+
+import importlib as _importlib
+import types as _types
+
+# The modules whose names we export, in the order we "import *" from them
+_submodules = ['gre', 'vxlan', 'rip', 'arp', 'dhcp', 'dns', 'eap', 'eapol',
+               'ethernet', 'ipv6', 'ipv4', 'icmpv6', 'icmp', 'lldp', 'tcp',
+               'udp', 'vlan', 'mpls', 'llc']
+
+# Each of the above is also available as an uppercase alias for the module
+# itself, while the lowercase name is the module's packet class.
+_aliases = {name.upper():name for name in _submodules}
+
+# Names which are a class with the same name as the module it comes from
+_classes = set(_submodules + ['igmp', 'packet_base'])
+
+_all_loaded = False
+
+
+def _load_all ():
+  """
+  Imports all the protocol modules and exports their names
+  """
+  global _all_loaded
+  if _all_loaded: return
+  g = globals()
+  for name in _submodules:
+    m = _importlib.import_module("." + name, __name__)
+    for k,v in list(vars(m).items()):
+      if not k.startswith("_"): g[k] = v
+  for alias,name in _aliases.items():
+    g[alias] = _importlib.import_module("." + name, __name__)
+  _all_loaded = True
+
+
+def __getattr__ (name):
+  if name in _aliases:
+    v = _importlib.import_module("." + _aliases[name], __name__)
+  elif name in _classes:
+    # The packet class with the same name as its module
+    v = getattr(_importlib.import_module("." + name, __name__), name)
+  elif not name.startswith("__"):
+    # Could be in any of them
+    _load_all()
+    if name not in globals():
+      raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return globals()[name]
+  else:
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+  globals()[name] = v
+  return v
+
+
+def __dir__ ():
+  _load_all()
+  return sorted(globals())
+
+
+class _Package (_types.ModuleType):
+  def __setattr__ (self, name, value):
+    # Importing a submodule sets an attribute with its name on us, but
+    # (e.g.) pkt.ethernet should be the ethernet class, not its module.
+    if name in _classes and isinstance(value, _types.ModuleType):
+      return
+    _types.ModuleType.__setattr__(self, name, value)
+
+import sys as _sys
+_sys.modules[__name__].__class__ = _Package
+del _sys
+
 
 __all__ = [
   'rip',
@@ -44,6 +44,8 @@ class ethernet(packet_base):
 
   MIN_LEN = 14
 
+  _lazy_view = True
+
   IP_TYPE    = 0x0800
   ARP_TYPE   = 0x0806
   RARP_TYPE  = 0x8035
@@ -108,7 +110,7 @@ class ethernet(packet_base):
     self._init(kw)
 
   def parse (self, raw):
-    assert isinstance(raw, bytes)
+    assert isinstance(raw, (bytes, memoryview))
     self.next = None # In case of unfinished parsing
     self.raw = raw
     alen = len(raw)
@@ -117,8 +119,8 @@ class ethernet(packet_base):
                % (alen,))
       return
 
-    self.dst = EthAddr(raw[:6])
-    self.src = EthAddr(raw[6:12])
+    self.dst = EthAddr(bytes(raw[:6]))
+    self.src = EthAddr(bytes(raw[6:12]))
     self.type = struct.unpack('!H', raw[12:ethernet.MIN_LEN])[0]
 
     self.hdr_len = ethernet.MIN_LEN
@@ -131,11 +133,11 @@ class ethernet(packet_base):
   def parse_next (prev, typelen, raw, offset=0, allow_llc=True):
     parser = ethernet.type_parsers.get(typelen)
     if parser is not None:
-      return parser(raw[offset:], prev)
+      return prev._next_header(parser, raw, offset)
     elif typelen < 1536 and allow_llc:
-      return ethernet._llc(raw[offset:], prev)
+      return prev._next_header(ethernet._llc, raw, offset)
     else:
-      return raw[offset:]
+      return bytes(raw[offset:])
 
   @staticmethod
   def getNameForType (ethertype):
@@ -157,7 +159,8 @@ class ethernet(packet_base):
     """
     if not self.parsed:
       return ethernet.INVALID_TYPE
-    if self.type == ethernet.VLAN_TYPE or type(self.payload) == ethernet._llc:
+    if (self.type == ethernet.VLAN_TYPE
+        or isinstance(self.payload, ethernet._llc)):
       try:
         return self.payload.effective_ethertype
       except:
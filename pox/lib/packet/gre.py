@@ -40,7 +40,6 @@ import struct
 from .packet_base import packet_base
 from .packet_utils import checksum
 from .ethernet import ethernet
-from . import ipv4
 
 from .packet_utils import *
 
@@ -151,7 +150,8 @@ class gre (packet_base):
         self.parsed = True
 
         if self.type == 0x0800:
-            self.next = ipv4.ipv4(raw=raw[o:])
+            from .ipv4 import ipv4
+            self.next = ipv4(raw=raw[o:])
         elif self.type == 0x6558:
             self.next = ethernet(raw=raw[o:])
         else:
@@ -178,8 +178,8 @@ class time_exceeded (packet_base):
 
         if dlen >= 28:
             # xxx We're assuming this is IPv4!
-            from . import ipv4
-            self.next = ipv4.ipv4(raw=raw[self.MIN_LEN:],prev=self)
+            from .ipv4 import ipv4
+            self.next = self._next_header(ipv4, raw, self.MIN_LEN)
         else:
             self.next = raw[self.MIN_LEN:]
 
@@ -243,8 +243,8 @@ class unreach(packet_base):
 
         if dlen >= 28:
             # xxx We're assuming this is IPv4!
-            from . import ipv4
-            self.next = ipv4.ipv4(raw=raw[unreach.MIN_LEN:],prev=self)
+            from .ipv4 import ipv4
+            self.next = self._next_header(ipv4, raw, unreach.MIN_LEN)
         else:
             self.next = raw[unreach.MIN_LEN:]
 
@@ -310,11 +310,12 @@ class icmp(packet_base):
         self.parsed = True
 
         if self.type == TYPE_ECHO_REQUEST or self.type == TYPE_ECHO_REPLY:
-            self.next = echo(raw=raw[self.MIN_LEN:],prev=self)
+            self.next = self._next_header(echo, raw, self.MIN_LEN)
         elif self.type == TYPE_DEST_UNREACH:
-            self.next = unreach(raw=raw[self.MIN_LEN:],prev=self)
+            self.next = self._next_header(unreach, raw, self.MIN_LEN)
         elif self.type == TYPE_TIME_EXCEED:
-            self.next = time_exceeded(raw=raw[self.MIN_LEN:],prev=self)
+            self.next = self._next_header(time_exceeded, raw,
+                                          self.MIN_LEN)
         else:
             self.next = raw[self.MIN_LEN:]
 
@@ -56,6 +56,8 @@ class ipv4(packet_base):
 
     MIN_LEN = 20
 
+    _lazy_view = True
+
     IPv4 = 4
     ICMP_PROTOCOL = 1
     TCP_PROTOCOL  = 6
@@ -104,7 +106,7 @@ class ipv4(packet_base):
         return s
 
     def parse(self, raw):
-        assert isinstance(raw, bytes)
+        assert isinstance(raw, (bytes, memoryview))
         self.next = None # In case of unfinished parsing
         self.raw = raw
         dlen = len(raw)
@@ -143,7 +145,7 @@ class ipv4(packet_base):
             self.msg('(ip parse) warning: IP header is truncated')
             return
 
-        self.raw_options = raw[self.MIN_LEN:self.hl*4]
+        self.raw_options = bytes(raw[self.MIN_LEN:self.hl*4])
         # At this point, we are reasonably certain that we have an IP
         # packet
         self.parsed = True
@@ -153,24 +155,27 @@ class ipv4(packet_base):
             length = dlen # Clamp to what we've got
         if self.frag != 0:
             # We can't parse payloads!
-            self.next =  raw[self.hl*4:length]
+            self.next = bytes(raw[self.hl*4:length])
         elif self.protocol == ipv4.UDP_PROTOCOL:
-            self.next = udp(raw=raw[self.hl*4:length], prev=self)
+            self.next = self._next_header(udp, raw, self.hl*4, length)
         elif self.protocol == ipv4.TCP_PROTOCOL:
-            self.next = tcp(raw=raw[self.hl*4:length], prev=self)
+            self.next = self._next_header(tcp, raw, self.hl*4, length)
         elif self.protocol == ipv4.ICMP_PROTOCOL:
-            self.next = icmp(raw=raw[self.hl*4:length], prev=self)
+            self.next = self._next_header(icmp, raw, self.hl*4, length)
         elif self.protocol == ipv4.IGMP_PROTOCOL:
-            self.next = igmp(raw=raw[self.hl*4:length], prev=self)
+            self.next = self._next_header(igmp, raw, self.hl*4, length)
         elif self.protocol == ipv4.GRE_PROTOCOL:
-            self.next = gre(raw=raw[self.hl*4:length], prev=self)
+            self.next = self._next_header(gre, raw, self.hl*4, length)
         elif dlen < self.iplen:
             self.msg('(ip parse) warning IP packet data shorter than IP len: %u < %u' % (dlen, self.iplen))
         else:
-            self.next =  raw[self.hl*4:length]
+            self.next = bytes(raw[self.hl*4:length])
 
-        if isinstance(self.next, packet_base) and not self.next.parsed:
-            self.next = raw[self.hl*4:length]
+        if isinstance(self.next, packet_base):
+            if self._lazy is not None:
+                self._defer_next()
+            elif not self.next.parsed:
+                self.next = raw[self.hl*4:length]
 
     def checksum(self):
         data = struct.pack('!BBHHHBBHII', (self.v << 4) + self.hl, self.tos,
@@ -371,11 +371,11 @@ class ipv6 (packet_base):
 
     #TODO: This should be done a better way (and shared with IPv4?).
     if nht == self.UDP_PROTOCOL:
-      self.next = udp(raw=raw[offset:offset+length], prev=self)
+      self.next = self._next_header(udp, raw, offset, offset+length)
     elif nht == self.TCP_PROTOCOL:
-      self.next = tcp(raw=raw[offset:offset+length], prev=self)
+      self.next = self._next_header(tcp, raw, offset, offset+length)
     elif nht == self.ICMP6_PROTOCOL:
-      self.next = icmpv6(raw=raw[offset:offset+length], prev=self)
+      self.next = self._next_header(icmpv6, raw, offset, offset+length)
 #    elif nht == self.IGMP_PROTOCOL:
 #      self.next = igmp(raw=raw[offset:offset+length], prev=self)
     elif nht == self.NO_NEXT_HEADER:
@@ -383,8 +383,11 @@ class ipv6 (packet_base):
     else:
       self.next =  raw[offset:offset+length]
 
-    if isinstance(self.next, packet_base) and not self.next.parsed:
-      self.next = raw[offset:offset+length]
+    if isinstance(self.next, packet_base):
+      if self._lazy is not None:
+        self._defer_next()
+      elif not self.next.parsed:
+        self.next = raw[offset:offset+length]
 
   def add_header (self, eh):
     if self.extension_headers:
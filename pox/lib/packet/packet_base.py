@@ -61,9 +61,25 @@ class packet_base (object):
         def __str__(self):
             # optionally convert to human readable string
     """
+    # For headers from unpack_lazy() (and their payload headers), this is
+    # (buffer, offset, end) -- where the header is in the whole packet
+    # (buffer is a memoryview of it).
+    _lazy = None
+    _lazy_pending = False # Lazy header not parsed yet
+    _lazy_next = None     # See _defer_next()
+
+    # Whether parse() takes a memoryview (for unpack_lazy()).  Otherwise
+    # lazy headers are parsed from a bytes copy of their part of the packet.
+    _lazy_view = False
+
     def __init__ (self):
-        self.next = None
+        # The lazy attributes are set first so that headers from
+        # unpack_lazy() end up with the same attribute layout as others,
+        # which keeps attribute access fast.
+        self._lazy = self._lazy
+        self._lazy_pending = False
         self.prev = None
+        self.next = None
         self.parsed = False
         self.raw = None
 
@@ -189,11 +205,64 @@ class packet_base (object):
     def unpack (cls, raw, prev=None):
         return cls(raw=raw, prev=prev)
 
+    @classmethod
+    def unpack_lazy (cls, raw, prev=None):
+        """
+        Like unpack(), but only parses what actually gets used
+
+        The returned header isn't parsed until one of its attributes is
+        first used (read or written).  When it is, payload headers are left
+        unparsed in the same way, and just refer to the original buffer and
+        an offset into it.  So, e.g., reading a couple of Ethernet fields
+        doesn't cost parsing (or copying) the rest of the packet.
+
+        Payload headers of protocols which don't support this yet are
+        parsed along with their parent.  Either way, the result looks the
+        same as what unpack() gives you, except that .raw may be a
+        memoryview into the packet rather than bytes.
+        """
+        if type(raw) is not bytes: raw = bytes(raw)
+        return cls._unpack_lazy_at(memoryview(raw), 0, len(raw), prev)
+
+    @classmethod
+    def _unpack_lazy_at (cls, buf, offset, end, prev):
+        self = cls.__new__(cls)
+        self._lazy = (buf, offset, end)
+        self._lazy_pending = True
+        self.prev = prev
+        self.__class__ = _lazy_class(cls)
+        return self
+
+    def _next_header (self, cls, raw, offset = 0, end = None):
+        """
+        Returns raw[offset:end] parsed as a cls payload header
+
+        Parsers should use this for their payloads so that they support
+        unpack_lazy().
+        """
+        if self._lazy is not None:
+            if end is None or end > len(raw): end = len(raw)
+            buf,base,_ = self._lazy
+            return cls._unpack_lazy_at(buf, base + offset, base + end, self)
+        return cls(raw=raw[offset:end], prev=self)
+
+    def _defer_next (self):
+        """
+        Puts off deciding whether the lazy payload header parses
+
+        Some parsers replace a payload header which fails to parse with
+        its raw bytes.  For lazy headers, they call this instead so that
+        the payload isn't parsed until .next is actually used.
+        """
+        self._lazy_next = self.next
+        del self.next
+        self.__class__ = _lazy_class(type(self))
+
     def pack(self):
         '''Convert header and payload to bytes'''
 
         if self.parsed is False and self.raw is not None and self.next is None:
-          return self.raw
+          return bytes(self.raw)
 
         self.pre_hdr()
 
@@ -207,3 +276,72 @@ class packet_base (object):
             rest = self.next
 
         return self.hdr(rest) + rest
+
+
+class _lazy_header (object):
+    """
+    Mixin for headers from unpack_lazy() which aren't done being parsed
+
+    These get a subclass of their actual class with this mixed in (see
+    _lazy_class()), so that other headers don't pay for these hooks.  It
+    parses the header when it's first used, and resolves .next for headers
+    which called _defer_next().  Once there's nothing left to do, the
+    header's class is switched back to the actual one.
+    """
+
+    def __getattr__ (self, name):
+        # This is only called for attributes which don't exist
+        if self._lazy_pending:
+            self._lazy_parse()
+            return getattr(self, name)
+        if name == 'next':
+            n = self._lazy_next
+            if not n.parsed:
+                buf,offset,end = n._lazy
+                n = bytes(buf[offset:end])
+            self._lazy_done()
+            self.next = n
+            return n
+        raise AttributeError("'%s' object has no attribute '%s'"
+                             % (type(self).__name__, name))
+
+    def __setattr__ (self, name, value):
+        # Parse first so that parsing doesn't overwrite the new value
+        if self._lazy_pending:
+            self._lazy_parse()
+        elif name == 'next':
+            self._lazy_done()
+        object.__setattr__(self, name, value)
+
+    def __delattr__ (self, name):
+        if self._lazy_pending:
+            self._lazy_parse()
+        elif name == 'next':
+            self._lazy_done()
+        object.__delattr__(self, name)
+
+    def _lazy_done (self):
+        object.__setattr__(self, '_lazy_next', None)
+        object.__setattr__(self, '__class__', self._lazy_base)
+
+    def _lazy_parse (self):
+        cls = self._lazy_base
+        object.__setattr__(self, '__class__', cls)
+        buf,offset,end = self._lazy
+        raw = buf[offset:end]
+        if not cls._lazy_view: raw = bytes(raw)
+        cls.__init__(self, raw=raw, prev=self.prev)
+
+
+_lazy_classes = {}
+
+def _lazy_class (cls):
+    """
+    Returns the _lazy_header subclass of the given packet class
+    """
+    c = _lazy_classes.get(cls)
+    if c is None:
+        c = type(cls.__name__, (_lazy_header, cls),
+                 {'__module__':cls.__module__, '_lazy_base':cls})
+        _lazy_classes[cls] = c
+    return c
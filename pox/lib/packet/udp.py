@@ -49,6 +49,8 @@ class udp(packet_base):
 
     MIN_LEN = 8
 
+    _lazy_view = True
+
     def __init__(self, raw=None, prev=None, **kw):
         #global _ipv4
         #if not _ipv4:
@@ -75,7 +77,7 @@ class udp(packet_base):
         return s
 
     def parse(self, raw):
-        assert isinstance(raw, bytes)
+        assert isinstance(raw, (bytes, memoryview))
         self.raw = raw
         dlen = len(raw)
         if dlen < udp.MIN_LEN:
@@ -97,26 +99,26 @@ class udp(packet_base):
 
         if (self.dstport == dhcp.SERVER_PORT
                     or self.dstport == dhcp.CLIENT_PORT):
-            self.next = dhcp(raw=raw[udp.MIN_LEN:],prev=self)
+            self.next = self._next_header(dhcp, raw, udp.MIN_LEN)
         elif (self.dstport == dns.SERVER_PORT
                     or self.srcport == dns.SERVER_PORT):
-            self.next = dns(raw=raw[udp.MIN_LEN:],prev=self)
+            self.next = self._next_header(dns, raw, udp.MIN_LEN)
         elif (self.dstport == dns.MDNS_PORT
                     or self.srcport == dns.MDNS_PORT):
-            self.next = dns(raw=raw[udp.MIN_LEN:],prev=self)
+            self.next = self._next_header(dns, raw, udp.MIN_LEN)
         elif ( (self.dstport == rip.RIP_PORT
                 or self.srcport == rip.RIP_PORT) ):
 #               and isinstance(self.prev, _ipv4)
 #               and self.prev.dstip == rip.RIP2_ADDRESS ):
-            self.next = rip(raw=raw[udp.MIN_LEN:],prev=self)
+            self.next = self._next_header(rip, raw, udp.MIN_LEN)
         elif (self.dstport == vxlan.VXLAN_PORT
                     or self.srcport == vxlan.VXLAN_PORT):
-            self.next = vxlan(raw=raw[udp.MIN_LEN:],prev=self)
+            self.next = vxlan(raw=bytes(raw[udp.MIN_LEN:]),prev=self)
         elif dlen < self.len:
             self.msg('(udp parse) warning UDP packet data shorter than UDP len: %u < %u' % (dlen, self.len))
             return
         else:
-            self.payload = raw[udp.MIN_LEN:]
+            self.payload = bytes(raw[udp.MIN_LEN:])
 
 
     def hdr(self, payload):
@@ -143,7 +145,7 @@ class udp(packet_base):
 
         if unparsed:
             payload_len = len(self.raw)
-            payload = self.raw
+            payload = bytes(self.raw)
         else:
             if isinstance(self.next, packet_base):
                 payload = self.next.pack()
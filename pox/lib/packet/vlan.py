@@ -41,6 +41,8 @@ class vlan(packet_base):
 
     MIN_LEN = 4
 
+    _lazy_view = True
+
     def __init__(self, raw=None, prev=None, **kw):
         packet_base.__init__(self)
 
@@ -64,7 +66,7 @@ class vlan(packet_base):
         return s
 
     def parse(self, raw):
-        assert isinstance(raw, bytes)
+        assert isinstance(raw, (bytes, memoryview))
         self.raw = raw
         dlen = len(raw)
         if dlen < vlan.MIN_LEN:
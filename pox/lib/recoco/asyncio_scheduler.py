@@ -0,0 +1,325 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A recoco Scheduler which runs on an asyncio event loop
+
+Normally, recoco has a thread running select() for its SelectHub, and
+other threads (and the SelectHub) wake the scheduler by pinging pipes.
+An AsyncioScheduler instead runs everything on a single asyncio event
+loop (a uvloop one if uvloop is installed): recoco Tasks are run from
+loop callbacks, Select()/Recv()/Send()/Sleep() and friends are turned
+into loop readers, writers and timers, Timers are loop timers, and
+callLater() is call_soon_threadsafe().  Existing Tasks don't need to
+change.
+
+New code can also use asyncio directly, e.g. with native coroutines run
+by run_coroutine(), or revent handlers wrapped with async_handler():
+
+  @async_handler
+  async def _handle_ConnectionUp (event):
+    reader,writer = await asyncio.open_connection(...)
+
+POX uses this scheduler when started with --asyncio.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+from pox.lib.recoco.recoco import Scheduler, _clock
+
+try:
+  import uvloop
+except ImportError:
+  uvloop = None
+
+log = logging.getLogger("recoco")
+
+
+class _Wait (object):
+  """
+  A task waiting in an AsyncioHub
+  """
+  __slots__ = ['task', 'rlist', 'wlist', 'ready', 'filenos', 'timer', 'done']
+
+  def __init__ (self, task, rlist, wlist):
+    self.task = task
+    self.rlist = rlist
+    self.wlist = wlist
+    self.ready = ([], [], [])
+    self.filenos = ([], []) # (fd, fileno) we added readers/writers for
+    self.timer = None
+    self.done = False
+
+
+class AsyncioHub (object):
+  """
+  Stands in for the SelectHub of an AsyncioScheduler
+
+  Exceptional conditions (Select()'s xlist) aren't waited on separately,
+  since asyncio reports errors and hangups as readiness.  As with
+  asyncio itself, only one task can wait to read (or write) a given file
+  object at a time; a second one is logged as an error and gets the file
+  object back as exceptional rather than taking it over from the first.
+  """
+  def __init__ (self, scheduler, loop):
+    self._scheduler = scheduler
+    self._loop = loop
+    self._waits = {} # task -> _Wait
+    self._fd_waits = ({}, {}) # Readers and writers: fileno -> _Wait
+
+  def _call (self, f, *args):
+    """
+    Calls f on the loop (right away if we're already on it)
+    """
+    if threading.current_thread() is self._scheduler._thread:
+      f(*args)
+    else:
+      self._loop.call_soon_threadsafe(f, *args)
+
+  def _loop_time (self, t):
+    """
+    Converts a time.time() time to a loop time
+    """
+    return self._loop.time() + (t - time.time())
+
+  def idle (self):
+    pass
+
+  def break_idle (self):
+    self._scheduler._kick()
+
+  def _cycle (self):
+    pass
+
+  def registerSelect (self, task, rlist = None, wlist = None, xlist = None,
+                      timeout = None, timeIsAbsolute = False):
+    if not timeIsAbsolute:
+      if timeout != None:
+        timeout += time.time()
+    self._call(self._register, task, rlist or (), wlist or (), timeout)
+
+  def registerTimer (self, task, timeToWake, timeIsAbsolute = False):
+    return self.registerSelect(task, None, None, None, timeToWake,
+                               timeIsAbsolute)
+
+  def _register (self, task, rlist, wlist, timeout):
+    assert task not in self._waits
+    w = _Wait(task, rlist, wlist)
+    self._waits[task] = w
+    loop = self._loop
+    for i,fds,add in ((0,rlist,loop.add_reader), (1,wlist,loop.add_writer)):
+      owners = self._fd_waits[i]
+      for fd in fds:
+        try:
+          fileno = fd if isinstance(fd, int) else fd.fileno()
+          other = owners.get(fileno)
+          if other is not None:
+            log.error("%s can't wait to %s %s; %s is already waiting on it",
+                      task, ("read", "write")[i], fd, other.task)
+            w.ready[2].append(fd)
+            continue
+          add(fd, self._on_io, w, i, fd)
+          owners[fileno] = w
+          w.filenos[i].append((fd, fileno))
+        except (ValueError, OSError):
+          # Bad or closed file object; report it as an error
+          w.ready[2].append(fd)
+    if w.ready[2]:
+      self._finish(w)
+    elif timeout is not None:
+      w.timer = loop.call_at(self._loop_time(timeout), self._finish, w)
+
+  def _on_io (self, w, i, fd):
+    if w.done: return
+    if fd not in w.ready[i]:
+      w.ready[i].append(fd)
+    if w.timer is not True:
+      # Finish once every callback for this loop iteration has run
+      if w.timer is not None: w.timer.cancel()
+      w.timer = True
+      self._loop.call_soon(self._finish, w)
+
+  def _finish (self, w):
+    if w.done: return
+    w.done = True
+    del self._waits[w.task]
+    loop = self._loop
+    for i,remove in ((0,loop.remove_reader), (1,loop.remove_writer)):
+      owners = self._fd_waits[i]
+      for fd,fileno in w.filenos[i]:
+        del owners[fileno]
+        try:
+          remove(fd)
+        except (ValueError, OSError):
+          pass
+    if w.timer is not None and w.timer is not True:
+      w.timer.cancel()
+    self._scheduler._return(w.task, w.ready)
+
+  def addTimer (self, timer):
+    self._call(self._add_timer, timer)
+
+  def cancelTimer (self, timer):
+    self._call(self._cancel_timer, timer)
+
+  def _add_timer (self, timer):
+    if timer._cancelled: return
+    timer._entry = self._loop.call_at(self._loop_time(timer._next),
+                                      self._fire_timer, timer)
+
+  def _cancel_timer (self, timer):
+    if timer._entry is not None:
+      timer._entry.cancel()
+      timer._entry = None
+
+  def _fire_timer (self, timer):
+    timer._entry = None
+    if timer._cancelled: return
+    hook = self._scheduler.timer_hook
+    if hook is not None: start = _clock()
+    try:
+      again = timer._fire()
+    except Exception:
+      log.exception("Exception in timer %s", timer)
+      again = False
+    if hook is not None:
+      hook(timer, _clock() - start)
+    if again:
+      self._add_timer(timer)
+
+
+class AsyncioScheduler (Scheduler):
+  """
+  A recoco Scheduler running on an asyncio event loop
+
+  The loop runs on the scheduler's thread and is available as .loop.  At
+  most batch_size ready tasks are run per loop iteration, so that I/O and
+  loop callbacks get a look in when lots of tasks are ready.
+  """
+  batch_size = 64
+
+  def __init__ (self, isDefaultScheduler = None, startInThread = True,
+                daemon = False, use_uvloop = True, **kw):
+    # (Other keyword arguments are for SelectHub, so we ignore them.)
+    if use_uvloop and uvloop is not None:
+      self.loop = uvloop.new_event_loop()
+    else:
+      self.loop = asyncio.new_event_loop()
+    self._kicked = False
+    Scheduler.__init__(self, isDefaultScheduler=isDefaultScheduler,
+                       startInThread=startInThread, daemon=daemon)
+
+  def _create_hub (self, use_epoll, threaded):
+    return AsyncioHub(self, self.loop)
+
+  def _kick (self):
+    """
+    Makes sure ready tasks get run
+    """
+    if threading.current_thread() is self._thread:
+      if not self._kicked:
+        self._kicked = True
+        self.loop.call_soon(self._run_ready)
+    else:
+      self.loop.call_soon_threadsafe(self._run_ready)
+
+  def _run_ready (self):
+    self._kicked = False
+    for _ in range(self.batch_size):
+      if self._hasQuit:
+        self.loop.stop()
+        return
+      if not self.cycle(): return
+    if len(self): self._kick()
+
+  def _return (self, task, rv):
+    task.rv = rv
+    self.fast_schedule(task)
+
+  def run (self):
+    if self._thread is None:
+      self._thread = threading.current_thread()
+    asyncio.set_event_loop(self.loop)
+    try:
+      self._kick()
+      if not self._hasQuit:
+        self.loop.run_forever()
+    finally:
+      self._hasQuit = True
+      self._allDone = True
+
+  def quit (self):
+    self._hasQuit = True
+    try:
+      self.loop.call_soon_threadsafe(self.loop.stop)
+    except RuntimeError:
+      pass # Loop is already closed
+
+  def callLater (self, func, *args, **kw):
+    """
+    Calls func with the given arguments at some later point, within this
+    scheduler.  This is a good way for another thread to call something in
+    a co-op-thread-safe manner.
+    """
+    assert callable(func)
+    self.loop.call_soon_threadsafe(self._call_later, func, args, kw)
+
+  def callLaterMany (self, calls):
+    """
+    Like callLater(), but for a bunch of calls at once
+
+    Each of calls is a callable or a tuple of (callable, args[, kw]).
+    """
+    calls = [(c,(),{}) if callable(c)
+             else (c[0], c[1] if len(c) > 1 else (), c[2] if len(c) > 2 else {})
+             for c in calls]
+    self.loop.call_soon_threadsafe(self._call_later_many, calls)
+
+  @classmethod
+  def _call_later_many (cls, calls):
+    for func,args,kw in calls:
+      cls._call_later(func, args, kw)
+
+  @staticmethod
+  def _call_later (func, args, kw):
+    try:
+      func(*args, **kw)
+    except Exception:
+      log.exception("Exception calling %s", func)
+
+  def run_coroutine (self, coro):
+    """
+    Runs a coroutine on the loop
+
+    Can be called from any thread.  Returns a concurrent.futures.Future.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+def async_handler (f):
+  """
+  Decorator which makes a coroutine function usable as a revent handler
+
+  Each event starts a new run of the coroutine on the core scheduler's
+  loop (which must be an AsyncioScheduler), so anything it does after its
+  first await happens after the event has been handled, and it can't
+  halt the event.
+  """
+  @functools.wraps(f)
+  def handler (*args, **kw):
+    from pox.core import core
+    core.scheduler.run_coroutine(f(*args, **kw))
+  return handler
@@ -14,6 +14,8 @@
 
 from __future__ import print_function
 from collections import deque
+import heapq
+import itertools
 from queue import PriorityQueue
 from queue import Queue
 import time
@@ -25,7 +27,7 @@ import sys
 import os
 import socket
 import pox.lib.util
-import random
+from time import perf_counter as _clock
 from types import GeneratorType
 import inspect
 from pox.lib.epoll_select import EpollSelect
@@ -35,6 +37,14 @@ from pox.lib.util import aslist
 
 CYCLE_MAXIMUM = 2
 
+# The scheduler's run queue has three levels.  Tasks with a priority above
+# 1 go in the high level, ones with the default priority of 1 in the normal
+# level, and ones with a priority below 1 in the low level.  When tasks are
+# waiting at more than one level, each round of scheduling runs up to this
+# many tasks from each level, highest level first.  So higher levels get
+# lower latency and more of the time, but lower ones aren't starved.
+LEVEL_WEIGHTS = (4, 2, 1)
+
 # A ReturnFunction can return this to skip a scheduled slice at the last
 # moment.  Whatever the task's current .rf is set to whill be executed
 # on the next slice (so by default, this means the same ReturnFunction will
@@ -57,6 +67,15 @@ class BaseTask  (object):
   #running = False
   priority = 1
 
+  # Statistics kept by the scheduler
+  run_count = 0        # Number of slices the task has run
+  run_time = 0.0       # Total time spent running (seconds)
+  queue_time = 0.0     # Total time spent ready but waiting to run
+  max_queue_time = 0.0 # Longest time spent waiting to run
+
+  _scheduled = False # True while in a scheduler's run queue
+  _queued_at = 0.0
+
   @classmethod
   def new (cls, *args, **kw):
     """
@@ -155,24 +174,38 @@ class Task (BaseTask):
 
 
 class Scheduler (object):
-  """ Scheduler for Tasks """
+  """
+  Scheduler for Tasks
+
+  Ready tasks wait in a run queue with a level for each of high, normal
+  and low priority tasks (see LEVEL_WEIGHTS).  The scheduler keeps some
+  statistics on each task (run_count, run_time, queue_time and
+  max_queue_time).
+  """
+
+  # If set, called with (task, run time, queue time) after each time slice
+  # (e.g., by pox.info.profiler)
+  slice_hook = None
+
+  # If set, called with (timer, run time) after each Timer callback
+  timer_hook = None
 
   def __init__ (self, isDefaultScheduler = None, startInThread = True,
                 daemon = False, use_epoll=False, threaded_selecthub = True):
 
-    self._ready = deque()
+    # Tasks scheduled with first=True, and then one deque per level
+    self._first = deque()
+    self._levels = tuple(deque() for _ in LEVEL_WEIGHTS)
+    self._credits = list(LEVEL_WEIGHTS)
     self._hasQuit = False
 
-    self._selectHub = SelectHub(self, use_epoll=use_epoll,
-                                threaded=threaded_selecthub)
+    self._selectHub = self._create_hub(use_epoll, threaded_selecthub)
     self._thread = None
 
     self._lock = threading.Lock()
     self._callLaterTask = None
     self._allDone = False
 
-    self._random = random.random
-
     self._threadlocal = threading.local()
 
     global defaultScheduler
@@ -186,6 +219,12 @@ class Scheduler (object):
   def __del__ (self):
     self._hasQuit = True
 
+  def _create_hub (self, use_epoll, threaded):
+    """
+    Creates the hub which tasks block on (the SelectHub, normally)
+    """
+    return SelectHub(self, use_epoll=use_epoll, threaded=threaded)
+
   def callLater (self, func, *args, **kw):
     """
     Calls func with the given arguments at some later point, within this
@@ -193,12 +232,28 @@ class Scheduler (object):
     a co-op-thread-safe manner.
     """
 
-    with self._lock:
-      if self._callLaterTask is None:
-        self._callLaterTask = CallLaterTask()
-        self._callLaterTask.start()
+    self._get_call_later_task().callLater(func, *args, **kw)
 
-    self._callLaterTask.callLater(func, *args, **kw)
+  def callLaterMany (self, calls):
+    """
+    Like callLater(), but for a bunch of calls at once
+
+    Each of calls is a callable or a tuple of (callable, args[, kw]).  They
+    are run in order, with a single wakeup for the lot.
+    """
+    self._get_call_later_task().callLaterMany(calls)
+
+  def _get_call_later_task (self):
+    t = self._callLaterTask
+    if t is None:
+      with self._lock:
+        if self._callLaterTask is None:
+          t = CallLaterTask()
+          # fast is safe for a new Task, and schedule() would use callLater()
+          t.start(scheduler=self, fast=True)
+          self._callLaterTask = t
+        t = self._callLaterTask
+    return t
 
   def runThreaded (self, daemon = False):
     self._thread = Thread(target = self.run)
@@ -233,9 +288,7 @@ class Scheduler (object):
     if threading.current_thread() is self._thread:
       # We're know we're good.
       #TODO: Refactor the following with ScheduleTask
-      if task in self._ready:
-        # It might make sense to keep a flag on the task, since checking
-        # if it's in the ready list is not very efficient.
+      if task._scheduled:
         # Not sure if it makes sense to print out a message here or not.
         import logging
         logging.getLogger("recoco").info("Task %s scheduled multiple " +
@@ -244,8 +297,17 @@ class Scheduler (object):
       self.fast_schedule(task, first)
       return True
 
-    st = ScheduleTask(self, task)
-    st.start(fast=True)
+    # Have the scheduler thread do it.  (This used to be done by starting a
+    # new ScheduleTask; callLater() batches these up.)
+    self.callLater(self._schedule_later, task)
+
+  def _schedule_later (self, task):
+    if task._scheduled:
+      import logging
+      logging.getLogger("recoco").info("Task %s scheduled multiple " +
+                                       "times", task)
+    else:
+      self.fast_schedule(task, True)
 
   def fast_schedule (self, task, first = False):
     """
@@ -269,22 +331,48 @@ class Scheduler (object):
     """
 
     # Sanity check.  Won't catch all cases.
-    assert task not in self._ready
+    assert not task._scheduled
 
+    task._scheduled = True
+    task._queued_at = _clock()
     if first:
-      self._ready.appendleft(task)
+      self._first.appendleft(task)
     else:
-      self._ready.append(task)
+      p = task.priority
+      self._levels[1 if p == 1 else (0 if p > 1 else 2)].append(task)
 
     self._selectHub.break_idle()
 
+  def __len__ (self):
+    """
+    Returns the number of tasks ready to run
+    """
+    return len(self._first) + sum(len(l) for l in self._levels)
+
+  def _next_task (self):
+    """
+    Takes the next task to run off of the run queue (or returns None)
+    """
+    if self._first:
+      return self._first.popleft()
+    levels = self._levels
+    credits = self._credits
+    for _ in range(2):
+      for i,level in enumerate(levels):
+        if level and credits[i]:
+          credits[i] -= 1
+          return level.popleft()
+      # Everything with tasks waiting has used its share; start a new round
+      credits[:] = LEVEL_WEIGHTS
+    return None
+
   def quit (self):
     self._hasQuit = True
 
   def run (self):
     try:
       while self._hasQuit == False:
-        if len(self._ready) == 0:
+        if not self._first and not any(self._levels):
           self._selectHub.idle()
           if self._hasQuit: break
         r = self.cycle()
@@ -295,35 +383,39 @@ class Scheduler (object):
       self._allDone = True
 
   def cycle (self):
-    #if len(self._ready) == 0: return False
+    t = self._next_task()
+    if t is None: return False
+    t._scheduled = False
+
+    start = _clock()
+    waited = start - t._queued_at
+    t.queue_time += waited
+    if waited > t.max_queue_time: t.max_queue_time = waited
+    t.run_count += 1
 
-    # Patented hilarious priority system
-    #TODO: Replace it with something better
-    t = None
     try:
-      while True:
-        t = self._ready.popleft()
-        if t.priority >= 1: break
-        if len(self._ready) == 0: break
-        if t.priority >= self._random(): break
-        self._ready.append(t)
-    except IndexError:
-      return False
+      self._run_slice(t)
+    finally:
+      elapsed = _clock() - start
+      t.run_time += elapsed
+      if self.slice_hook is not None:
+        self.slice_hook(t, elapsed, waited)
 
-    #print(len(self._ready), "tasks")
+    return True
 
+  def _run_slice (self, t):
     while True:
       try:
         rv = t.execute()
       except StopIteration:
-        return True
+        return
       except:
         try:
           print("Task", t, "caused an exception and was de-scheduled")
           traceback.print_exc()
         except:
           pass
-        return True
+        return
 
       if isinstance(rv, BlockingOperation):
         try:
@@ -341,7 +433,7 @@ class Scheduler (object):
         # Sleep time
         if rv == 0:
           #print "sleep 0"
-          self._ready.append(t)
+          self.fast_schedule(t)
         else:
           self._selectHub.registerTimer(t, rv)
       elif rv == None:
@@ -349,8 +441,6 @@ class Scheduler (object):
 
       break
 
-    return True
-
 
 #TODO: Read() and Write() BlockingOperations that use nonblocking sockets with
 #      SelectHub and do post-processing of the return value.
@@ -561,6 +651,51 @@ class Select (BlockingOperation):
     scheduler._selectHub.registerSelect(task, *self._args, **self._kw)
 
 
+class Poll (BlockingOperation):
+  """
+  Waits on a persistent SelectorSet (see pox.lib.epoll_select)
+
+  Select hands the SelectHub every file descriptor on every call, which
+  gets expensive when there are many of them.  Poll just hands it the
+  SelectorSet's own descriptor, and when that becomes readable, asks the
+  set which of its members are actually ready.  The return value is the
+  same (rlist, wlist, xlist) as for Select.
+
+  If the SelectorSet isn't pollable, this falls back to a normal Select
+  on all of its members (and its waker, so that changes to the set cut
+  the wait short).
+  """
+  def __init__ (self, selector_set, timeout = None):
+    self._set = selector_set
+    self._timeout = timeout
+
+  def _pollReturnFunc (self, task):
+    task.rv = None
+    return self._set.poll(0)
+
+  def _selectReturnFunc (self, task):
+    rl,wl,xl = task.rv
+    task.rv = None
+    waker = self._set.waker
+    if waker in rl:
+      waker.pongAll()
+      rl.remove(waker)
+    return (rl,wl,xl)
+
+  def execute (self, task, scheduler):
+    s = self._set
+    if s.pollable:
+      task.rf = self._pollReturnFunc
+      scheduler._selectHub.registerSelect(task, [s], None, None,
+                                          timeout=self._timeout)
+    else:
+      task.rf = self._selectReturnFunc
+      rl = s.read_list
+      wl = s.write_list
+      scheduler._selectHub.registerSelect(task, rl + [s.waker], wl, rl + wl,
+                                          timeout=self._timeout)
+
+
 defaultRecvFlags = 0
 try:
   defaultRecvFlags = socket.MSG_DONTWAIT
@@ -777,14 +912,75 @@ def task_function (f):
   return run
 
 
+class _Deadlines (object):
+  """
+  A heap of items ordered by the time they're due
+
+  push() returns an entry which can be passed to cancel().  Cancelled
+  entries are just marked dead and skipped when they reach the top, and
+  the heap is rebuilt without them if they come to make up most of it,
+  so both are O(log n).
+  """
+  def __init__ (self):
+    self._heap = []
+    self._dead = 0
+    self._count = itertools.count()
+
+  def __len__ (self):
+    return len(self._heap) - self._dead
+
+  def push (self, when, item):
+    entry = [when, next(self._count), item]
+    heapq.heappush(self._heap, entry)
+    return entry
+
+  def cancel (self, entry):
+    if entry[2] is None: return # Already cancelled or popped
+    entry[2] = None
+    self._dead += 1
+    if self._dead > 32 and self._dead * 2 > len(self._heap):
+      self._heap = [e for e in self._heap if e[2] is not None]
+      heapq.heapify(self._heap)
+      self._dead = 0
+
+  def next_time (self):
+    """
+    Returns when the next item is due (or None if there are none)
+    """
+    heap = self._heap
+    while heap and heap[0][2] is None:
+      heapq.heappop(heap)
+      self._dead -= 1
+    return heap[0][0] if heap else None
+
+  def pop_due (self, now, out):
+    """
+    Removes items due by now and appends them to out
+    """
+    heap = self._heap
+    while heap and heap[0][0] <= now:
+      entry = heapq.heappop(heap)
+      item = entry[2]
+      if item is None:
+        self._dead -= 1
+        continue
+      entry[2] = None
+      out.append(item)
+
+
 #TODO: just merge this in with Scheduler?
 class SelectHub (object):
   """
   This class is a single select() loop that handles all Select() requests for
-  a scheduler as well as timed wakes (i.e., Sleep()).
+  a scheduler as well as timed wakes (i.e., Sleep()) and Timers.
+
+  The file descriptors tasks are waiting on are kept in maps which are
+  updated as tasks start and stop waiting, and the deadlines of waiting
+  tasks and of Timers are kept in heaps, so the cost of a cycle doesn't
+  grow with the number of things waiting.
   """
   def __init__ (self, scheduler, use_epoll=False, threaded=True):
-    # We store tuples of (elapse-time, task)
+    # We store tuples of (task, rlist, wlist, xlist, timeout)
     self._incoming = Queue() # Threadsafe queue for new items
 
     self._scheduler = scheduler
@@ -794,7 +990,27 @@ class SelectHub (object):
     else:
       self._select_func = select.select
 
+    # Waiting tasks.  Maps task->(rlist, wlist, xlist, deadline entry)
     self._tasks = {}
+    # Maps file descriptors (or objects) to the tasks waiting on them.  If
+    # more than one task waits on the same one, the latest gets woken.
+    self._rl = {}
+    self._wl = {}
+    self._xl = {}
+    self._fd_lists = None # Lists for select_func, or None if stale
+    self._task_deadlines = _Deadlines()
+
+    # Timers can be added and cancelled from any thread, so they're
+    # protected by a lock.  Expired Timers are put in _due, and run by
+    # _timer_task on the scheduler.
+    self._timer_lock = threading.Lock()
+    self._timers = _Deadlines()
+    self._due = deque()
+    self._timer_task = _TimerTask(self)
+    self._timer_task_scheduled = False
+    # When the select() in progress will time out.  Adding a Timer which
+    # expires before then cycles the select.
+    self._wake_at = 0
 
     self._thread = None
     if threaded:
@@ -837,6 +1053,30 @@ class SelectHub (object):
     while not _scheduler._hasQuit:
       _select(tasks, rets)
 
+  def _add_task (self, task, trl, twl, txl, tto):
+    assert task not in self._tasks
+    entry = None
+    if tto is not None:
+      entry = self._task_deadlines.push(tto, task)
+    self._tasks[task] = (trl, twl, txl, entry)
+    for fds,m in ((trl,self._rl), (twl,self._wl), (txl,self._xl)):
+      if fds:
+        for i in fds: m.setdefault(i, []).append(task)
+        self._fd_lists = None
+
+  def _remove_task (self, task):
+    trl,twl,txl,entry = self._tasks.pop(task)
+    if entry is not None:
+      self._task_deadlines.cancel(entry)
+    for fds,m in ((trl,self._rl), (twl,self._wl), (txl,self._xl)):
+      if fds:
+        for i in fds:
+          waiting = m.get(i)
+          if waiting is None: continue
+          if task in waiting: waiting.remove(task)
+          if not waiting: del m[i]
+        self._fd_lists = None
+
   def _select (self, tasks, rets):
     #print("SelectHub cycle")
 
@@ -844,87 +1084,59 @@ class SelectHub (object):
     #      which are unique, obviously.  It might be possible to leverage this
     #      to reduce hashing cost (i.e. by picking a really good hashing
     #      function), though this is complicated by wrappers, etc...
-    rl = {}
-    wl = {}
-    xl = {}
+    with self._timer_lock:
+      wake = self._timers.next_time()
+      tto = self._task_deadlines.next_time()
+      if wake is None or (tto is not None and tto < wake): wake = tto
+      now = time.time()
+      if wake is None:
+        timeout = CYCLE_MAXIMUM
+      else:
+        timeout = max(0, wake - now)
+      self._wake_at = now + timeout
 
-    timeout = None
-    timeoutTask = None
+    if self._fd_lists is None:
+      self._fd_lists = (list(self._rl) + [self._pinger], list(self._wl),
+                        list(self._xl))
+    rl,wl,xl = self._fd_lists
+    ro, wo, xo = self._select_func(rl, wl, xl, timeout)
 
     now = time.time()
-
-    expired = None
-
-    #TODO: Fix this.  It's pretty expensive.  There had been some code which
-    #      priority heaped this, but I don't think a fully working version
-    #      ever quite made it.
-    for t,trl,twl,txl,tto in tasks.values():
-      if tto != None:
-        if tto <= now:
-          # Already expired
-          if expired is None: expired = []
-          expired.append(t)
-          if tto-now > 0.1: print("preexpired",tto,now,tto-now)
-          continue
-        tt = tto - now
-        if timeout is None or tt < timeout:
-          timeout = tt
-          timeoutTask = t
-
-      if trl:
-        for i in trl: rl[i] = t
-      if twl:
-        for i in twl: wl[i] = t
-      if txl:
-        for i in txl: xl[i] = t
-
-    if expired:
-      for t in expired:
-        del tasks[t]
-        self._return(t, ([],[],[]))
-
-    if timeout is None: timeout = CYCLE_MAXIMUM
-    ro, wo, xo = self._select_func( list(rl.keys()) + [self._pinger],
-                                    wl.keys(),
-                                    xl.keys(), timeout )
-
-    if len(ro) == 0 and len(wo) == 0 and len(xo) == 0 and timeoutTask != None:
-      # IO is idle - dispatch timers / release timeouts
-      del tasks[timeoutTask]
-      self._return(timeoutTask, ([],[],[]))
-    else:
-      # We have IO events
-      if self._pinger in ro:
-        self._pinger.pongAll()
-        while not self._incoming.empty():
-          stuff = self._incoming.get(True)
-          task = stuff[0]
-          assert task not in tasks
-          tasks[task] = stuff
-          self._incoming.task_done()
-        if len(ro) == 1 and len(wo) == 0 and len(xo) == 0:
-          # Just recycle
-          return
-        ro.remove(self._pinger)
-
-      # At least one thread is going to be resumed
-      for i in ro:
-        task = rl[i]
-        if task not in rets: rets[task] = ([],[],[])
-        rets[task][0].append(i)
-      for i in wo:
-        task = wl[i]
-        if task not in rets: rets[task] = ([],[],[])
-        rets[task][1].append(i)
-      for i in xo:
-        task = xl[i]
+    with self._timer_lock:
+      self._wake_at = 0
+      self._timers.pop_due(now, self._due)
+    if self._due and not self._timer_task_scheduled:
+      self._timer_task_scheduled = True
+      self._scheduler.fast_schedule(self._timer_task)
+
+    if self._pinger in ro:
+      self._pinger.pongAll()
+      while not self._incoming.empty():
+        stuff = self._incoming.get(True)
+        self._add_task(*stuff)
+        self._incoming.task_done()
+      ro.remove(self._pinger)
+
+    # Wake tasks with IO events
+    for l,m,i in ((ro,self._rl,0), (wo,self._wl,1), (xo,self._xl,2)):
+      for fd in l:
+        waiting = m.get(fd)
+        if not waiting: continue
+        task = waiting[-1]
         if task not in rets: rets[task] = ([],[],[])
-        rets[task][2].append(i)
+        rets[task][i].append(fd)
 
-      for t,v in rets.items():
-        del tasks[t]
-        self._return(t, v)
-      rets.clear()
+    for t,v in rets.items():
+      self._remove_task(t)
+      self._return(t, v)
+    rets.clear()
+
+    # Dispatch timed wakes / release timeouts
+    expired = []
+    self._task_deadlines.pop_due(now, expired)
+    for t in expired:
+      self._remove_task(t)
+      self._return(t, ([],[],[]))
 
   def registerSelect (self, task, rlist = None, wlist = None, xlist = None,
                       timeout = None, timeIsAbsolute = False):
@@ -949,12 +1161,62 @@ class SelectHub (object):
     return self.registerSelect(task, None, None, None, timeToWake,
                                timeIsAbsolute)
 
+  def addTimer (self, timer):
+    """
+    Start a Timer which has its expiry time (._next) set
+    """
+    with self._timer_lock:
+      timer._entry = self._timers.push(timer._next, timer)
+      wake = timer._next < self._wake_at
+    if wake: self._cycle()
+
+  def cancelTimer (self, timer):
+    with self._timer_lock:
+      if timer._entry is not None:
+        self._timers.cancel(timer._entry)
+        timer._entry = None
+
   def _return (self, sleepingTask, returnVal):
     #print("reschedule", sleepingTask)
     sleepingTask.rv = returnVal
     self._scheduler.fast_schedule(sleepingTask)
 
 
+class _TimerTask (BaseTask):
+  """
+  Runs the callbacks of expired Timers for a SelectHub
+  """
+  def __init__ (self, hub):
+    BaseTask.__init__(self)
+    self._hub = hub
+
+  def run (self):
+    hub = self._hub
+    due = hub._due
+    while True:
+      # Clear this before emptying due, so that anything the SelectHub
+      # adds after we're done will schedule us again.
+      hub._timer_task_scheduled = False
+      while due:
+        timer = due.popleft()
+        if timer._cancelled: continue
+        timer._entry = None
+        hook = hub._scheduler.timer_hook
+        if hook is not None: start = _clock()
+        try:
+          again = timer._fire()
+        except Exception:
+          import logging
+          logging.getLogger("recoco").exception("Exception in timer %s",
+                                                timer)
+          again = False
+        if hook is not None:
+          hook(timer, _clock() - start)
+        if again:
+          hub.addTimer(timer)
+      yield False
+
+
 class ScheduleTask (BaseTask):
   """
   If multiple real threads (such as a recoco scheduler thread and any
@@ -962,10 +1224,12 @@ class ScheduleTask (BaseTask):
   same Task with Scheduler.fast_schedule(), there is a race condition where
   the Task may get scheduled multiple times, which is probably quite bad.
 
-  Scheduler.schedule() fixes this by creating one of these ScheduleTasks,
-  and it's this ScheduleTask that actually calls fast_schedule().  This
-  way, the Task is only ever *really* scheduled from the scheduler thread
-  and the race condition doesn't exist.
+  Scheduler.schedule() used to fix this by creating one of these
+  ScheduleTasks, and it's this ScheduleTask that actually calls
+  fast_schedule().  This way, the Task is only ever *really* scheduled from
+  the scheduler thread and the race condition doesn't exist.  schedule()
+  now does the same thing with callLater(), which is cheaper; this is
+  still here for anyone using it directly.
   """
   def __init__ (self, scheduler, task):
     BaseTask.__init__(self)
@@ -977,9 +1241,7 @@ class ScheduleTask (BaseTask):
 
   def run (self):
     #TODO: Refactor the following, since it is copy/pasted from schedule().
-    if self._task in self._scheduler._ready:
-      # It might make sense to keep a flag on the task, since checking
-      # if it's in the ready list is not very efficient.
+    if self._task._scheduled:
       # Not sure if it makes sense to print out a message here or not.
       import logging
       logging.getLogger("recoco").info("Task %s scheduled multiple " +
@@ -1025,7 +1287,7 @@ class Synchronizer (object):
       self.syncer.outlock.release()
 
 
-class Timer (Task):
+class Timer (object):
   """
   A simple timer.
 
@@ -1037,13 +1299,16 @@ class Timer (Task):
   scheduler      The recoco scheduler to use (None means default scheduler)
   started        If False, requires you to call .start() to begin timer
   selfStoppable  If True, the callback can return False to cancel the timer
+
+  Timers aren't Tasks.  The scheduler's SelectHub keeps them in a heap, and
+  all the callbacks of expired ones are run by a single task, so having
+  thousands of them is cheap.
   """
   def __init__ (self, timeToWake, callback, absoluteTime = False,
                 recurring = False, args = (), kw = {}, scheduler = None,
                 started = True, selfStoppable = True):
     if absoluteTime and recurring:
       raise RuntimeError("Can't have a recurring timer for an absolute time!")
-    Task.__init__(self)
     self._self_stoppable = selfStoppable
     self._cancelled = False
 
@@ -1057,56 +1322,129 @@ class Timer (Task):
     self._absolute_time = absoluteTime
 
     self._started = False
+    self._hub = None
+    self._entry = None # Our entry in the SelectHub's heap
 
     if started: self.start(scheduler)
 
-  def start (self, *args, **kw):
+  def start (self, scheduler = None, *args, **kw):
     assert not self._started
+    if scheduler is None: scheduler = defaultScheduler
     if not self._absolute_time:
       self._next += time.time()
     self._started = True
-    return super(Timer,self).start(*args, **kw)
+    if self._cancelled: return
+    self._hub = scheduler._selectHub
+    self._hub.addTimer(self)
 
   def cancel (self):
+    if self._cancelled: return
     self._cancelled = True
+    if self._hub is not None:
+      self._hub.cancelTimer(self)
 
-  def run (self):
-    while not self._cancelled:
-      yield Sleep(timeToWake=self._next, absoluteTime=True)
-      if self._cancelled: break
-      self._next = time.time() + self._interval
-      rv = self._callback(*self._args,**self._kw)
-      if self._self_stoppable and (rv is False): break
-      if not self._recurring: break
-    yield False # Quit
+  def _fire (self):
+    """
+    Calls the callback
+
+    Returns True if the timer should be started again (at ._next)
+    """
+    self._next = time.time() + self._interval
+    rv = self._callback(*self._args,**self._kw)
+    if self._cancelled: return False
+    if self._self_stoppable and (rv is False): return False
+    return self._recurring
+
+  def __repr__ (self):
+    return "<%s %s>" % (type(self).__name__,
+                        getattr(self._callback, "__name__", self._callback))
 
 
 class CallLaterTask (BaseTask):
+  """
+  Runs functions submitted from any thread (see Scheduler.callLater())
+
+  Calls go on a deque (which is safe to append to from any thread without
+  a lock), and the task is woken with a pinger.  There's only one ping per
+  batch, though: after a ping, nobody pings again until the task has
+  woken up and started draining the queue, and then everything queued is
+  run in one go (up to batch_size calls before letting other tasks run).
+
+  Some statistics are kept: total_calls, total_batches, total_latency and
+  max_latency (seconds from submission to being run), and max_depth (the
+  biggest batch seen).  depth is the number of calls waiting right now.
+  """
+  batch_size = 1024
+
   def __init__ (self):
     BaseTask.__init__(self)
     self._pinger = pox.lib.util.makePinger()
-    from collections import deque
     self._calls = deque()
+    self._wake_pending = False # Has someone pinged since we last woke?
+    self.total_calls = 0
+    self.total_batches = 0
+    self.total_latency = 0.0
+    self.max_latency = 0.0
+    self.max_depth = 0
+
+  @property
+  def depth (self):
+    return len(self._calls)
 
   def callLater (self, func, *args, **kw):
     assert callable(func)
-    self._calls.append((func,args,kw))
-    self._pinger.ping()
+    self._calls.append((func,args,kw,_clock()))
+    if not self._wake_pending:
+      self._wake_pending = True
+      self._pinger.ping()
+
+  def callLaterMany (self, calls):
+    """
+    Submits a bunch of calls at once
+
+    Each of calls is a callable or a tuple of (callable, args[, kw]).
+    """
+    now = _clock()
+    append = self._calls.append
+    for c in calls:
+      if callable(c):
+        append((c,(),{},now))
+      else:
+        assert callable(c[0])
+        append((c[0], c[1] if len(c) > 1 else (),
+                c[2] if len(c) > 2 else {}, now))
+    if not self._wake_pending:
+      self._wake_pending = True
+      self._pinger.ping()
 
   def run (self):
+    calls = self._calls
     while True:
       yield Select([self._pinger], None, None)
       self._pinger.pongAll()
-      try:
-        while True:
-          e = self._calls.popleft()
+      # Clear this before draining, so that anything added after we're done
+      # pings us again.
+      self._wake_pending = False
+      if len(calls) > self.max_depth: self.max_depth = len(calls)
+      while calls:
+        self.total_batches += 1
+        now = _clock()
+        for _ in range(self.batch_size):
+          try:
+            func,args,kw,t = calls.popleft()
+          except IndexError:
+            break
+          latency = now - t
+          self.total_latency += latency
+          if latency > self.max_latency: self.max_latency = latency
+          self.total_calls += 1
           try:
-            e[0](*e[1], **e[2])
+            func(*args, **kw)
           except:
             import logging
-            logging.getLogger("recoco").exception("Exception calling %s", e[0])
-      except:
-        pass
+            logging.getLogger("recoco").exception("Exception calling %s", func)
+        if calls:
+          yield 0 # Let other tasks have a go before the next batch
 
 
 class BlockingTask (BaseTask):
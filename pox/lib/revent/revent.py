@@ -94,8 +94,6 @@ class Source (EventMixin):
 
 from __future__ import print_function
 
-import operator
-
 # weakrefs are used for some event handlers so that just having an event
 # handler set will not keep the source (publisher) alive.
 import weakref
@@ -196,6 +194,163 @@ def handleEventException (source, event, args, kw, exc_info):
   traceback.print_exception(*exc_info)
 
 
+def _handle_return (source, event, eid, rv):
+  """
+  Acts on a value other than None returned by an event handler
+
+  Returns True if no more handlers should be called.
+  """
+  if rv is False:
+    source.removeListener(eid)
+  if rv is True:
+    event.halt = True
+    return True
+  if type(rv) == tuple:
+    if len(rv) >= 2 and rv[1] == True:
+      source.removeListener(eid)
+    if len(rv) >= 1 and rv[0]:
+      event.halt = True
+      return True
+    if len(rv) == 0:
+      event.halt = True
+      return True
+  return event.halt
+
+
+def _dispatch_nothing (source, event):
+  pass
+
+
+# See set_handler_wrapper()
+_handler_wrapper = None
+
+# All initialized EventMixins, so their dispatch functions can be thrown away
+_mixins = weakref.WeakSet()
+
+def set_handler_wrapper (wrapper):
+  """
+  Sets a function which wraps event handlers (e.g., for profiling)
+
+  When an event's dispatch function is compiled, wrapper is called with
+  each handler and returns something to call in its place.  Dispatch
+  functions which have already been compiled are thrown away, so this
+  applies to everything from the next event on.  Pass None to go back to
+  calling handlers directly.
+  """
+  global _handler_wrapper
+  _handler_wrapper = wrapper
+  for m in list(_mixins):
+    m._eventMixin_dispatch.clear()
+
+
+def _compile_dispatch (eventType, handlers):
+  """
+  Builds a function which calls handlers for an event of type eventType
+
+  handlers is a list of (priority, handler, once, eid) entries, in the
+  order they should be called.  The function is called as f(source, event)
+  and handles return values the same way as EventMixin._eventMixin_raise().
+  Most event types don't override Event._invoke() and have no "once"
+  listeners, so there are simpler versions for those.
+  """
+  if not handlers:
+    return _dispatch_nothing
+
+  if _handler_wrapper is not None:
+    handlers = [(priority, _handler_wrapper(handler), once, eid)
+                for priority,handler,once,eid in handlers]
+
+  if (eventType._invoke is not Event._invoke
+      or any(once for priority,handler,once,eid in handlers)):
+    handlers = tuple(handlers)
+    def dispatch (source, event):
+      for priority,handler,once,eid in handlers:
+        rv = event._invoke(handler)
+        if once: source.removeListener(eid)
+        if rv is not None and _handle_return(source, event, eid, rv):
+          break
+    return dispatch
+
+  if len(handlers) == 1:
+    priority,handler,once,eid = handlers[0]
+    def dispatch (source, event):
+      rv = handler(event)
+      if rv is not None:
+        _handle_return(source, event, eid, rv)
+    return dispatch
+
+  handlers = tuple((handler,eid) for priority,handler,once,eid in handlers)
+  def dispatch (source, event):
+    for handler,eid in handlers:
+      rv = handler(event)
+      if rv is not None and _handle_return(source, event, eid, rv):
+        break
+  return dispatch
+
+
+class _Listeners (object):
+  """
+  The listeners for one event type on one EventMixin
+
+  Listeners are kept in buckets by priority, each a dict of EID -> entry
+  (which keeps them in the order they were added), so adding or removing
+  one doesn't mean searching or re-sorting all of them.  entries() gives
+  the (priority, handler, once, eid) entries in the order they should be
+  called, and is rebuilt only when it's asked for after a change.
+  """
+  __slots__ = ['buckets', 'priorities', 'count', '_entries']
+
+  def __init__ (self):
+    self.buckets = {} # priority -> {eid:entry}
+    self.priorities = [] # Highest first
+    self.count = 0
+    self._entries = ()
+
+  def add (self, entry):
+    priority = entry[0]
+    bucket = self.buckets.get(priority)
+    if bucket is None:
+      bucket = self.buckets[priority] = {}
+      self.priorities.append(priority)
+      self.priorities.sort(reverse = True)
+    bucket[entry[3]] = entry
+    self.count += 1
+    self._entries = None
+
+  def get (self, priority, eid):
+    return self.buckets[priority][eid]
+
+  def remove (self, priority, eid):
+    bucket = self.buckets[priority]
+    del bucket[eid]
+    if not bucket:
+      del self.buckets[priority]
+      self.priorities.remove(priority)
+    self.count -= 1
+    self._entries = None
+
+  def entries (self):
+    if self._entries is None:
+      self._entries = tuple(e for p in self.priorities
+                            for e in self.buckets[p].values())
+    return self._entries
+
+  def __iter__ (self):
+    return iter(self.entries())
+
+  def __len__ (self):
+    return self.count
+
+
+def _listener_owner (handler):
+  """
+  The object a handler belongs to (for EventMixin.removeListenersOf())
+  """
+  owner = getattr(handler, '__self__', None)
+  if owner is None: return handler
+  return owner
+
+
 class EventMixin (object):
   """
   Mixin for classes that want to source events
@@ -224,11 +379,18 @@ class EventMixin (object):
     if self._eventMixin_events is None:
       setattr(self, "_eventMixin_events", set())
     if not hasattr(self, "_eventMixin_handlers"):
+      # Event type -> _Listeners
       setattr(self, "_eventMixin_handlers", {})
-    if not hasattr(self, "_eventMixin_prioritized"):
-      setattr(self, "_eventMixin_prioritized", set())
-    #TODO: Avoid extra hash lookup by putting priority info on
-    #      the list of handlers instead of separate attribute.
+    # EID -> (event type, priority, id of owner)
+    self._eventMixin_eids = {}
+    # id of owner (see _listener_owner()) -> set of EIDs
+    self._eventMixin_owners = {}
+    # Maps event types to their dispatch functions (see raiseEvent())
+    self._eventMixin_dispatch = {}
+    try:
+      _mixins.add(self)
+    except TypeError:
+      pass # Not weakly referenceable; set_handler_wrapper() will miss it
 
   def raiseEventNoErrors (self, event, *args, **kw):
     """
@@ -256,40 +418,70 @@ class EventMixin (object):
     but only if there are actually listeners.
     Returns the event object, unless it was never created (because there
     were no listeners) in which case returns None.
+
+    Events are dispatched by a function compiled for the event type from
+    its current listeners (see _compile_dispatch()), which is thrown away
+    whenever listeners for that type are added or removed.  The handlers
+    called are the ones which were listening when the event was raised.
     """
     if self._eventMixin_initialized is False:
       self._eventMixin_init()
 
     if isinstance(event, Event):
       eventType = event.__class__
-      classCall = True
       if event.source is None: event.source = self
+      if args or kw:
+        return self._eventMixin_raise(event, eventType, True, args, kw)
+      dispatch = self._eventMixin_dispatch.get(eventType)
+      if dispatch is None:
+        dispatch = self._eventMixin_compile(eventType)
     elif issubclass(event, Event):
-      # Check for early-out
-      if event not in self._eventMixin_handlers:
-        return None
-      if len(self._eventMixin_handlers[event]) == 0:
-        return None
-
-      classCall = True
-      eventType = event
-      event = eventType(*args, **kw)
-      args = ()
-      kw = {}
+      dispatch = self._eventMixin_dispatch.get(event)
+      if dispatch is None:
+        # Check for early-out
+        if not self._eventMixin_handlers.get(event):
+          return None
+        dispatch = self._eventMixin_compile(event)
+      event = event(*args, **kw)
       if event.source is None:
         event.source = self
     else:
-      classCall = False
+      return self._eventMixin_raise(event, None, False, args, kw)
 
+    dispatch(self, event)
+    return event
+
+  def _eventMixin_compile (self, eventType):
+    """
+    Compiles and caches the dispatch function for eventType
+    """
+    if (self._eventMixin_events is not True
+        and eventType not in self._eventMixin_events):
+      raise ReventError("Event %s not defined on object of type %s"
+                        % (eventType, type(self)))
+    listeners = self._eventMixin_handlers.get(eventType)
+    dispatch = _compile_dispatch(eventType,
+                                 listeners.entries() if listeners else ())
+    self._eventMixin_dispatch[eventType] = dispatch
+    return dispatch
+
+  def _eventMixin_raise (self, event, eventType, classCall, args, kw):
+    """
+    Raises an event the slow way
+
+    This is used for events which aren't Event instances, and for Event
+    instances raised with extra arguments for their handlers.
+    """
     #print("raise",event,eventType)
     if (self._eventMixin_events is not True
         and eventType not in self._eventMixin_events):
       raise ReventError("Event %s not defined on object of type %s"
                         % (eventType, type(self)))
 
-    # Create a copy so that it can be modified freely during event
-    # processing.  It might make sense to change this.
-    handlers = self._eventMixin_handlers.get(eventType, [])
+    # entries() doesn't change if listeners are added or removed while
+    # we're going through it
+    listeners = self._eventMixin_handlers.get(eventType)
+    handlers = listeners.entries() if listeners else ()
     for (priority, handler, once, eid) in handlers:
       if classCall:
         rv = event._invoke(handler, *args, **kw)
@@ -333,54 +525,62 @@ class EventMixin (object):
     handlerOrEID : a reference to a handler object, an event ID (EID)
                    identifying the event type, or (eventType, EID) pair
     eventType : the type of event to remove the listener(s) for
-    """
-    #TODO: This method could use an elegant refactoring.
 
-    #print("Remove listener", handlerOrEID)
+    Returns True if any listeners were removed.
+    """
     self._eventMixin_init()
     handler = handlerOrEID
 
-    altered = False
     if type(handler) == tuple:
       # It's a type/eid pair
-      if eventType == None: eventType = handler[0]
-      handlers = self._eventMixin_handlers[eventType]
-      l = len(handlers)
-      self._eventMixin_handlers[eventType] = [x for x in handlers
-                                              if x[3] != handler[1]]
-      altered = altered or l != len(self._eventMixin_handlers[eventType])
-    elif type(handler) == int:
-      # It's an EID
-      if eventType == None:
-        for event in self._eventMixin_handlers:
-          handlers = self._eventMixin_handlers[event]
-          l = len(handlers)
-          self._eventMixin_handlers[event] = [x for x in handlers
-                                              if x[3] != handler]
-          altered = altered or l != len(self._eventMixin_handlers[event])
-      else:
-        l = len(handlers)
-        handlers = self._eventMixin_handlers[eventType]
-        self._eventMixin_handlers[eventType] = [x for x in handlers
-                                                if x[3] != handler]
-        altered = altered or l != len(self._eventMixin_handlers[event])
-    else:
-      if eventType == None:
-        for event in self._eventMixin_handlers:
-          handlers = self._eventMixin_handlers[event]
-          l = len(handlers)
-          self._eventMixin_handlers[event] = [x for x in handlers
-                                              if x[1] != handler]
-          altered = altered or l != len(self._eventMixin_handlers[event])
-      else:
-        handlers = self._eventMixin_handlers[eventType]
-        l = len(handlers)
-        self._eventMixin_handlers[eventType] = [x for x in handlers
-                                                if x[1] != handler]
-        altered = altered or l != len(self._eventMixin_handlers[eventType])
+      if eventType is None: eventType = handler[0]
+      handler = handler[1]
 
+    if type(handler) == int:
+      # It's an EID
+      info = self._eventMixin_eids.get(handler)
+      if info is None: return False
+      if eventType is not None and info[0] != eventType: return False
+      self._eventMixin_remove(handler)
+      return True
+
+    # Only handlers with the same owner can be equal to it
+    owned = self._eventMixin_owners.get(id(_listener_owner(handler)))
+    if not owned: return False
+    altered = False
+    for eid in list(owned):
+      t,priority,_ = self._eventMixin_eids[eid]
+      if eventType is not None and t != eventType: continue
+      if self._eventMixin_handlers[t].get(priority, eid)[1] == handler:
+        self._eventMixin_remove(eid)
+        altered = True
     return altered
 
+  def removeListenersOf (self, sink):
+    """
+    Removes all listeners which are methods of sink
+
+    This includes weak ones.  Returns the number removed.
+    """
+    self._eventMixin_init()
+    owned = self._eventMixin_owners.get(id(sink))
+    if not owned: return 0
+    count = len(owned)
+    for eid in list(owned):
+      self._eventMixin_remove(eid)
+    return count
+
+  def _eventMixin_remove (self, eid):
+    """
+    Removes the listener with the given EID (which must exist)
+    """
+    eventType,priority,owner = self._eventMixin_eids.pop(eid)
+    self._eventMixin_handlers[eventType].remove(priority, eid)
+    owned = self._eventMixin_owners[owner]
+    owned.discard(eid)
+    if not owned: del self._eventMixin_owners[owner]
+    self._eventMixin_dispatch.pop(eventType, None)
+
   def addListenerByName (self, *args, **kw):
     """
     Add a listener by name. An eventType argument must be present, which is
@@ -453,25 +653,23 @@ class EventMixin (object):
       if fail:
         raise ReventError("Event %s not defined on object of type %s"
                           % (eventType, type(self)))
-    if eventType not in self._eventMixin_handlers:
+    listeners = self._eventMixin_handlers.get(eventType)
+    if listeners is None:
       # if no handlers are already registered, initialize
-      handlers = self._eventMixin_handlers[eventType] = []
-      self._eventMixin_handlers[eventType] = handlers
-    else:
-      handlers = self._eventMixin_handlers[eventType]
+      listeners = self._eventMixin_handlers[eventType] = _Listeners()
 
     eid = _generateEventID()
+    owner = id(_listener_owner(handler))
 
     if weak: handler = CallProxy(self, handler, (eventType, eid))
 
-    entry = (priority, handler, once, eid)
-
-    handlers.append(entry)
-    if ( (priority != DEFAULT_PRIORITY) or
-        (eventType in self._eventMixin_prioritized) ):
-      # If priority is specified, sort the event handlers
-      self._eventMixin_prioritized.add(eventType)
-      handlers.sort(reverse = True, key = operator.itemgetter(0))
+    listeners.add((priority, handler, once, eid))
+    self._eventMixin_eids[eid] = (eventType, priority, owner)
+    owned = self._eventMixin_owners.get(owner)
+    if owned is None:
+      owned = self._eventMixin_owners[owner] = set()
+    owned.add(eid)
+    self._eventMixin_dispatch.pop(eventType, None)
 
     return (eventType,eid)
 
@@ -503,6 +701,10 @@ class EventMixin (object):
     Remove all handlers from this object
     """
     self._eventMixin_handlers = {}
+    self._eventMixin_init()
+    self._eventMixin_eids.clear()
+    self._eventMixin_owners.clear()
+    self._eventMixin_dispatch.clear()
 
 
 def autoBindEvents (sink, source, prefix='', weak=False,
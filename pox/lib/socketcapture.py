@@ -33,6 +33,11 @@ class SocketWedge (object):
     self._recv_out(r)
     return r
 
+  def recv_into (self, buffer, *args, **kw):
+    r = self._socket.recv_into(buffer, *args, **kw)
+    self._recv_out(bytes(buffer[:r]))
+    return r
+
   def __getattr__ (self, n):
     return getattr(self._socket, n)
 
@@ -77,6 +77,24 @@ class ConnectionDown (Event):
     self.connection = connection
     self.dpid = connection.dpid
 
+class ConnectionBackpressure (Event):
+  """
+  Raised when a connection's send queue crosses a watermark
+
+  congested (bool) - True if the amount of data queued to be sent to the
+                     switch has risen above the connection's high watermark,
+                     False if it has since drained below the low watermark
+  queued (int) - number of bytes currently queued
+
+  Applications which send a lot (e.g., installing many flows) can use this
+  to hold off until the switch catches up.
+  """
+  def __init__ (self, connection, congested):
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.congested = congested
+    self.queued = connection.send_queued
+
 class PortStatus (Event):
   """
   Fired in response to port status changes.
@@ -171,6 +189,7 @@ class PacketIn (Event):
   port (int) - number of port the packet came in on
   data (bytes) - raw packet data
   parsed (packet subclasses) - pox.lib.packet's parsed version
+  parsed_lazy (packet subclasses) - same, but parsed as it's used
   """
   def __init__ (self, connection, ofp):
     self.connection = connection
@@ -178,6 +197,7 @@ class PacketIn (Event):
     self.port = ofp.in_port
     self.data = ofp.data
     self._parsed = None
+    self._parsed_lazy = None
     self.dpid = connection.dpid
 
   def parse (self):
@@ -192,6 +212,39 @@ class PacketIn (Event):
     """
     return self.parse()
 
+  @property
+  def parsed_lazy (self):
+    """
+    The packet as lazily parsed by pox.lib.packet
+
+    Headers are only parsed when they're first used (see unpack_lazy() in
+    pox.lib.packet.packet_base), which is cheaper for handlers that only
+    look at a few fields.  If the packet has already been fully parsed,
+    you just get that.
+    """
+    if self._parsed is not None: return self._parsed
+    if self._parsed_lazy is None:
+      self._parsed_lazy = ethernet.unpack_lazy(self.data)
+    return self._parsed_lazy
+
+class PacketInBatch (Event):
+  """
+  Fired with all the packet-ins received in one read from a connection
+
+  events (list of PacketIn) - the packet-ins, in the order they arrived
+
+  This is fired after the individual PacketIn events, and is for handlers
+  that can do better by looking at several packets at once (e.g., by
+  grouping flow_mods for the same destination).  Packets whose PacketIn
+  event was halted (e.g., LLDP packets handled by discovery) are left out,
+  so it's not fired at all if they all were.  Nothing is batched unless
+  someone is listening for this event.
+  """
+  def __init__ (self, connection, events):
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.events = events
+
 class ErrorIn (Event):
   def __init__ (self, connection, ofp):
     self.connection = connection
@@ -337,9 +390,11 @@ class OpenFlowNexus (EventMixin):
     ConnectionHandshakeComplete,
     ConnectionUp,
     ConnectionDown,
+    ConnectionBackpressure,
     FeaturesReceived,
     PortStatus,
     PacketIn,
+    PacketInBatch,
     BarrierIn,
     ErrorIn,
     RawStatsReply,
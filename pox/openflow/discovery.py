@@ -26,29 +26,37 @@ Discovery module, or a Discovery superclass.
 from pox.lib.revent import *
 from pox.lib.recoco import Timer
 from pox.lib.util import dpid_to_str, str_to_bool
+from pox.lib.addresses import EthAddr
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 import pox.lib.packet as pkt
 
 import struct
 import time
-from collections import namedtuple
-from random import shuffle, random
+from collections import namedtuple, deque
 
 
 log = core.getLogger()
 
 
+# Offsets into a discovery packet_out (with a single output action) of the
+# output port, the Ethernet source, and the first LLDP TLV
+_PO_PORT_OFFSET = 20
+_PO_SRC_OFFSET = 24 + 6
+_PO_LLDP_OFFSET = 24 + 14
+
+
 class LLDPSender (object):
   """
   Sends out discovery packets
-  """
 
-  SendItem = namedtuple("LLDPSenderItem", ('dpid','port_num','packet'))
+  Packets are kept per switch, and all of a switch's packets go out
+  together as a single write.  Switches take turns, spread over the send
+  cycle so that the overall rate stays about even.  A switch whose
+  connection is congested is put off until later in the cycle (once).
 
-  #NOTE: This class keeps the packets to send in a flat list, which makes
-  #      adding/removing them on switch join/leave or (especially) port
-  #      status changes relatively expensive. Could easily be improved.
+  last_cycle holds stats about the last complete send cycle.
+  """
 
   # Maximum times to run the timer per second
   _sends_per_sec = 15
@@ -65,20 +73,45 @@ class LLDPSender (object):
       consider the rest of the data to be valid.  We don't use this, but
       other LLDP agents might.  Can't be 0 (this means revoke).
     """
-    # Packets remaining to be sent in this cycle
-    self._this_cycle = []
+    # Packets for each switch.  dpid -> {port_num:packet}
+    self._packets = {}
+    self._num_packets = 0
+
+    # Packet templates.  (dpid,port ID length) -> (packet,port ID offset)
+    self._templates = {}
+
+    # DPIDs of switches remaining to be sent to in this cycle
+    self._this_cycle = deque()
+
+    # DPIDs of switches we've already sent to in this cycle
+    self._next_cycle = deque()
+
+    # DPIDs in either of the above
+    self._queued = set()
 
-    # Packets we've already sent in this cycle
-    self._next_cycle = []
+    # DPIDs put off until later in this cycle due to congestion
+    self._deferred = set()
 
-    # Packets to send in a batch
+    # Packets to send per timer run (may be fractional), and how many
+    # we can send now.  This goes negative when we send a big switch's
+    # worth at once, which slows the following runs down.
     self._send_chunk_size = 1
+    self._credit = 0
+
+    self.cycles = 0
+    self.last_cycle = None
+    self._cycle = self._new_cycle_stats()
 
     self._timer = None
     self._ttl = ttl
     self._send_cycle_time = send_cycle_time
     core.listen_to_dependencies(self)
 
+  @staticmethod
+  def _new_cycle_stats ():
+    return dict(start=time.time(), duration=None, switches=0, packets=0,
+                bytes=0, deferred=0)
+
   def _handle_openflow_PortStatus (self, event):
     """
     Track changes to switch ports
@@ -106,30 +139,37 @@ class LLDPSender (object):
     self.del_switch(event.dpid)
 
   def del_switch (self, dpid, set_timer = True):
-    self._this_cycle = [p for p in self._this_cycle if p.dpid != dpid]
-    self._next_cycle = [p for p in self._next_cycle if p.dpid != dpid]
+    # It's dropped from the cycle queues when it comes up in them
+    packets = self._packets.pop(dpid, None)
+    if packets: self._num_packets -= len(packets)
+    for key in [k for k in self._templates if k[0] == dpid]:
+      del self._templates[key]
     if set_timer: self._set_timer()
 
   def del_port (self, dpid, port_num, set_timer = True):
     if port_num > of.OFPP_MAX: return
-    self._this_cycle = [p for p in self._this_cycle
-                        if p.dpid != dpid or p.port_num != port_num]
-    self._next_cycle = [p for p in self._next_cycle
-                        if p.dpid != dpid or p.port_num != port_num]
+    packets = self._packets.get(dpid)
+    if packets is None or packets.pop(port_num, None) is None: return
+    self._num_packets -= 1
+    if not packets: del self._packets[dpid]
     if set_timer: self._set_timer()
 
   def add_port (self, dpid, port_num, port_addr, set_timer = True):
     if port_num > of.OFPP_MAX: return
-    self.del_port(dpid, port_num, set_timer = False)
     packet = self.create_packet_out(dpid, port_num, port_addr)
-    self._next_cycle.insert(0, LLDPSender.SendItem(dpid, port_num, packet))
+    packets = self._packets.setdefault(dpid, {})
+    if port_num not in packets: self._num_packets += 1
+    packets[port_num] = packet
+    if dpid not in self._queued:
+      self._queued.add(dpid)
+      self._next_cycle.append(dpid)
     if set_timer: self._set_timer()
     core.openflow.sendToDPID(dpid, packet) # Send one immediately
 
   def _set_timer (self):
     if self._timer: self._timer.cancel()
     self._timer = None
-    num_packets = len(self._this_cycle) + len(self._next_cycle)
+    num_packets = self._num_packets
 
     if num_packets == 0: return
 
@@ -148,31 +188,108 @@ class LLDPSender (object):
     """
     Called by a timer to actually send packets.
 
-    Picks the first packet off this cycle's list, sends it, and then puts
-    it on the next-cycle list.  When this cycle's list is empty, starts
-    the next cycle.
+    Takes switches off the front of this cycle's queue and sends all of
+    their packets until we've sent about a chunk's worth, and puts them on
+    the next cycle's queue.  When this cycle's queue is empty, starts the
+    next cycle.
     """
-    num = int(self._send_chunk_size)
-    fpart = self._send_chunk_size - num
-    if random() < fpart: num += 1
-
-    for _ in range(num):
-      if len(self._this_cycle) == 0:
-        self._this_cycle = self._next_cycle
-        self._next_cycle = []
-        #shuffle(self._this_cycle)
-      item = self._this_cycle.pop(0)
-      self._next_cycle.append(item)
-      core.openflow.sendToDPID(item.dpid, item.packet)
+    self._credit = min(self._credit + self._send_chunk_size,
+                       self._send_chunk_size)
+    stats = self._cycle
+    put_off = 0
+    while self._credit > 0:
+      if not self._this_cycle:
+        if not self._next_cycle: break
+        self._end_cycle()
+        stats = self._cycle
+      dpid = self._this_cycle.popleft()
+      packets = self._packets.get(dpid)
+      if not packets:
+        # Switch is gone
+        self._queued.discard(dpid)
+        continue
+      con = core.openflow.getConnection(dpid)
+      if con is None:
+        # Not connected (yet?); count it as its turn anyway
+        self._next_cycle.append(dpid)
+        self._credit -= len(packets)
+        continue
+      if getattr(con, 'congested', False) and dpid not in self._deferred:
+        # Put it off until later in the cycle.  (If it's still congested
+        # then, we send anyway -- better than having its links time out.)
+        self._deferred.add(dpid)
+        self._this_cycle.append(dpid)
+        stats['deferred'] += 1
+        put_off += 1
+        if put_off >= len(self._this_cycle): break
+        continue
+      data = b''.join(packets.values())
+      con.send(data)
+      self._next_cycle.append(dpid)
+      self._credit -= len(packets)
+      stats['switches'] += 1
+      stats['packets'] += len(packets)
+      stats['bytes'] += len(data)
+
+  def _end_cycle (self):
+    stats = self._cycle
+    if stats['switches'] == 0 and stats['deferred'] == 0:
+      # Nothing happened (e.g., we're just starting up)
+      self._cycle = self._new_cycle_stats()
+      self._this_cycle,self._next_cycle = self._next_cycle,self._this_cycle
+      return
+    stats['duration'] = time.time() - stats['start']
+    self.last_cycle = stats
+    self.cycles += 1
+    log.debug("LLDP cycle %s: %s switches, %s packets, %s bytes, "
+              "%s deferred in %0.2fs", self.cycles, stats['switches'],
+              stats['packets'], stats['bytes'], stats['deferred'],
+              stats['duration'])
+    self._cycle = self._new_cycle_stats()
+    self._deferred.clear()
+    self._this_cycle,self._next_cycle = self._next_cycle,self._this_cycle
 
   def create_packet_out (self, dpid, port_num, port_addr):
     """
     Create an ofp_packet_out containing a discovery packet
+
+    The packets for a switch only differ in the port number (in the output
+    action and the port ID TLV), the source address and the XID, so we
+    build a template once and patch those in.  Since the port ID is a
+    string, there's a template for each length of it.
+    """
+    port_id = str(port_num).encode()
+    key = (dpid, len(port_id))
+    t = self._templates.get(key)
+    if t is None:
+      t = self._create_template(dpid, len(port_id))
+      self._templates[key] = t
+    template,port_id_offset = t
+    po = bytearray(template)
+    struct.pack_into("!L", po, 4, of.generate_xid())
+    struct.pack_into("!H", po, _PO_PORT_OFFSET, port_num)
+    po[_PO_SRC_OFFSET:_PO_SRC_OFFSET+6] = port_addr.toRaw()
+    po[port_id_offset:port_id_offset+len(port_id)] = port_id
+    return bytes(po)
+
+  def _create_template (self, dpid, port_id_len):
+    """
+    Create a template packet_out for create_packet_out()
+
+    Returns the packed packet_out and the offset of the port ID string.
     """
-    eth = self._create_discovery_packet(dpid, port_num, port_addr, self._ttl)
+    port_num = 10 ** (port_id_len - 1) # Any port with the right length
+    eth = self._create_discovery_packet(dpid, port_num, EthAddr.BROADCAST,
+                                        self._ttl)
     po = of.ofp_packet_out(action = of.ofp_action_output(port=port_num))
     po.data = eth.pack()
-    return po.pack()
+    po = po.pack()
+    # The port ID TLV directly follows the chassis ID TLV
+    chassis_len = struct.unpack_from("!H", po, _PO_LLDP_OFFSET)[0] & 0x1ff
+    port_id_offset = _PO_LLDP_OFFSET + 2 + chassis_len + 3
+    assert po[port_id_offset:port_id_offset+port_id_len] == \
+           str(port_num).encode()
+    return po,port_id_offset
 
   @staticmethod
   def _create_discovery_packet (dpid, port_num, port_addr, ttl):
@@ -281,6 +398,9 @@ class Discovery (EventMixin):
     if link_timeout: self._link_timeout = link_timeout
 
     self.adjacency = {} # From Link to time.time() stamp
+
+    # DPIDs of switches connected to other POX processes (openflow.shard)
+    self.remote_switches = set()
     self._sender = LLDPSender(self.send_cycle_time)
 
     # Listen with a high priority (mostly so we get PacketIns early)
@@ -293,6 +413,13 @@ class Discovery (EventMixin):
   def send_cycle_time (self):
     return self._link_timeout / 2.0
 
+  @property
+  def lldp_stats (self):
+    """
+    Stats about the last complete LLDP send cycle (or None)
+    """
+    return self._sender.last_cycle
+
   def install_flow (self, con_or_dpid, priority = None):
     if priority is None:
       priority = self._flow_priority
@@ -321,9 +448,7 @@ class Discovery (EventMixin):
 
   def _handle_openflow_ConnectionDown (self, event):
     # Delete all links on this switch
-    self._delete_links([link for link in self.adjacency
-                        if link.dpid1 == event.dpid
-                        or link.dpid2 == event.dpid])
+    self.remove_switch_links(event.dpid)
 
   def _expire_links (self):
     """
@@ -426,7 +551,8 @@ class Discovery (EventMixin):
       log.warning("Couldn't find a DPID in the LLDP packet")
       return EventHalt
 
-    if originatorDPID not in core.openflow.connections:
+    if (originatorDPID not in core.openflow.connections
+        and originatorDPID not in self.remote_switches):
       log.info('Received LLDP packet from unknown switch')
       return EventHalt
 
@@ -466,6 +592,29 @@ class Discovery (EventMixin):
 
     return EventHalt # Probably nobody else needs this event
 
+  def add_remote_link (self, link):
+    """
+    Adds a link which was discovered by another POX process
+
+    These don't time out; the process which found the link removes it
+    (with remove_link()) when it goes away.
+    """
+    if link in self.adjacency: return
+    self.adjacency[link] = float('inf')
+    log.info('remote link detected: %s', link)
+    self.raiseEventNoErrors(LinkEvent, True, link)
+
+  def remove_link (self, link):
+    if link in self.adjacency:
+      self._delete_links([link])
+
+  def remove_switch_links (self, dpid):
+    """
+    Removes all links to or from the given switch
+    """
+    self._delete_links([link for link in self.adjacency
+                        if link.dpid1 == dpid or link.dpid2 == dpid])
+
   def _delete_links (self, links):
     for link in links:
       self.raiseEventNoErrors(LinkEvent, False, link)
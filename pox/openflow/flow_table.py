@@ -21,6 +21,7 @@ from pox.lib.revent import *
 
 import time
 import math
+import heapq
 
 # FlowTable Entries:
 #   match - ofp_match (13-tuple)
@@ -125,6 +126,21 @@ class TableEntry (object):
         return True
     return False
 
+  @property
+  def expiration_time (self):
+    """
+    The time after which this entry expires if it isn't touched again
+
+    None if the entry has no timeouts.
+    """
+    t = None
+    if self.idle_timeout > 0:
+      t = self.last_touched + self.idle_timeout
+    if self.hard_timeout > 0:
+      hard = self.created + self.hard_timeout
+      if t is None or hard < t: t = hard
+    return t
+
   def is_expired (self, now=None):
     """
     Tests whether this flow entry is expired due to its idle or hard timeout
@@ -193,21 +209,236 @@ class FlowTableModification (Event):
     self.reason = reason
 
 
+# Match fields in the order they appear in index keys.  nw_src and nw_dst
+# must be at _NW_SRC and _NW_DST since they're handled specially.
+_KEY_FIELDS = ('in_port', 'dl_src', 'dl_dst', 'dl_vlan', 'dl_vlan_pcp',
+               'dl_type', 'nw_tos', 'nw_proto', 'tp_src', 'tp_dst',
+               'nw_src', 'nw_dst')
+_NW_SRC = 10
+_NW_DST = 11
+
+def _ip_value (ip):
+  if ip is None: return None
+  if type(ip) is not IPAddr: ip = IPAddr(ip)
+  return ip.toUnsigned()
+
+def _eth_value (eth):
+  if eth is None or type(eth) is EthAddr: return eth
+  return EthAddr(eth)
+
+def _match_vector (match):
+  """
+  Returns (values, nw_src_bits, nw_dst_bits) for an ofp_match
+
+  values is a tuple of the match's field values in _KEY_FIELDS order with
+  None for wildcarded fields.  Addresses are normalized so that they
+  compare and hash the way matches_with_wildcards() compares them.
+  """
+  values = [getattr(match, f) for f in _KEY_FIELDS[:_NW_SRC]]
+  values[1] = _eth_value(values[1])
+  values[2] = _eth_value(values[2])
+  nw_src,nw_src_bits = match.get_nw_src()
+  nw_dst,nw_dst_bits = match.get_nw_dst()
+  values.append(_ip_value(nw_src))
+  values.append(_ip_value(nw_dst))
+  return tuple(values),nw_src_bits,nw_dst_bits
+
+
+class _TupleSpace (object):
+  """
+  The entries of a FlowTable which share a wildcard mask
+
+  Entries are hashed on the values of just the fields the mask matches on,
+  so finding the entries in this space which match a packet is a single
+  dict lookup.
+  """
+  def __init__ (self, fields, nw_src_bits, nw_dst_bits):
+    self.mask = (fields, nw_src_bits, nw_dst_bits)
+    self.fields = fields # Indexes into a match vector
+    self.nw_src_bits = nw_src_bits
+    self.nw_dst_bits = nw_dst_bits
+    self.nw_src_mask = 0xffFFffFF ^ ((1 << (32 - nw_src_bits)) - 1)
+    self.nw_dst_mask = 0xffFFffFF ^ ((1 << (32 - nw_dst_bits)) - 1)
+
+    # key -> list of entries in table order
+    self.table = {}
+    self.count = 0
+
+    # An upper bound on the effective_priority of entries in this space
+    self.max_priority = -1
+
+  @staticmethod
+  def mask_of (vector):
+    values,nw_src_bits,nw_dst_bits = vector
+    fields = tuple(i for i in range(_NW_SRC) if values[i] is not None)
+    return (fields, nw_src_bits, nw_dst_bits)
+
+  def entry_key (self, values):
+    """
+    Key for an entry in this space (or a match with the same mask)
+    """
+    key = [values[i] for i in self.fields]
+    if self.nw_src_bits: key.append(values[_NW_SRC])
+    if self.nw_dst_bits: key.append(values[_NW_DST])
+    return tuple(key)
+
+  def packet_key (self, values):
+    """
+    Key for an exact match, with the addresses masked to this space's prefixes
+
+    (Like IPAddr.inNetwork(), only the packet's address is masked, so an
+    entry with host bits set past its prefix length never matches.)
+    """
+    key = [values[i] for i in self.fields]
+    if self.nw_src_bits:
+      v = values[_NW_SRC]
+      key.append(None if v is None else v & self.nw_src_mask)
+    if self.nw_dst_bits:
+      v = values[_NW_DST]
+      key.append(None if v is None else v & self.nw_dst_mask)
+    return tuple(key)
+
+  def covers (self, fields, nw_src_bits, nw_dst_bits):
+    """
+    Could entries in this space be within a match with the given mask?
+    """
+    if nw_src_bits > self.nw_src_bits: return False
+    if nw_dst_bits > self.nw_dst_bits: return False
+    return set(fields).issubset(self.fields)
+
+  def within (self, fields, nw_src_bits, nw_dst_bits):
+    """
+    Could entries in this space encompass a match with the given mask?
+    """
+    if nw_src_bits < self.nw_src_bits: return False
+    if nw_dst_bits < self.nw_dst_bits: return False
+    return set(self.fields).issubset(fields)
+
+
 class FlowTable (EventMixin):
   """
   General model of a flow table.
 
   Maintains an ordered list of flow entries, and finds matching entries for
   packets and other entries. Supports expiration of flows.
+
+  Besides the list, entries are indexed so that lookups don't need to scan
+  the whole table.  Exact-match entries are in a hash table keyed on all
+  of their fields.  Wildcarded entries are grouped into "tuple spaces" by
+  their wildcard mask and hashed within each space on the fields the mask
+  leaves exact (tuple space search), so a packet lookup costs one dict
+  lookup per distinct mask rather than one match comparison per entry.
+  Entries are also grouped by effective priority for overlap checks.
+
+  The index is built from the entry's match when the entry is added, so
+  don't change the match of an entry while it's in the table.
   """
   _eventMixin_events = set([FlowTableModification])
 
+  # Width of timing wheel slots (in seconds)
+  expiration_granularity = 1.0
+
   def __init__ (self):
     EventMixin.__init__(self)
 
     # Table is a list of TableEntry sorted by descending effective_priority.
     self._table = []
 
+    # entry -> ((effective_priority, sequence), tuple space or None, key)
+    # The order tuple sorts the same as the table (newer entries come before
+    # older ones of the same priority).
+    self._index = {}
+    self._sequence = 0
+
+    # Exact-match entries: match vector values -> list of entries
+    self._exact = {}
+
+    # Tuple spaces by mask, and the spaces in descending max_priority order
+    # (or None if that needs recalculating)
+    self._spaces = {}
+    self._space_order = None
+
+    # effective_priority -> set of entries
+    self._by_priority = {}
+
+    # Timing wheel for entries with timeouts.  Time is divided into slots
+    # of expiration_granularity seconds, and each entry is in the slot for
+    # its expiration_time.  Touching an entry doesn't move it; it's just
+    # rescheduled when its old slot comes due.  _wheel_slots holds the
+    # current slot of each entry, so removed entries leave stale items
+    # behind which are skipped (and occasionally purged).
+    self._wheel = {} # slot -> [entries]
+    self._wheel_heap = [] # Heap of slots in _wheel
+    self._wheel_slots = {} # entry -> slot
+    self._wheel_size = 0 # Number of items in _wheel, including stale ones
+
+  def _index_entry (self, entry):
+    priority = entry.effective_priority
+    self._sequence += 1
+    order = (priority, self._sequence)
+    vector = _match_vector(entry.match)
+    if not entry.match.is_wildcarded:
+      space = None
+      key = vector[0]
+      entries = self._exact.setdefault(key, [])
+    else:
+      mask = _TupleSpace.mask_of(vector)
+      space = self._spaces.get(mask)
+      if space is None:
+        space = _TupleSpace(*mask)
+        self._spaces[mask] = space
+        self._space_order = None
+      key = space.entry_key(vector[0])
+      entries = space.table.setdefault(key, [])
+      space.count += 1
+      if priority > space.max_priority:
+        space.max_priority = priority
+        self._space_order = None
+    # New entries go in front of older ones with the same priority
+    index = self._index
+    i = 0
+    while i < len(entries) and index[entries[i]][0] > order: i += 1
+    entries.insert(i, entry)
+    index[entry] = (order, space, key)
+    self._by_priority.setdefault(priority, set()).add(entry)
+    self._schedule_expiration(entry)
+
+  def _schedule_expiration (self, entry):
+    t = entry.expiration_time
+    if t is None: return
+    slot = int(t // self.expiration_granularity)
+    entries = self._wheel.get(slot)
+    if entries is None:
+      entries = self._wheel[slot] = []
+      heapq.heappush(self._wheel_heap, slot)
+    entries.append(entry)
+    self._wheel_slots[entry] = slot
+    self._wheel_size += 1
+
+  def _unindex_entry (self, entry):
+    order,space,key = self._index.pop(entry)
+    if self._wheel_slots.pop(entry, None) is not None:
+      if self._wheel_size > 2 * len(self._wheel_slots) + 1024:
+        # Mostly stale; rebuild it
+        live = list(self._wheel_slots)
+        self._wheel.clear()
+        del self._wheel_heap[:]
+        self._wheel_slots.clear()
+        self._wheel_size = 0
+        for e in live: self._schedule_expiration(e)
+    by_priority = self._by_priority[order[0]]
+    by_priority.discard(entry)
+    if not by_priority: del self._by_priority[order[0]]
+    table = self._exact if space is None else space.table
+    entries = table[key]
+    entries.remove(entry)
+    if not entries: del table[key]
+    if space is not None:
+      space.count -= 1
+      if space.count == 0:
+        del self._spaces[space.mask]
+        self._space_order = None
+
   def _dirty (self):
     """
     Call when table changes
@@ -241,6 +472,7 @@ class FlowTable (EventMixin):
           continue
         low = middle + 1
     table.insert(low, entry)
+    self._index_entry(entry)
 
     self._dirty()
 
@@ -249,12 +481,75 @@ class FlowTable (EventMixin):
   def remove_entry (self, entry, reason=None):
     assert isinstance(entry, TableEntry)
     self._table.remove(entry)
+    self._unindex_entry(entry)
     self._dirty()
     self.raiseEvent(FlowTableModification(removed=[entry], reason=reason))
 
+  def _ordered_spaces (self):
+    if self._space_order is None:
+      self._space_order = sorted(self._spaces.values(),
+                                 key=lambda s: s.max_priority, reverse=True)
+    return self._space_order
+
+  def _candidate_entries (self, match, strict):
+    """
+    Returns entries which might be matched by match, or None for all entries
+
+    The result is a superset of what is_matched_by() would accept and is in
+    no particular order.
+    """
+    vector = _match_vector(match)
+    values = vector[0]
+    if strict:
+      # Only entries with the same mask and values can be equal
+      if not match.is_wildcarded:
+        return self._exact.get(values, ())
+      space = self._spaces.get(_TupleSpace.mask_of(vector))
+      if space is None: return ()
+      return space.table.get(space.entry_key(values), ())
+
+    if not match.is_wildcarded:
+      # Only an identical exact match is within an exact match
+      return self._exact.get(values, ())
+    mask = _TupleSpace.mask_of(vector)
+    if not mask[0] and not mask[1] and not mask[2]:
+      return None # Everything is within an all-wildcards match
+    # Entries must be at least as specific as the match
+    candidates = []
+    for entries in self._exact.values():
+      candidates.extend(entries)
+    for space in self._spaces.values():
+      if space.covers(*mask):
+        for entries in space.table.values():
+          candidates.extend(entries)
+    return candidates
+
+  def _covering_entries (self, match):
+    """
+    Returns entries whose matches might encompass match
+
+    This is the reverse of _candidate_entries(match, strict=False).
+    """
+    vector = _match_vector(match)
+    values = vector[0]
+    mask = _TupleSpace.mask_of(vector)
+    candidates = []
+    if not match.is_wildcarded:
+      candidates.extend(self._exact.get(values, ()))
+    for space in self._spaces.values():
+      if space.within(*mask):
+        candidates.extend(space.table.get(space.packet_key(values), ()))
+    return candidates
+
   def matching_entries (self, match, priority=0, strict=False, out_port=None):
     entry_match = lambda e: e.is_matched_by(match, priority, strict, out_port)
-    return [ entry for entry in self._table if entry_match(entry) ]
+    candidates = self._candidate_entries(match, strict)
+    if candidates is None:
+      return [ entry for entry in self._table if entry_match(entry) ]
+    index = self._index
+    r = [ entry for entry in candidates if entry_match(entry) ]
+    r.sort(key=lambda e: index[e][0], reverse=True)
+    return r
 
   def flow_stats (self, match, out_port=None, now=None):
     mc_es = self.matching_entries(match=match, strict=False, out_port=out_port)
@@ -274,33 +569,72 @@ class FlowTable (EventMixin):
                                flow_count=flow_count)
 
   def _remove_specific_entries (self, flows, reason=None):
-    #for entry in flows:
-    #  self._table.remove(entry)
-    #self._table = [entry for entry in self._table if entry not in flows]
     if not flows: return
     self._dirty()
     remove_flows = set(flows)
-    i = 0
-    while i < len(self._table):
-      entry = self._table[i]
-      if entry in remove_flows:
-        del self._table[i]
-        remove_flows.remove(entry)
-        if not remove_flows: break
-      else:
-        i += 1
-    assert len(remove_flows) == 0
+    if len(remove_flows) == 1:
+      self._table.remove(flows[0])
+    else:
+      # Rebuild in one pass rather than deleting entries one at a time
+      table = [entry for entry in self._table if entry not in remove_flows]
+      assert len(table) == len(self._table) - len(remove_flows)
+      self._table[:] = table
+    for entry in remove_flows:
+      self._unindex_entry(entry)
     self.raiseEvent(FlowTableModification(removed=flows, reason=reason))
 
   def remove_expired_entries (self, now=None):
+    """
+    Removes entries whose idle or hard timeouts have passed
+
+    Only entries in timing wheel slots which have come due are looked at,
+    so this is cheap when little is expiring.
+    """
     idle = []
     hard = []
     if now is None: now = time.time()
-    for entry in self._table:
-      if entry.is_idle_timed_out(now):
-        idle.append(entry)
-      elif entry.is_hard_timed_out(now):
-        hard.append(entry)
+    current = int(now // self.expiration_granularity)
+    wheel = self._wheel
+    heap = self._wheel_heap
+    slots = self._wheel_slots
+    granularity = self.expiration_granularity
+    pending = []
+    while heap and heap[0] <= current:
+      slot = heapq.heappop(heap)
+      entries = wheel.pop(slot)
+      self._wheel_size -= len(entries)
+      for entry in entries:
+        if slots.get(entry) != slot: continue # Stale
+        slots[entry] = None # So duplicate items are stale
+        t = entry.expiration_time
+        if t >= now:
+          # Not due yet (or touched since it was scheduled).  Reschedule
+          # it after we're done so that we don't see it again.
+          pending.append((entry, t))
+        elif entry.is_idle_timed_out(now):
+          idle.append(entry)
+        elif entry.is_hard_timed_out(now):
+          hard.append(entry)
+        else:
+          pending.append((entry, now))
+    for entry in idle: del slots[entry]
+    for entry in hard: del slots[entry]
+
+    # This is _schedule_expiration() inlined, since it's the bulk of the work
+    for entry,t in pending:
+      slot = int(t // granularity)
+      entries = wheel.get(slot)
+      if entries is None:
+        entries = wheel[slot] = []
+        heapq.heappush(heap, slot)
+      entries.append(entry)
+      slots[entry] = slot
+    self._wheel_size += len(pending)
+
+    # Report them in table order
+    index = self._index
+    idle.sort(key=lambda e: index[e][0], reverse=True)
+    hard.sort(key=lambda e: index[e][0], reverse=True)
     self._remove_specific_entries(idle, OFPRR_IDLE_TIMEOUT)
     self._remove_specific_entries(hard, OFPRR_HARD_TIMEOUT)
 
@@ -318,37 +652,53 @@ class FlowTable (EventMixin):
     on the given in_port, or None if no matching entry is found.
     """
     packet_match = ofp_match.from_packet(packet, in_port, spec_frags = True)
-
-    for entry in self._table:
-      if entry.match.matches_with_wildcards(packet_match,
-                                            consider_other_wildcards=False):
-        return entry
-
-    return None
+    values = _match_vector(packet_match)[0]
+
+    # Exact matches beat everything else
+    if self._exact:
+      entries = self._exact.get(values)
+      if entries: return entries[0]
+
+    best = None
+    best_order = None
+    index = self._index
+    for space in self._ordered_spaces():
+      if best_order is not None and space.max_priority < best_order[0]:
+        break # Nothing in this or later spaces can beat what we've got
+      entries = space.table.get(space.packet_key(values))
+      if entries:
+        order = index[entries[0]][0]
+        if best_order is None or order > best_order:
+          best = entries[0]
+          best_order = order
+
+    return best
 
   def check_for_overlapping_entry (self, in_entry):
     """
     Tests if the input entry overlaps with another entry in this table.
 
-    Returns true if there is an overlap, false otherwise. Since the table is
-    sorted, there is only a need to check a certain portion of it.
+    Returns true if there is an overlap, false otherwise. Only entries with
+    the same effective priority can overlap, so only those are checked.
     """
-    #NOTE: Assumes that entries are sorted by decreasing effective_priority
     #NOTE: Ambiguous whether matching should be based on effective_priority
     #      or the regular priority.  Doing it based on effective_priority
     #      since that's what actually affects packet matching.
-    #NOTE: We could improve performance by doing a binary search to find the
-    #      right priority entries.
-
-    priority = in_entry.effective_priority
-
-    for e in self._table:
-      if e.effective_priority < priority:
-        break
-      elif e.effective_priority > priority:
-        continue
-      else:
-        if e.is_matched_by(in_entry.match) or in_entry.is_matched_by(e.match):
-          return True
+
+    same = self._by_priority.get(in_entry.effective_priority)
+    if not same: return False
+    in_match = in_entry.match
+
+    # Entries within in_entry
+    candidates = self._candidate_entries(in_match, strict=False)
+    if candidates is None or len(candidates) > len(same): candidates = same
+    for e in candidates:
+      if e in same and e.is_matched_by(in_match):
+        return True
+
+    # Entries encompassing in_entry
+    for e in self._covering_entries(in_match):
+      if e in same and in_entry.is_matched_by(e.match):
+        return True
 
     return False
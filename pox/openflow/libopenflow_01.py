@@ -103,7 +103,11 @@ def _read (data, offset, length):
   if (len(data)-offset) < length:
     raise UnderrunError("wanted %s bytes but only have %s"
                         % (length, len(data)-offset))
-  return (offset+length, data[offset:offset+length])
+  d = data[offset:offset+length]
+  # data may be a memoryview into a receive buffer which gets reused, so
+  # make sure we never hand out a reference into it.
+  if type(d) is not bytes: d = bytes(d)
+  return (offset+length, d)
 
 def _unpack (fmt, data, offset):
   size = struct.calcsize(fmt)
@@ -176,6 +180,7 @@ class ofp_base (object, metaclass=_ofp_meta):
   implement a __len__ instance method and set a class level _MIN_LENGTH
   attribute to your minimum length.
   """
+  __slots__ = () # So that subclasses can use __slots__ if they want
 
   def _assert (self):
     r = self._validate()
@@ -940,9 +945,50 @@ class ofp_queue_prop_min_rate (ofp_base):
 
 
 ##2.3 Flow Match Structures
+def _match_eth (v):
+  if v is None: return _EMPTY_ETH_RAW
+  if type(v) is bytes: return v
+  if type(v) is not EthAddr: v = EthAddr(v)
+  return v.toRaw()
+
+def _match_ip (v):
+  if v is None: return 0
+  if type(v) is int: return v & 0xffFFffFF
+  if type(v) is not IPAddr: v = IPAddr(v)
+  return v.toUnsigned()
+
+_EMPTY_ETH_RAW = EMPTY_ETH.toRaw()
+_match_struct = struct.Struct("!LH6s6sHBxHBBxxLLHH")
+
+# Headers for ofp_match.from_packet_data()
+_eth_header = struct.Struct("!6s6sH")
+_vlan_header = struct.Struct("!HH")
+_ipv4_header = struct.Struct("!BBHxxHxBxx4s4s") # vhl,tos,len,frag,proto,src,dst
+_arp_header = struct.Struct("!HHBBH")
+_ports_header = struct.Struct("!HH")
+_icmp_header = struct.Struct("!BB")
+
+
 class ofp_match (ofp_base):
+  """
+  An OpenFlow 1.0 match
+
+  Field values live in slots named after the fields with a leading
+  underscore, and the wildcards bitmask says which of them are in effect.
+  The public field attributes (in_port, dl_src, etc.) are properties
+  (installed below ofp_match_data) which return None for wildcarded fields.
+
+  The match's contents are also kept as a 40 byte key in the layout of the
+  wire format (but with wildcarded fields zeroed and without the
+  prerequisite fixups that pack() does).  It's built on demand, cached
+  until the match changes, and used for equality and hashing.
+  """
   adjust_wildcards = True # Set to true to "fix" outgoing wildcards
 
+  __slots__ = ('_locked', '_wildcards', '_key', '_in_port', '_dl_src',
+               '_dl_dst', '_dl_vlan', '_dl_vlan_pcp', '_dl_type', '_nw_tos',
+               '_nw_proto', '_nw_src', '_nw_dst', '_tp_src', '_tp_dst')
+
   @classmethod
   def from_packet (cls, packet, in_port = None, spec_frags = False):
     """
@@ -955,8 +1001,7 @@ class ofp_match (ofp_base):
     @param spec_frags Handle IP fragments as specified in the spec.
     """
     if isinstance(packet, ofp_packet_in):
-      in_port = packet.in_port
-      packet = ethernet(packet.data)
+      return cls.from_packet_data(packet.data, packet.in_port, spec_frags)
     assert assert_type("packet", packet, ethernet, none_ok=False)
 
     match = cls()
@@ -1012,11 +1057,122 @@ class ofp_match (ofp_base):
 
     return match
 
+  @classmethod
+  def from_packet_data (cls, data, in_port = None, spec_frags = False):
+    """
+    Constructs an exact match for a raw Ethernet frame
+
+    The result is the same as from_packet(ethernet(data), ...), but the
+    fields are pulled straight out of the bytes without building a parsed
+    packet.  Like from_packet(), this doesn't look inside LLC/SNAP headers.
+    Frames with truncated or otherwise odd headers are handed off to
+    from_packet() so that they get exactly the same treatment.
+
+    @param data       The frame as bytes (e.g., a packet_in's data)
+    @param in_port    The switch port the packet arrived on if you want
+                      the resulting match to have its in_port set.
+    @param spec_frags Handle IP fragments as specified in the spec.
+    """
+    if type(data) is not bytes: data = bytes(data)
+    dlen = len(data)
+    if dlen < 14:
+      return cls.from_packet(ethernet(data), in_port, spec_frags)
+
+    match = cls()
+    w = match._wildcards & _FROM_DATA_DL_WILDCARDS
+    if in_port is not None:
+      match._in_port = in_port
+      w &= ~OFPFW_IN_PORT
+
+    dst,src,dl_type = _eth_header.unpack_from(data)
+    match._dl_dst = EthAddr(dst)
+    match._dl_src = EthAddr(src)
+    offset = 14
+    if dl_type == 0x8100: # ethernet.VLAN_TYPE
+      if dlen < 18:
+        return cls.from_packet(ethernet(data), in_port, spec_frags)
+      tci,dl_type = _vlan_header.unpack_from(data, 14)
+      match._dl_vlan = tci & 0x0fff
+      match._dl_vlan_pcp = tci >> 13
+      offset = 18
+    else:
+      match._dl_vlan = OFP_VLAN_NONE
+      if dl_type < 1536:
+        # LLC; from_packet() stops here too
+        match._dl_type = OFP_DL_TYPE_NOT_ETH_TYPE
+        match._wildcards = w
+        return match
+    match._dl_type = dl_type
+
+    if dl_type == 0x0800: # ethernet.IP_TYPE
+      if dlen - offset < 20:
+        return cls.from_packet(ethernet(data), in_port, spec_frags)
+      vhl,tos,iplen,frag,proto,nw_src,nw_dst = \
+          _ipv4_header.unpack_from(data, offset)
+      hl = (vhl & 0x0f) * 4
+      if (vhl >> 4) != 4 or hl < 20 or hl > iplen or hl > dlen - offset:
+        return cls.from_packet(ethernet(data), in_port, spec_frags)
+      match._nw_tos = tos
+      match._nw_proto = proto
+      match._nw_src = IPAddr(nw_src)
+      match._nw_dst = IPAddr(nw_dst)
+      w &= _FROM_DATA_NW_WILDCARDS
+
+      if spec_frags and (frag & 0x3fff): # MF flag or fragment offset
+        # See from_packet()
+        w &= _FROM_DATA_TP_WILDCARDS
+      elif not (frag & 0x1fff):
+        tp = offset + hl
+        tp_len = min(iplen, dlen - offset) - hl
+        if proto == 17: # UDP
+          if tp_len >= 8:
+            match._tp_src,match._tp_dst = _ports_header.unpack_from(data, tp)
+            w &= _FROM_DATA_TP_WILDCARDS
+        elif proto == 6: # TCP
+          if tp_len >= 20:
+            off = (data[tp + 12] >> 4) * 4
+            if off == 20 or (off > 20 and off <= tp_len
+                and tcp(raw=data[tp:tp+tp_len]).parsed): # Check options
+              match._tp_src,match._tp_dst = _ports_header.unpack_from(data,
+                                                                      tp)
+              w &= _FROM_DATA_TP_WILDCARDS
+        elif proto == 1: # ICMP
+          if tp_len >= 4:
+            match._tp_src,match._tp_dst = _icmp_header.unpack_from(data, tp)
+            w &= _FROM_DATA_TP_WILDCARDS
+    elif dl_type == 0x0806 or dl_type == 0x8035: # ARP or RARP
+      if dlen - offset < 28:
+        return cls.from_packet(ethernet(data), in_port, spec_frags)
+      hwtype,prototype,hwlen,protolen,opcode = \
+          _arp_header.unpack_from(data, offset)
+      if hwtype != 1 or prototype != 0x0800 or hwlen != 6 or protolen != 4:
+        return cls.from_packet(ethernet(data), in_port, spec_frags)
+      if opcode <= 255:
+        match._nw_proto = opcode
+        match._nw_src = IPAddr(data[offset+14:offset+18])
+        match._nw_dst = IPAddr(data[offset+24:offset+28])
+        w &= _FROM_DATA_ARP_WILDCARDS
+
+    match._wildcards = w
+    return match
+
   def clone (self):
-    n = ofp_match()
-    for k,v in ofp_match_data.items():
-      setattr(n, '_' + k, getattr(self, '_' + k))
-    n.wildcards = self.wildcards
+    n = ofp_match.__new__(ofp_match)
+    n._locked = False
+    n._key = self._key
+    n._wildcards = self._wildcards
+    n._in_port = self._in_port
+    n._dl_src = self._dl_src
+    n._dl_dst = self._dl_dst
+    n._dl_vlan = self._dl_vlan
+    n._dl_vlan_pcp = self._dl_vlan_pcp
+    n._dl_type = self._dl_type
+    n._nw_tos = self._nw_tos
+    n._nw_proto = self._nw_proto
+    n._nw_src = self._nw_src
+    n._nw_dst = self._nw_dst
+    n._tp_src = self._tp_src
+    n._tp_dst = self._tp_dst
     return n
 
   def flip (self, in_port = True):
@@ -1038,20 +1194,43 @@ class ofp_match (ofp_base):
 
   def __init__ (self, **kw):
     self._locked = False
-
-    for k,v in ofp_match_data.items():
-      setattr(self, '_' + k, v[0])
-
-    self.wildcards = self._normalize_wildcards(OFPFW_ALL)
+    self._key = None
+
+    # These are the defaults from ofp_match_data
+    self._in_port = 0
+    self._dl_src = EMPTY_ETH
+    self._dl_dst = EMPTY_ETH
+    self._dl_vlan = 0
+    self._dl_vlan_pcp = 0
+    self._dl_type = 0
+    self._nw_tos = 0
+    self._nw_proto = 0
+    self._nw_src = 0
+    self._nw_dst = 0
+    self._tp_src = 0
+    self._tp_dst = 0
+
+    self._wildcards = _OFPFW_ALL_NORMALIZED
 
     # This is basically initHelper(), but tweaked slightly since this
     # class does some magic of its own.
     for k,v in kw.items():
-      if not hasattr(self, '_'+k):
+      if k not in ofp_match_data:
         raise TypeError(self.__class__.__name__ + " constructor got "
           + "unexpected keyword argument '" + k + "'")
       setattr(self, k, v)
 
+  @property
+  def wildcards (self):
+    return self._wildcards
+
+  @wildcards.setter
+  def wildcards (self, value):
+    if self._locked:
+      raise AttributeError('match object is locked')
+    self._key = None
+    self._wildcards = value
+
   def get_nw_dst (self):
     if (self.wildcards & OFPFW_NW_DST_ALL) == OFPFW_NW_DST_ALL:
       return (None, 0)
@@ -1067,6 +1246,8 @@ class ofp_match (ofp_base):
     return (self._nw_src,32-w if w <= 32 else 0)
 
   def set_nw_dst (self, *args, **kw):
+    if self._locked:
+      raise AttributeError('match object is locked')
     a = self._make_addr(*args, **kw)
     if a is None:
       self._nw_dst = ofp_match_data['nw_dst'][0]
@@ -1078,6 +1259,8 @@ class ofp_match (ofp_base):
     self.wildcards |= ((32-a[1]) << OFPFW_NW_DST_SHIFT)
 
   def set_nw_src (self, *args, **kw):
+    if self._locked:
+      raise AttributeError('match object is locked')
     a = self._make_addr(*args, **kw)
     if a is None:
       self._nw_src = ofp_match_data['nw_src'][0]
@@ -1116,44 +1299,6 @@ class ofp_match (ofp_base):
 
     return (ip, b)
 
-  def __setattr__ (self, name, value):
-    if name == '_locked':
-      super(ofp_match,self).__setattr__(name, value)
-      return
-
-    if self._locked:
-      raise AttributeError('match object is locked')
-
-    if name not in ofp_match_data:
-      self.__dict__[name] = value
-      return
-
-    if name == 'nw_dst' or name == 'nw_src':
-      # Special handling
-      getattr(self, 'set_' + name)(value)
-      return value
-
-    if value is None:
-      setattr(self, '_' + name, ofp_match_data[name][0])
-      self.wildcards |= ofp_match_data[name][1]
-    else:
-      setattr(self, '_' + name, value)
-      self.wildcards = self.wildcards & ~ofp_match_data[name][1]
-
-    return value
-
-  def __getattr__ (self, name):
-    if name in ofp_match_data:
-      if ( (self.wildcards & ofp_match_data[name][1])
-           == ofp_match_data[name][1] ):
-        # It's wildcarded -- always return None
-        return None
-      if name == 'nw_dst' or name == 'nw_src':
-        # Special handling
-        return getattr(self, 'get_' + name)()[0]
-      return self.__dict__['_' + name]
-    raise AttributeError("attribute not found: "+name)
-
   def _validate (self):
     # TODO
     return None
@@ -1184,50 +1329,28 @@ class ofp_match (ofp_base):
   def pack (self, flow_mod=False):
     assert self._assert()
 
-    packed = b""
     if self.adjust_wildcards and flow_mod:
       wc = self._wire_wildcards(self.wildcards)
       assert self._prereq_warning()
     else:
       wc = self.wildcards
-    packed += struct.pack("!LH", wc, self.in_port or 0)
-    if self.dl_src is None:
-      packed += EMPTY_ETH.toRaw()
-    elif type(self.dl_src) is bytes:
-      packed += self.dl_src
-    else:
-      packed += self.dl_src.toRaw()
-    if self.dl_dst is None:
-      packed += EMPTY_ETH.toRaw()
-    elif type(self.dl_dst) is bytes:
-      packed += self.dl_dst
-    else:
-      packed += self.dl_dst.toRaw()
-
-    def check_ip(val):
-      return (val or 0) if self.dl_type == 0x0800 else 0
-    def check_ip_or_arp(val):
-      return (val or 0) if self.dl_type == 0x0800 \
-                           or self.dl_type == 0x0806 else 0
-    def check_tp(val):
-      return (val or 0) if self.dl_type == 0x0800 \
-                           and self.nw_proto in (1,6,17) else 0
-
-    packed += struct.pack("!HB", self.dl_vlan or 0, self.dl_vlan_pcp or 0)
-    packed += _PAD # Hardcode padding
-    packed += struct.pack("!HBB", self.dl_type or 0,
-        check_ip(self.nw_tos), check_ip_or_arp(self.nw_proto))
-    packed += _PAD2 # Hardcode padding
-    def fix (addr):
-      if addr is None: return 0
-      if type(addr) is int: return addr & 0xffFFffFF
-      return addr.toUnsigned()
-
-    packed += struct.pack("!LLHH", check_ip_or_arp(fix(self.nw_src)),
-        check_ip_or_arp(fix(self.nw_dst)),
-        check_tp(self.tp_src), check_tp(self.tp_dst))
 
-    return packed
+    # Zero fields whose prerequisites aren't met
+    dl_type = self.dl_type
+    nw_proto = self.nw_proto
+    ip = dl_type == 0x0800
+    ip_or_arp = ip or dl_type == 0x0806
+    tp = ip and nw_proto in (1,6,17)
+
+    return _match_struct.pack(wc, self.in_port or 0,
+        _match_eth(self.dl_src), _match_eth(self.dl_dst),
+        self.dl_vlan or 0, self.dl_vlan_pcp or 0, dl_type or 0,
+        (self.nw_tos or 0) if ip else 0,
+        (nw_proto or 0) if ip_or_arp else 0,
+        _match_ip(self.nw_src) if ip_or_arp else 0,
+        _match_ip(self.nw_dst) if ip_or_arp else 0,
+        (self.tp_src or 0) if tp else 0,
+        (self.tp_dst or 0) if tp else 0)
 
   def _normalize_wildcards (self, wildcards):
     """
@@ -1375,6 +1498,30 @@ class ofp_match (ofp_base):
   def __len__ ():
     return 40
 
+  @property
+  def key (self):
+    """
+    The 40 byte key for this match (see class docstring)
+    """
+    key = self._key
+    if key is not None: return key
+    w = self._wildcards
+    key = _match_struct.pack(w,
+        0 if w & OFPFW_IN_PORT else self._in_port,
+        _match_eth(None if w & OFPFW_DL_SRC else self._dl_src),
+        _match_eth(None if w & OFPFW_DL_DST else self._dl_dst),
+        0 if w & OFPFW_DL_VLAN else self._dl_vlan,
+        0 if w & OFPFW_DL_VLAN_PCP else self._dl_vlan_pcp,
+        0 if w & OFPFW_DL_TYPE else self._dl_type,
+        0 if w & OFPFW_NW_TOS else self._nw_tos,
+        0 if w & OFPFW_NW_PROTO else self._nw_proto,
+        _match_ip(None if w & OFPFW_NW_SRC_ALL else self._nw_src),
+        _match_ip(None if w & OFPFW_NW_DST_ALL else self._nw_dst),
+        0 if w & OFPFW_TP_SRC else self._tp_src,
+        0 if w & OFPFW_TP_DST else self._tp_dst)
+    self._key = key
+    return key
+
   def hash_code (self):
     """
     generate a hash value for this match
@@ -1382,18 +1529,7 @@ class ofp_match (ofp_base):
     This generates a hash code which might be useful, but without locking
     the match object.
     """
-
-    h = self.wildcards
-    for f in ofp_match_data:
-      v = getattr(self, f)
-      if type(v) is int:
-        h ^= v
-      elif type(v) is int:
-        h ^= v
-      else:
-        h ^= hash(v)
-
-    return int(h & 0x7fFFffFF)
+    return hash(self.key) & 0x7fFFffFF
 
   def __hash__ (self):
     self._locked = True
@@ -1459,20 +1595,7 @@ class ofp_match (ofp_base):
 
   def __eq__ (self, other):
     if type(self) != type(other): return False
-    if self.wildcards != other.wildcards: return False
-    if self.in_port != other.in_port: return False
-    if self.dl_src != other.dl_src: return False
-    if self.dl_dst != other.dl_dst: return False
-    if self.dl_vlan != other.dl_vlan: return False
-    if self.dl_vlan_pcp != other.dl_vlan_pcp: return False
-    if self.dl_type != other.dl_type: return False
-    if self.nw_tos != other.nw_tos: return False
-    if self.nw_proto != other.nw_proto: return False
-    if self.nw_src != other.nw_src: return False
-    if self.nw_dst != other.nw_dst: return False
-    if self.tp_src != other.tp_src: return False
-    if self.tp_dst != other.tp_dst: return False
-    return True
+    return self.key == other.key
 
   def __str__ (self):
     return self.__class__.__name__ + "\n  " + self.show('  ').strip()
@@ -1511,7 +1634,7 @@ class ofp_match (ofp_base):
       outstr += show_wildcards(self.wildcards)
       outstr += ' (%s = %x)\n' % (binstr(self.wildcards), self.wildcards)
     def append (f, formatter=str):
-      v = self.__getattr__(f)
+      v = getattr(self, f)
       if v is None: return ''
       return prefix + f + ": " + formatter(v) + "\n"
     outstr += append('in_port')
@@ -4197,7 +4320,7 @@ class ofp_vendor_generic (ofp_vendor_base):
     offset,(self.vendor,) = _unpack("!L", raw, offset)
     offset,self.data = _read(raw, offset, length-12)
     if self._collect_raw:
-      self.raw = raw[_offset, _offset+length]
+      self.raw = bytes(raw[_offset:_offset+length])
     return offset,length
 
   def __len__ (self):
@@ -4478,3 +4601,41 @@ ofp_match_data = {
   'tp_src' : (0, OFPFW_TP_SRC),
   'tp_dst' : (0, OFPFW_TP_DST),
 }
+
+_OFPFW_ALL_NORMALIZED = ofp_match._normalize_wildcards(None, OFPFW_ALL)
+
+# Wildcard bits cleared by ofp_match.from_packet_data()
+_FROM_DATA_DL_WILDCARDS = ~(OFPFW_DL_SRC | OFPFW_DL_DST | OFPFW_DL_TYPE
+                            | OFPFW_DL_VLAN | OFPFW_DL_VLAN_PCP)
+_FROM_DATA_NW_WILDCARDS = ~(OFPFW_NW_TOS | OFPFW_NW_PROTO
+                            | OFPFW_NW_SRC_MASK | OFPFW_NW_DST_MASK)
+_FROM_DATA_ARP_WILDCARDS = ~(OFPFW_NW_PROTO
+                             | OFPFW_NW_SRC_MASK | OFPFW_NW_DST_MASK)
+_FROM_DATA_TP_WILDCARDS = ~(OFPFW_TP_SRC | OFPFW_TP_DST)
+
+def _make_match_field (name, default, bit):
+  attr = '_' + name
+  def get (self):
+    if self._wildcards & bit: return None # Wildcarded
+    return getattr(self, attr)
+  def set (self, value):
+    if self._locked:
+      raise AttributeError('match object is locked')
+    self._key = None
+    if value is None:
+      setattr(self, attr, default)
+      self._wildcards |= bit
+    else:
+      setattr(self, attr, value)
+      self._wildcards &= ~bit
+  return property(get, set)
+
+for _name,(_default,_bit) in ofp_match_data.items():
+  if _name in ('nw_src', 'nw_dst'): continue # Special handling
+  setattr(ofp_match, _name, _make_match_field(_name, _default, _bit))
+del _name, _default, _bit
+
+ofp_match.nw_src = property(lambda self: self.get_nw_src()[0],
+                            lambda self, v: self.set_nw_src(v))
+ofp_match.nw_dst = property(lambda self: self.get_nw_dst()[0],
+                            lambda self, v: self.set_nw_dst(v))
@@ -2832,9 +2832,7 @@ class NiciraOpenFlowHandlers (DefaultOpenFlowHandlers):
   @staticmethod
   def handle_VENDOR (con, msg):
       if isinstance(msg, nxt_packet_in) and core.NX.convert_packet_in:
-        e = con.ofnexus.raiseEventNoErrors(PacketIn, con, msg)
-        if e is None or e.halt != True:
-          con.raiseEventNoErrors(PacketIn, con, msg)
+        DefaultOpenFlowHandlers.handle_PACKET_IN(con, msg)
       elif isinstance(msg, nx_role_reply):
         e = con.ofnexus.raiseEventNoErrors(RoleReply, con, msg)
         if e is None or e.halt != True:
@@ -42,23 +42,22 @@ import select
 # type into a message object.
 unpackers = make_type_to_unpacker_table()
 
-try:
-  PIPE_BUF = select.PIPE_BUF
-except:
-  try:
-    # Try to get it from where PyPy (sometimes) has it
-    import IN
-    PIPE_BUF = IN.PIPE_BUF
-  except:
-    # (Hopefully) reasonable default
-    PIPE_BUF = 512
-
 import pox.openflow.libopenflow_01 as of
 
 import threading
 import os
 import sys
+from collections import deque
+from itertools import islice
 from errno import EAGAIN, ECONNRESET, EADDRINUSE, EADDRNOTAVAIL, EMFILE
+from pox.lib.recoco import BaseTask
+
+try:
+  # Maximum number of buffers in one sendmsg()
+  IOV_MAX = os.sysconf("SC_IOV_MAX")
+  if IOV_MAX <= 0: IOV_MAX = 16
+except Exception:
+  IOV_MAX = 16
 
 
 import traceback
@@ -193,7 +192,10 @@ class DefaultOpenFlowHandlers (OpenFlowHandlers):
   def handle_PACKET_IN (con, msg): #A
     e = con.ofnexus.raiseEventNoErrors(PacketIn, con, msg)
     if e is None or e.halt != True:
-      con.raiseEventNoErrors(PacketIn, con, msg)
+      e = con.raiseEventNoErrors(PacketIn, con, msg) or e
+      batch = con._packet_in_batch
+      if batch is not None and (e is None or e.halt != True):
+        batch.append(e or PacketIn(con, msg))
 
   @staticmethod
   def handle_ERROR (con, msg): #A
@@ -282,6 +284,22 @@ class HandshakeOpenFlowHandlers (OpenFlowHandlers):
     self._barrier = None
     super(HandshakeOpenFlowHandlers, self).__init__()
 
+  def take_over (self, con, data):
+    """
+    Picks up a handshake which was started somewhere else
+
+    The hello and features request have already been sent, and data is
+    whatever has been received from the switch so far.
+    """
+    self._features_request_sent = True
+    if self.request_description:
+      ss = of.ofp_stats_request()
+      ss.body = of.ofp_desc_stats_request()
+      con.send(ss)
+    con._make_room(len(data))
+    con._rbuf[con._rend:con._rend+len(data)] = data
+    con._rend += len(data)
+
   def handle_BARRIER_REPLY (self, con, msg):
     if not self._barrier: return
     if msg.xid != self._barrier.xid:
@@ -404,112 +422,53 @@ statsHandlerMap = {
 }
 
 
-# Deferred sending should be unusual, so don't worry too much about
-# efficiency
-class DeferredSender (threading.Thread):
-  """
-  Class that handles sending when a socket write didn't complete
+class SendFlusher (BaseTask):
   """
-  def __init__ (self):
-    threading.Thread.__init__(self)
-    core.addListeners(self)
-    self._dataForConnection = {}
-    self._lock = threading.RLock()
-    self._waker = pox.lib.util.makePinger()
-    self.sending = False
+  Sends data which has been queued on Connections
 
-    self.start()
-
-  def _handle_GoingDownEvent (self, event):
-    self._waker.ping()
+  Rather than writing to the socket every time Connection.send() is called,
+  Connections queue messages up and ask the flusher to run.  Since it runs
+  after whatever Tasks were already ready, everything sent to a switch
+  during a scheduler cycle goes out together in a single (vectored) write.
 
-  def _sliceup (self, data):
+  There is generally a single instance of this class which is shared by all
+  Connections.
+  """
+  def __init__ (self, scheduler = None):
+    BaseTask.__init__(self)
+    if scheduler is None: scheduler = core.scheduler
+    self._scheduler = scheduler
+    # add() may be called from other threads, so this is a deque (whose
+    # append() and popleft() are atomic) which run() drains in place.
+    self._pending = deque()
+    self._wake_pending = False
+
+  def add (self, con):
     """
-    Takes an array of data bytes, and slices into elements of
-    PIPE_BUF bytes each
+    Flush the given Connection soon
     """
-    out = []
-    while len(data) > PIPE_BUF:
-      out.append(data[0:PIPE_BUF])
-      data = data[PIPE_BUF:]
-    if len(data) > 0:
-      out.append(data)
-    return out
-
-  def send (self, con, data):
-    with self._lock:
-      self.sending = True
-
-      data = self._sliceup(data)
-
-      if con not in self._dataForConnection:
-        self._dataForConnection[con] = data
+    self._pending.append(con)
+    if not self._wake_pending:
+      self._wake_pending = True
+      if threading.current_thread() is self._scheduler._thread:
+        self._scheduler.fast_schedule(self)
       else:
-        self._dataForConnection[con].extend(data)
-
-      self._waker.ping()
-
-  def kill (self, con):
-    with self._lock:
-      try:
-        del self._dataForConnection[con]
-      except:
-        pass
-
-      self._waker.ping()
+        self._scheduler.schedule(self)
 
   def run (self):
-    while core.running:
-
-      with self._lock:
-        cons = list(self._dataForConnection.keys())
+    while True:
+      # Clear the flag *before* draining so that a Connection added from
+      # another thread meanwhile is either drained here or wakes us again.
+      self._wake_pending = False
+      pending = self._pending
+      while pending:
+        con = pending.popleft()
+        try:
+          con._flush()
+        except Exception:
+          log.exception("%s: Exception while sending", con)
+      yield False # Sleep until add() wakes us
 
-      rlist, wlist, elist = select.select([self._waker], cons, cons, 5)
-      if not core.running: break
-
-      with self._lock:
-        if len(rlist) > 0:
-          self._waker.pongAll()
-
-        for con in elist:
-          try:
-            del self._dataForConnection[con]
-          except:
-            pass
-
-        for con in wlist:
-          try:
-            alldata = self._dataForConnection[con]
-            while len(alldata):
-              data = alldata[0]
-              try:
-                l = con.sock.send(data)
-                if l != len(data):
-                  alldata[0] = data[l:]
-                  break
-                del alldata[0]
-              except socket.error as e:
-                if e.errno != EAGAIN:
-                  con.msg("DeferredSender/Socket error: " + e.strerror)
-                  con.disconnect()
-                  del self._dataForConnection[con]
-                break
-              except:
-                con.msg("Unknown error doing deferred sending")
-                break
-            if len(alldata) == 0:
-              try:
-                del self._dataForConnection[con]
-                if len(self._dataForConnection) == 0:
-                  self.sending = False
-                  break
-              except:
-                pass
-          except:
-            try:
-              del self._dataForConnection[con]
-            except:
-              pass
 
 class DummyOFNexus (object):
   def raiseEventNoErrors (self, event, *args, **kw):
@@ -523,6 +482,14 @@ class DummyOFNexus (object):
 _dummyOFNexus = DummyOFNexus()
 
 
+def _has_listeners (source, event_type):
+  """
+  True if anyone is listening to event_type on source
+  """
+  handlers = getattr(source, '_eventMixin_handlers', None)
+  return bool(handlers and handlers.get(event_type))
+
+
 """
 class FileCloser (object):
   def __init__ (self):
@@ -720,8 +687,10 @@ class Connection (EventMixin):
   _eventMixin_events = set([
     ConnectionUp,
     ConnectionDown,
+    ConnectionBackpressure,
     PortStatus,
     PacketIn,
+    PacketInBatch,
     ErrorIn,
     BarrierIn,
     RawStatsReply,
@@ -739,8 +708,21 @@ class Connection (EventMixin):
   # Globally unique identifier for the Connection instance
   ID = 0
 
+  # Number of bytes to ask for with each read from the switch
+  read_size = 8192
+
+  # When more than send_high_water bytes are queued to be sent to the
+  # switch, the connection is considered congested, and it stays that way
+  # until the queue drains to send_low_water (see ConnectionBackpressure).
+  send_high_water = 1024 * 1024
+  send_low_water = 256 * 1024
+
   _aborted_connections = 0
 
+  # While read() is running, the PacketIns to go in its PacketInBatch (or
+  # None if nobody wants one)
+  _packet_in_batch = None
+
   def msg (self, m):
     #print str(self), m
     log.debug(str(self) + " " + str(m))
@@ -752,12 +734,46 @@ class Connection (EventMixin):
     #print str(self), m
     log.info(str(self) + " " + str(m))
 
-  def __init__ (self, sock):
+  def __init__ (self, sock, read_size = None, selector_set = None,
+                handoff_data = None):
+    """
+    Initialize
+
+    If this Connection's socket is being waited on using a SelectorSet, pass
+    it as selector_set.  If the socket can't take all of the data we want to
+    send, the Connection then registers interest in its being writable, and
+    the owner of the set should call _flush() when it is.
+
+    If another process has already started the handshake with the switch
+    (see openflow.shard), pass everything it received as handoff_data.
+    The caller should then call _process_input() to handle it.
+    """
     self._previous_stats = []
 
     self.ofnexus = _dummyOFNexus
     self.sock = sock
-    self.buf = b''
+    if read_size is not None: self.read_size = read_size
+    self._selector_set = selector_set
+
+    # Send queue.  Data passed to send() is queued here until the next
+    # flush.  send_queued is the total number of bytes in it.
+    self._send_queue = deque()
+    self.send_queued = 0
+    self.congested = False
+    self._flush_pending = False # Waiting on the send flusher?
+    self._write_interest = False # Waiting for the socket to be writable?
+    if type(sock) is socket.socket:
+      self._sendmsg = sock.sendmsg
+    else:
+      # Wrapped sockets (SSL, capture) don't do sendmsg() right
+      self._sendmsg = None
+
+    # Receive buffer.  Data between _rstart and _rend has been received but
+    # not yet unpacked.  _rview is a memoryview over all of _rbuf.
+    self._rbuf = bytearray(max(self.read_size * 4, 0x10000))
+    self._rview = memoryview(self._rbuf)
+    self._rstart = 0
+    self._rend = 0
     Connection.ID += 1
     self.ID = Connection.ID
 
@@ -780,8 +796,6 @@ class Connection (EventMixin):
     self.connect_time = None
     self.idle_time = time.time()
 
-    self.send(of.ofp_hello())
-
     self.original_ports = PortCollection()
     self.ports = PortCollection()
     self.ports._chain = self.original_ports
@@ -790,7 +804,13 @@ class Connection (EventMixin):
     #      some timeout
 
     self.unpackers = unpackers
-    self.handlers = HandshakeOpenFlowHandlers().handlers
+    handshake = HandshakeOpenFlowHandlers()
+    self.handlers = handshake.handlers
+
+    if handoff_data is None:
+      self.send(of.ofp_hello())
+    else:
+      handshake.take_over(self, handoff_data)
 
   @property
   def eth_addr (self):
@@ -802,6 +822,13 @@ class Connection (EventMixin):
   def fileno (self):
     return self.sock.fileno()
 
+  @property
+  def buf (self):
+    """
+    Data which has been received but not yet unpacked
+    """
+    return bytes(self._rbuf[self._rstart:self._rend])
+
   def close (self):
     self.disconnect('closed')
     try:
@@ -844,11 +871,8 @@ class Connection (EventMixin):
         self.ofnexus.raiseEventNoErrors(ConnectionDown, self)
         self.raiseEventNoErrors(ConnectionDown, self)
 
-    try:
-      #deferredSender.kill(self)
-      pass
-    except:
-      pass
+    self._send_queue.clear()
+    self.send_queued = 0
     try:
       self.sock.shutdown(socket.SHUT_RDWR)
     except:
@@ -865,6 +889,9 @@ class Connection (EventMixin):
 
     Data should probably either be raw bytes in OpenFlow wire format, or
     an OpenFlow controller-to-switch message object from libopenflow.
+
+    The data is queued and actually written out along with anything else
+    sent to the switch during this scheduler cycle.
     """
     if self.disconnected: return
     if type(data) is not bytes:
@@ -874,24 +901,87 @@ class Connection (EventMixin):
       assert isinstance(data, of.ofp_header)
       data = data.pack()
 
-    if deferredSender.sending:
-      log.debug("deferred sender is sending!")
-      deferredSender.send(self, data)
-      return
-    try:
-      l = self.sock.send(data)
-      if l != len(data):
-        self.msg("Didn't send complete buffer.")
-        data = data[l:]
-        deferredSender.send(self, data)
-    except socket.error as e:
-      if e.errno == EAGAIN:
-        self.msg("Out of send buffer space.  " +
-                 "Consider increasing SO_SNDBUF.")
-        deferredSender.send(self, data)
+    self._send_queue.append(data)
+    self.send_queued += len(data)
+
+    if not self._flush_pending:
+      if sendFlusher is None:
+        # Not running under of_01's launch(); just send it now
+        self._flush()
       else:
+        self._flush_pending = True
+        sendFlusher.add(self)
+
+    if (not self.congested) and self.send_queued > self.send_high_water:
+      self.congested = True
+      self.msg("Send queue congested (%s bytes)" % (self.send_queued,))
+      self._raise_backpressure()
+
+  def _raise_backpressure (self):
+    e = self.ofnexus.raiseEventNoErrors(ConnectionBackpressure, self,
+                                        self.congested)
+    if e is None or e.halt != True:
+      self.raiseEventNoErrors(ConnectionBackpressure, self, self.congested)
+
+  def _flush (self):
+    """
+    Write as much queued data as the socket will take
+
+    Generally called by the send flusher, or when the socket is writable.
+    """
+    self._flush_pending = False
+    q = self._send_queue
+    if self.disconnected:
+      q.clear()
+      self.send_queued = 0
+      return
+
+    while q:
+      try:
+        if len(q) == 1 or self._sendmsg is None:
+          if len(q) > 1:
+            # Coalesce into a single write anyway.  (Take just what we
+            # join, since other threads may be appending.)
+            data = b''.join([q.popleft() for _ in range(len(q))])
+            q.appendleft(data)
+          l = self.sock.send(q[0])
+        else:
+          l = self._sendmsg(list(islice(q, IOV_MAX)))
+      except socket.error as e:
+        if e.errno == EAGAIN:
+          break
         self.msg("Socket error: " + e.strerror)
+        q.clear()
+        self.send_queued = 0
         self.disconnect(defer_event=True)
+        return
+      if l == 0: break
+
+      self.send_queued -= l
+      while l:
+        data = q[0]
+        if l >= len(data):
+          q.popleft()
+          l -= len(data)
+        else:
+          # Partially sent
+          q[0] = memoryview(data)[l:]
+          l = 0
+
+    # If there's still data, wait until the socket can take more
+    self._set_write_interest(len(q) != 0)
+
+    if self.congested and self.send_queued <= self.send_low_water:
+      self.congested = False
+      self.msg("Send queue drained (%s bytes)" % (self.send_queued,))
+      self._raise_backpressure()
+
+  def _set_write_interest (self, want):
+    if want == self._write_interest: return
+    self._write_interest = want
+    sockets = self._selector_set
+    if sockets is not None and self in sockets:
+      sockets.register(self, read=True, write=want)
 
   def read (self):
     """
@@ -899,39 +989,60 @@ class Connection (EventMixin):
     main OpenFlow loop below.
 
     Note: This function will block if data is not available.
+
+    Data is received straight into a reusable buffer with recv_into(), and
+    messages are unpacked in place from a memoryview of it.  The only data
+    ever moved is the tail of a partially received message.
     """
+    read_size = self.read_size
+    if len(self._rbuf) - self._rend < read_size:
+      self._make_room(read_size)
+    end = self._rend
     try:
-      d = self.sock.recv(2048)
+      l = self.sock.recv_into(self._rview[end:end+read_size])
     except:
       return False
-    if len(d) == 0:
+    if l == 0:
       return False
-    self.buf += d
-    buf_len = len(self.buf)
+    self._rend = end + l
+    return self._process_input()
 
+  def _process_input (self):
+    """
+    Unpacks and handles the messages which have been received
 
-    offset = 0
-    while buf_len - offset >= 8: # 8 bytes is minimum OF message size
+    Returns False if the connection should be thrown away.
+    """
+    end = self._rend
+    if (_has_listeners(self, PacketInBatch)
+        or _has_listeners(self.ofnexus, PacketInBatch)):
+      self._packet_in_batch = []
+
+    buf = self._rbuf
+    view = self._rview[:end]
+    offset = self._rstart
+    while end - offset >= 8: # 8 bytes is minimum OF message size
       # We pull the first four bytes of the OpenFlow header off by hand
       # to find the version/length/type so that we can correctly call
       # libopenflow to unpack it.
 
-      ofp_type = self.buf[offset+1]
+      ofp_type = buf[offset+1]
 
-      if self.buf[offset] != of.OFP_VERSION:
+      if buf[offset] != of.OFP_VERSION:
         if ofp_type == of.OFPT_HELLO:
           # We let this through and hope the other side switches down.
           pass
         else:
           log.warning("Bad OpenFlow version (0x%02x) on connection %s"
-                      % (self.buf[offset], self))
+                      % (buf[offset], self))
+          self._raise_packet_in_batch()
           return False # Throw connection away
 
-      msg_length = self.buf[offset+2] << 8 | self.buf[offset+3]
+      msg_length = buf[offset+2] << 8 | buf[offset+3]
 
-      if buf_len - offset < msg_length: break
+      if end - offset < msg_length: break
 
-      new_offset,msg = self.unpackers[ofp_type](self.buf, offset)
+      new_offset,msg = self.unpackers[ofp_type](view, offset)
       assert new_offset - offset == msg_length
       offset = new_offset
 
@@ -944,11 +1055,45 @@ class Connection (EventMixin):
                       ("\n" + str(self) + " ").join(str(msg).split('\n')))
         continue
 
-    if offset != 0:
-      self.buf = self.buf[offset:]
+    if offset == end:
+      # Everything was consumed; start over at the front of the buffer
+      self._rstart = 0
+      self._rend = 0
+    else:
+      self._rstart = offset
 
+    self._raise_packet_in_batch()
     return True
 
+  def _raise_packet_in_batch (self):
+    batch = self._packet_in_batch
+    if batch is None: return
+    self._packet_in_batch = None
+    if not batch: return
+    e = self.ofnexus.raiseEventNoErrors(PacketInBatch, self, batch)
+    if e is None or e.halt != True:
+      self.raiseEventNoErrors(PacketInBatch, self, batch)
+
+  def _make_room (self, size):
+    """
+    Makes sure there are at least size free bytes at the end of _rbuf
+
+    Pending data is moved to the front of the buffer; if that's not enough,
+    the pending data is moved into a new, larger buffer.
+    """
+    start = self._rstart
+    pending = self._rend - start
+    if pending + size <= len(self._rbuf):
+      if pending:
+        self._rbuf[:pending] = self._rbuf[start:self._rend]
+    else:
+      rbuf = bytearray(max(len(self._rbuf) * 2, pending + size))
+      rbuf[:pending] = self._rview[start:self._rend]
+      self._rbuf = rbuf
+      self._rview = memoryview(rbuf)
+    self._rstart = 0
+    self._rend = pending
+
   def _incoming_stats_reply (self, ofp):
     # This assumes that you don't receive multiple stats replies
     # to different requests out of order/interspersed.
@@ -1009,17 +1154,28 @@ def wrap_socket (new_sock):
 
 
 from pox.lib.recoco.recoco import *
+from pox.lib.epoll_select import SelectorSet
+from pox.lib.util import str_to_bool
 
 class OpenFlow_01_Task (Task):
   """
   The main recoco thread for listening to openflow messages
   """
+  # Run ahead of background work (timers, etc.) when both are ready
+  priority = 2
+
   def __init__ (self, port = 6633, address = '0.0.0.0',
-                ssl_key = None, ssl_cert = None, ssl_ca_cert = None):
+                ssl_key = None, ssl_cert = None, ssl_ca_cert = None,
+                legacy_select = False, read_size = None):
     """
     Initialize
 
     This listener will be for SSL connections if the SSL params are specified
+
+    Sockets are normally kept registered in a persistent SelectorSet (i.e.,
+    epoll), so the cost of waking up doesn't grow with the number of
+    connected switches.  If legacy_select is True, every socket is instead
+    handed to Select() on every wakeup as in the past.
     """
     Task.__init__(self)
     self.port = int(port)
@@ -1028,6 +1184,8 @@ class OpenFlow_01_Task (Task):
     self.ssl_key = ssl_key
     self.ssl_cert = ssl_cert
     self.ssl_ca_cert = ssl_ca_cert
+    self.legacy_select = legacy_select
+    self.read_size = read_size
 
     if self.ssl_key or self.ssl_cert or ssl_ca_cert:
       global ssl
@@ -1049,10 +1207,13 @@ class OpenFlow_01_Task (Task):
     self.started = True
     return super(OpenFlow_01_Task,self).start()
 
-  def run (self):
-    # List of open sockets/connections to select on
-    sockets = []
+  def _listen (self, sockets):
+    """
+    Returns a listening socket (or None if we couldn't make one)
 
+    sockets is the SelectorSet which the listener and connections will be
+    waited on with.
+    """
     listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
@@ -1067,21 +1228,69 @@ class OpenFlow_01_Task (Task):
         log.error(" You may have another controller running.")
         log.error(" Use openflow.of_01 --port=<port> to run POX on "
                   "another port.")
-      return
+      return None
 
     listener.listen(16)
     listener.setblocking(0)
-    sockets.append(listener)
 
     log.debug("Listening on %s:%s" %
               (self.address, self.port))
+    return listener
+
+  def _accept (self, listener, sockets):
+    """
+    Accepts a connection from a switch and registers it in sockets
+    """
+    new_sock = listener.accept()[0]
+
+    if self.ssl_key or self.ssl_cert or self.ssl_ca_cert:
+      cert_reqs = ssl.CERT_REQUIRED
+      if self.ssl_ca_cert is None:
+        cert_reqs = ssl.CERT_NONE
+      new_sock = ssl.wrap_socket(new_sock, server_side=True,
+          keyfile = self.ssl_key, certfile = self.ssl_cert,
+          ca_certs = self.ssl_ca_cert, cert_reqs = cert_reqs,
+          do_handshake_on_connect = False,
+          suppress_ragged_eofs = True)
+      #FIXME: We currently do a blocking handshake so that SSL errors
+      #       can't occur out of the blue later.  This isn't a good
+      #       thing, but getting around it will take some effort.
+      try:
+        new_sock.setblocking(1)
+        new_sock.do_handshake()
+      except ssl.SSLError as exc:
+        if exc.errno == 8 and "EOF occurred" in exc.strerror:
+          # Annoying, but just ignore
+          pass
+        else:
+          #log.exception("SSL negotiation failed")
+          log.warn("SSL negotiation failed: " + str(exc))
+        return
+
+    if pox.openflow.debug.pcap_traces:
+      new_sock = wrap_socket(new_sock)
+    new_sock.setblocking(0)
+    # Note that instantiating a Connection object fires a
+    # ConnectionUp event (after negotation has completed)
+    newcon = Connection(new_sock, read_size=self.read_size,
+                        selector_set=sockets)
+    sockets.register(newcon, write=newcon._write_interest)
+    #print str(newcon) + " connected"
+
+  def run (self):
+    # Set of open sockets/connections to wait on
+    sockets = SelectorSet(use_selectors = not self.legacy_select)
+
+    listener = self._listen(sockets)
+    if listener is None: return
+    sockets.register(listener)
 
     con = None
     while core.running:
       try:
         while True:
           con = None
-          rlist, wlist, elist = yield Select(sockets, [], sockets, 5)
+          rlist, wlist, elist = yield Poll(sockets, 5)
           if len(rlist) == 0 and len(wlist) == 0 and len(elist) == 0:
             if not core.running: break
 
@@ -1089,57 +1298,24 @@ class OpenFlow_01_Task (Task):
             if con is listener:
               raise RuntimeError("Error on listener socket")
             else:
+              sockets.unregister(con)
               try:
                 con.close()
               except:
                 pass
-              try:
-                sockets.remove(con)
-              except:
-                pass
+
+          for con in wlist:
+            con._flush()
 
           timestamp = time.time()
           for con in rlist:
             if con is listener:
-              new_sock = listener.accept()[0]
-
-              if self.ssl_key or self.ssl_cert or self.ssl_ca_cert:
-                cert_reqs = ssl.CERT_REQUIRED
-                if self.ssl_ca_cert is None:
-                  cert_reqs = ssl.CERT_NONE
-                new_sock = ssl.wrap_socket(new_sock, server_side=True,
-                    keyfile = self.ssl_key, certfile = self.ssl_cert,
-                    ca_certs = self.ssl_ca_cert, cert_reqs = cert_reqs,
-                    do_handshake_on_connect = False,
-                    suppress_ragged_eofs = True)
-                #FIXME: We currently do a blocking handshake so that SSL errors
-                #       can't occur out of the blue later.  This isn't a good
-                #       thing, but getting around it will take some effort.
-                try:
-                  new_sock.setblocking(1)
-                  new_sock.do_handshake()
-                except ssl.SSLError as exc:
-                  if exc.errno == 8 and "EOF occurred" in exc.strerror:
-                    # Annoying, but just ignore
-                    pass
-                  else:
-                    #log.exception("SSL negotiation failed")
-                    log.warn("SSL negotiation failed: " + str(exc))
-                  continue
-
-              if pox.openflow.debug.pcap_traces:
-                new_sock = wrap_socket(new_sock)
-              new_sock.setblocking(0)
-              # Note that instantiating a Connection object fires a
-              # ConnectionUp event (after negotation has completed)
-              newcon = Connection(new_sock)
-              sockets.append( newcon )
-              #print str(newcon) + " connected"
+              self._accept(listener, sockets)
             else:
               con.idle_time = timestamp
               if con.read() is False:
+                sockets.unregister(con)
                 con.close()
-                sockets.remove(con)
       except KeyboardInterrupt:
         break
       except:
@@ -1173,11 +1349,11 @@ class OpenFlow_01_Task (Task):
 
         if do_close:
           try:
-            con.close()
+            sockets.unregister(con)
           except:
             pass
           try:
-            sockets.remove(con)
+            con.close()
           except:
             pass
 
@@ -1186,16 +1362,18 @@ class OpenFlow_01_Task (Task):
           break
 
     log.debug("No longer listening for connections")
+    sockets.close()
 
     #pox.core.quit()
 
 
 
 # Used by the Connection class
-deferredSender = None
+sendFlusher = None
 
 def launch (port=6633, address="0.0.0.0", name=None,
             private_key=None, certificate=None, ca_cert=None,
+            legacy_select=False, read_size=None, workers=None,
             __INSTANCE__=None):
   """
   Start a listener for OpenFlow connections
@@ -1204,6 +1382,13 @@ def launch (port=6633, address="0.0.0.0", name=None,
   combinations and pointing to reasonable key/cert files.  These have the same
   meanings as with Open vSwitch's old test controller, but they are more
   flexible (e.g., ca-cert can be skipped).
+
+  --legacy-select waits on switch sockets with a full select() on every
+  wakeup rather than keeping them registered with epoll (or similar).
+
+  --read-size sets how many bytes to ask for with each read from a switch.
+
+  --workers=N spreads switches over N worker processes (see openflow.shard).
   """
   if name is None:
     basename = "of_01"
@@ -1217,15 +1402,29 @@ def launch (port=6633, address="0.0.0.0", name=None,
     log.warn("of_01 '%s' already started", name)
     return None
 
-  global deferredSender
-  if not deferredSender:
-    deferredSender = DeferredSender()
+  global sendFlusher
+  if not sendFlusher:
+    sendFlusher = SendFlusher()
 
   if of._logger is None:
     of._logger = core.getLogger('libopenflow_01')
 
-  l = OpenFlow_01_Task(port = int(port), address = address,
-                       ssl_key = private_key, ssl_cert = certificate,
-                       ssl_ca_cert = ca_cert)
+  kw = dict(port = int(port), address = address,
+            ssl_key = private_key, ssl_cert = certificate,
+            ssl_ca_cert = ca_cert,
+            legacy_select = str_to_bool(legacy_select),
+            read_size = None if read_size is None else int(read_size))
+
+  if workers is not None:
+    from pox.openflow import shard
+    if private_key or certificate or ca_cert:
+      raise RuntimeError("Can't use SSL with --workers")
+    info = shard.worker_info()
+    if info is not None:
+      l = shard.start_worker(info, **kw)
+    else:
+      l = shard.ShardFront(int(workers), **kw)
+  else:
+    l = OpenFlow_01_Task(**kw)
   core.register(name, l)
   return l
@@ -0,0 +1,511 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Spreads OpenFlow switches over several POX processes
+
+POX runs in a single cooperative thread, so all the switches connected to
+it share one CPU.  With sharding, one "front" process listens for switches
+and N worker processes handle them:
+
+  ./pox.py openflow.of_01 --workers=4 openflow.discovery forwarding.l2_multi
+
+The front starts each worker by running the same command line again.  When
+a switch connects, the front does the start of the OpenFlow handshake
+(hello and features request) to learn the switch's DPID, picks a worker by
+hashing the DPID, and passes it the socket over a Unix domain socket
+(SCM_RIGHTS), along with everything the switch has sent so far.  The
+worker carries on with the handshake, and as far as its components can
+tell, the switch connected to it normally.
+
+Each worker has a ShardChannel (core.openflow_shard) for talking to the
+others, by way of the front.  Workers tell each other about the switches
+they own, and discovery links are shared so that every worker sees the
+whole topology.  Components can send their own messages with
+core.openflow_shard.send().
+
+Notes:
+ * The front runs the components from the command line too, but no
+   switches ever connect to it.  Components which listen on fixed ports
+   (e.g., the web server) or read the terminal (e.g., py) don't mix well
+   with sharding, since every process would try to do so.
+ * SSL isn't supported, since an SSL session can't be handed over.
+ * If a worker dies, switches that hash to it are turned away until
+   the front is restarted.
+"""
+
+from pox.core import core
+import pox.core
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.of_01 import OpenFlow_01_Task, Connection
+from pox.lib.revent import EventMixin, Event
+from pox.lib.util import dpid_to_str
+from collections import deque
+import array
+import os
+import pickle
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+log = core.getLogger()
+
+# Environment variable which tells a worker which shard it is
+ENV_VAR = "POX_OF_SHARD"
+
+# Largest message (and most file descriptors) sent over a channel
+MAX_MESSAGE = 0x40000
+MAX_FDS = 4
+
+
+def shard_for_dpid (dpid, count):
+  """
+  Returns which of count workers should handle the given DPID
+
+  This is stable across processes (unlike hash() on some types), and mixes
+  the bits (as in splitmix64) so that DPIDs which only differ in their
+  upper bytes still spread out.
+  """
+  m = 0xffFFffFFffFFffFF
+  h = dpid & m
+  h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & m
+  h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & m
+  h ^= h >> 31
+  return h % count
+
+
+class ShardMessage (Event):
+  """
+  Raised when a message arrives from another worker
+
+  name and data are as passed to send() by the sender, and worker is the
+  index of the worker which sent it.
+  """
+  def __init__ (self, worker, name, data):
+    super(ShardMessage,self).__init__()
+    self.worker = worker
+    self.name = name
+    self.data = data
+
+
+class Channel (object):
+  """
+  One end of the control socket between the front and a worker
+
+  Messages are pickled tuples, each sent as a single SOCK_SEQPACKET packet
+  along with any file descriptors that go with it.  Sends are queued if
+  the socket can't take them, and flushed when it's writable (the owner
+  of the SelectorSet calls _flush() as with a Connection).
+  """
+  def __init__ (self, sock, handler, index = None):
+    """
+    handler is called with (channel, message, fds) for each message
+    """
+    self.sock = sock
+    self.sock.setblocking(0)
+    self.handler = handler
+    self.index = index
+    self.selector_set = None
+    self.idle_time = time.time()
+    self._queue = deque() # (data, [sockets whose fds go with it])
+    self._write_interest = False
+    self.closed = False
+
+  def fileno (self):
+    return self.sock.fileno()
+
+  def send (self, message, socks = ()):
+    """
+    Sends a message, passing along the file descriptors of socks
+
+    Once sent, the sockets in socks are closed (here; the receiver gets
+    its own copies).
+    """
+    if self.closed:
+      for s in socks: s.close()
+      return
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    if len(data) > MAX_MESSAGE:
+      raise RuntimeError("Shard message too big (%s bytes)" % (len(data),))
+    self._queue.append((data, list(socks)))
+    self._flush()
+
+  def _flush (self):
+    q = self._queue
+    while q:
+      data,socks = q[0]
+      anc = []
+      if socks:
+        fds = array.array("i", [s.fileno() for s in socks])
+        anc.append((socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes()))
+      try:
+        self.sock.sendmsg([data], anc)
+      except (BlockingIOError, InterruptedError):
+        break
+      except socket.error:
+        log.exception("Couldn't send on shard channel")
+        self.close()
+        return
+      q.popleft()
+      for s in socks: s.close()
+    self._set_write_interest(len(q) != 0)
+
+  def _set_write_interest (self, want):
+    if want == self._write_interest: return
+    self._write_interest = want
+    sockets = self.selector_set
+    if sockets is not None and self in sockets:
+      sockets.register(self, read=True, write=want)
+
+  def read (self):
+    """
+    Reads and handles waiting messages
+
+    Returns False once the other end has gone away.
+    """
+    fd_size = socket.CMSG_LEN(MAX_FDS * array.array("i").itemsize)
+    while True:
+      try:
+        data,anc,flags,_ = self.sock.recvmsg(MAX_MESSAGE, fd_size)
+      except (BlockingIOError, InterruptedError):
+        return True
+      except socket.error:
+        return False
+      fds = []
+      for level,kind,cdata in anc:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+          a = array.array("i")
+          a.frombytes(cdata[:len(cdata) - (len(cdata) % a.itemsize)])
+          fds.extend(a)
+      if not data and not fds:
+        return False
+      if flags & (socket.MSG_TRUNC | socket.MSG_CTRUNC):
+        log.error("Truncated shard message")
+        for fd in fds: os.close(fd)
+        continue
+      try:
+        message = pickle.loads(data)
+      except Exception:
+        log.exception("Bad shard message")
+        for fd in fds: os.close(fd)
+        continue
+      self.handler(self, message, fds)
+
+  def close (self):
+    if self.closed: return
+    self.closed = True
+    for data,socks in self._queue:
+      for s in socks: s.close()
+    self._queue.clear()
+    try:
+      self.sock.close()
+    except Exception:
+      pass
+
+
+class PendingSwitch (object):
+  """
+  A switch connection on the front which hasn't been handed over yet
+
+  We send the hello and, once the switch says hello, a features request.
+  The features reply tells us the DPID, and then the socket and all the
+  data received so far go to a worker.
+  """
+  def __init__ (self, sock, front):
+    self.sock = sock
+    self.front = front
+    self.data = bytearray()
+    self.idle_time = time.time()
+    self._offset = 0 # Of next message in data
+    self._features_request_sent = False
+    self._handed_off = False
+    sock.send(of.ofp_hello().pack())
+
+  def fileno (self):
+    return self.sock.fileno()
+
+  def _flush (self):
+    pass
+
+  def read (self):
+    try:
+      d = self.sock.recv(4096)
+    except socket.error:
+      return False
+    if not d: return False
+    data = self.data
+    data += d
+    while len(data) - self._offset >= 8:
+      offset = self._offset
+      ofp_type = data[offset+1]
+      length = data[offset+2] << 8 | data[offset+3]
+      if length < 8: return False # Garbage
+      if len(data) - offset < length: break
+      self._offset += length
+      if ofp_type == of.OFPT_HELLO:
+        if not self._features_request_sent:
+          self._features_request_sent = True
+          self.sock.send(of.ofp_features_request().pack())
+      elif ofp_type == of.OFPT_FEATURES_REPLY:
+        if length < 16: return False
+        dpid = struct.unpack_from("!Q", data, offset + 8)[0]
+        self._handed_off = self.front._hand_off(self, dpid)
+        return False # Done with it here either way
+    return True
+
+  def close (self):
+    if not self._handed_off:
+      try:
+        self.sock.close()
+      except Exception:
+        pass
+
+
+class ShardFront (OpenFlow_01_Task):
+  """
+  Accepts switch connections and hands them to worker processes
+  """
+  def __init__ (self, workers, **kw):
+    super(ShardFront,self).__init__(**kw)
+    self.worker_count = workers
+    self.channels = []
+    self.processes = []
+    self._sockets = None
+    core.addListener(pox.core.DownEvent, self._handle_DownEvent)
+
+  def _spawn (self):
+    argv = [sys.executable] + sys.argv
+    for i in range(self.worker_count):
+      ours,theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+      env = dict(os.environ)
+      env[ENV_VAR] = "%s,%s,%s" % (i, self.worker_count, theirs.fileno())
+      p = subprocess.Popen(argv, env=env, pass_fds=[theirs.fileno()])
+      theirs.close()
+      self.processes.append(p)
+      self.channels.append(Channel(ours, self._handle_message, index=i))
+    log.info("Started %s workers", self.worker_count)
+
+  def _handle_DownEvent (self, event):
+    for c in self.channels:
+      c.close()
+    for p in self.processes:
+      try:
+        p.terminate()
+      except OSError:
+        pass
+    for p in self.processes:
+      try:
+        p.wait(5)
+      except subprocess.TimeoutExpired:
+        p.kill()
+
+  def _listen (self, sockets):
+    listener = super(ShardFront,self)._listen(sockets)
+    if listener is None: return None
+    self._sockets = sockets
+    self._spawn()
+    for c in self.channels:
+      c.selector_set = sockets
+      sockets.register(c, write=c._write_interest)
+    return listener
+
+  def _accept (self, listener, sockets):
+    new_sock = listener.accept()[0]
+    new_sock.setblocking(0)
+    try:
+      pending = PendingSwitch(new_sock, self)
+    except socket.error:
+      new_sock.close()
+      return
+    sockets.register(pending)
+
+  def _hand_off (self, pending, dpid):
+    """
+    Sends a switch's socket to its worker
+
+    Returns True if the worker now owns the socket.
+    """
+    c = self.channels[shard_for_dpid(dpid, self.worker_count)]
+    if c.closed:
+      log.warning("Worker %s for %s is gone; dropping switch", c.index,
+                  dpid_to_str(dpid))
+      return False
+    log.debug("Handing %s to worker %s", dpid_to_str(dpid), c.index)
+    # Unregister while the socket is still open, since its file descriptor
+    # may be reused as soon as it's closed.
+    self._sockets.unregister(pending)
+    c.send(("switch", dpid, bytes(pending.data)), [pending.sock])
+    return True
+
+  def _handle_message (self, channel, message, fds):
+    for fd in fds: os.close(fd) # Workers shouldn't send any
+    if message[0] == "broadcast":
+      out = ("message", channel.index) + tuple(message[1:])
+      for c in self.channels:
+        if c is not channel:
+          c.send(out)
+    else:
+      log.warning("Unknown message from worker %s: %s", channel.index,
+                  message[0])
+
+
+class ShardWorker (OpenFlow_01_Task):
+  """
+  Takes switch connections handed over by the front
+
+  Rather than a listening socket, this waits on the channel to the front.
+  """
+  def __init__ (self, sock, index, **kw):
+    super(ShardWorker,self).__init__(**kw)
+    self.channel = Channel(sock, self._handle_message, index=index)
+    self._sockets = None
+
+  def _listen (self, sockets):
+    self._sockets = sockets
+    self.channel.selector_set = sockets
+    return self.channel
+
+  def _accept (self, listener, sockets):
+    if self.channel.read() is False:
+      log.error("Lost connection to the front")
+      core.quit()
+      raise RuntimeError("Shard channel closed")
+
+  def _handle_message (self, channel, message, fds):
+    kind = message[0]
+    if kind == "switch":
+      dpid,data = message[1:]
+      if len(fds) != 1:
+        log.error("Switch handed over without a socket")
+        for fd in fds: os.close(fd)
+        return
+      sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0, fds[0])
+      sock.setblocking(0)
+      sockets = self._sockets
+      con = Connection(sock, read_size=self.read_size, selector_set=sockets,
+                       handoff_data=data)
+      sockets.register(con, write=con._write_interest)
+      if con._process_input() is False:
+        sockets.unregister(con)
+        con.close()
+    elif kind == "message":
+      for fd in fds: os.close(fd)
+      worker,name,data = message[1:]
+      core.openflow_shard._incoming(worker, name, data)
+    else:
+      for fd in fds: os.close(fd)
+      log.warning("Unknown message from the front: %s", kind)
+
+
+class ShardChannel (EventMixin):
+  """
+  Lets a worker talk to the other workers
+
+  Keeps track of which switches the other workers have (remote_switches
+  maps DPID to worker index), and shares discovery's links.
+  """
+  _eventMixin_events = set([ShardMessage])
+  _core_name = "openflow_shard"
+
+  def __init__ (self, index, count, channel):
+    self.index = index
+    self.count = count
+    self._channel = channel
+    self.remote_switches = {}
+    self._sharing_link = False # Raising a link from elsewhere?
+    core.listen_to_dependencies(self, ['openflow'])
+    core.addListener(pox.core.ComponentRegistered,
+                     self._handle_core_ComponentRegistered)
+    if core.hasComponent("openflow_discovery"):
+      self._listen_to_discovery()
+
+  def send (self, name, data = None):
+    """
+    Sends a message to all the other workers
+
+    They'll raise a ShardMessage with the given name and data, which must
+    be picklable.
+    """
+    self._channel.send(("broadcast", name, data))
+
+  def _incoming (self, worker, name, data):
+    if name == "switch_up":
+      self.remote_switches[data] = worker
+      discovery = core.components.get("openflow_discovery")
+      if discovery: discovery.remote_switches.add(data)
+    elif name == "switch_down":
+      self.remote_switches.pop(data, None)
+      discovery = core.components.get("openflow_discovery")
+      if discovery:
+        discovery.remote_switches.discard(data)
+        discovery.remove_switch_links(data)
+    elif name == "link":
+      discovery = core.components.get("openflow_discovery")
+      if discovery:
+        added,link = data
+        link = discovery.Link(*link)
+        self._sharing_link = True
+        try:
+          if added:
+            discovery.add_remote_link(link)
+          else:
+            discovery.remove_link(link)
+        finally:
+          self._sharing_link = False
+    self.raiseEventNoErrors(ShardMessage, worker, name, data)
+
+  def _handle_openflow_ConnectionUp (self, event):
+    self.send("switch_up", event.dpid)
+
+  def _handle_openflow_ConnectionDown (self, event):
+    self.send("switch_down", event.dpid)
+
+  def _handle_core_ComponentRegistered (self, event):
+    if event.name == "openflow_discovery":
+      self._listen_to_discovery()
+
+  def _listen_to_discovery (self):
+    discovery = core.openflow_discovery
+    discovery.addListenerByName("LinkEvent", self._handle_LinkEvent)
+    discovery.remote_switches.update(self.remote_switches)
+
+  def _handle_LinkEvent (self, event):
+    if self._sharing_link: return
+    self.send("link", (event.added, tuple(event.link)))
+
+
+def worker_info ():
+  """
+  Returns (index, count, fd) if this process is a shard worker, else None
+  """
+  v = os.environ.get(ENV_VAR)
+  if not v: return None
+  return tuple(int(x) for x in v.split(","))
+
+
+def start_worker (info, **kw):
+  """
+  Sets up this process as a shard worker
+
+  kw are passed on to the OpenFlow_01_Task.
+  """
+  index,count,fd = info
+  # Our own children (if any) aren't workers
+  del os.environ[ENV_VAR]
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET, 0, fd)
+  worker = ShardWorker(sock, index, **kw)
+  core.register(ShardChannel(index, count, worker.channel))
+  log.info("Worker %s of %s", index, count)
+  return worker
+
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cross-thread callLater() throughput
+
+Some threads submit calls to a recoco Scheduler as fast as they can, and
+we time how long it takes for all of them to have run.  This is done with
+the old CallLaterTask (one ping per call), the batching one, and with
+callLaterMany().  The number of pings is counted too.
+
+Usage: call_later_bench.py [--count=N] [--threads=N]
+"""
+
+import sys
+import os.path
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.recoco import Scheduler, Select
+from pox.lib.recoco.recoco import BaseTask, CallLaterTask
+import pox.lib.util
+
+
+class LegacyCallLaterTask (BaseTask):
+  """
+  The old CallLaterTask
+  """
+  def __init__ (self):
+    BaseTask.__init__(self)
+    self._pinger = pox.lib.util.makePinger()
+    self._calls = deque()
+
+  def callLater (self, func, *args, **kw):
+    assert callable(func)
+    self._calls.append((func,args,kw))
+    self._pinger.ping()
+
+  def run (self):
+    while True:
+      yield Select([self._pinger], None, None)
+      self._pinger.pongAll()
+      try:
+        while True:
+          e = self._calls.popleft()
+          try:
+            e[0](*e[1], **e[2])
+          except:
+            pass
+      except:
+        pass
+
+
+class CountingPinger (object):
+  def __init__ (self, pinger):
+    self.pinger = pinger
+    self.pings = 0
+  def ping (self):
+    self.pings += 1
+    self.pinger.ping()
+  def __getattr__ (self, name):
+    return getattr(self.pinger, name)
+
+
+def run (task_class, count, threads, many = False):
+  s = Scheduler(isDefaultScheduler=False, daemon=True)
+  task = task_class()
+  task._pinger = CountingPinger(task._pinger)
+  task.start(scheduler=s, fast=True)
+  done = threading.Event()
+  remaining = [count * threads]
+  def cb ():
+    remaining[0] -= 1
+    if remaining[0] == 0: done.set()
+  def submit ():
+    if many:
+      for _ in range(count // 100):
+        task.callLaterMany([cb] * 100)
+    else:
+      for _ in range(count):
+        task.callLater(cb)
+  ts = [threading.Thread(target=submit) for _ in range(threads)]
+  t = time.time()
+  for th in ts: th.start()
+  for th in ts: th.join()
+  done.wait(60)
+  t = time.time() - t
+  s.quit()
+  return t, task._pinger.pings
+
+
+def main (argv):
+  count = 50000
+  threads = 4
+  for a in argv:
+    if a.startswith("--count="):
+      count = int(a.split("=",1)[1])
+    elif a.startswith("--threads="):
+      threads = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  total = count * threads
+  print("%i threads submitting %i calls each" % (threads, count))
+  print("  %-18s %12s %10s" % ("", "calls/sec", "pings"))
+  for name,cls,many in (("legacy", LegacyCallLaterTask, False),
+                        ("batched", CallLaterTask, False),
+                        ("callLaterMany", CallLaterTask, True)):
+    t,pings = run(cls, count, threads, many)
+    print("  %-18s %12.0f %10i" % (name, total / t, pings))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
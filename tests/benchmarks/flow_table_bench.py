@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+FlowTable lookup cost with the index vs. a linear scan
+
+Fills a FlowTable with a mix of exact-match entries (like l2_learning
+installs) and wildcarded entries using a handful of masks, then times
+entry_for_packet(), strict matching_entries() and
+check_for_overlapping_entry() against the old linear-scan versions.
+
+With --expire, it instead times remove_expired_entries() ticks on a table
+of flows with 10 second idle timeouts where some small fraction expires
+each tick, against the old full-table sweep.
+
+Usage: flow_table_bench.py [--entries=N[,N...]] [--lookups=N] [--expire]
+"""
+
+import sys
+import os.path
+import random
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.flow_table import FlowTable, TableEntry
+from pox.lib.addresses import EthAddr, IPAddr
+from pox.lib.packet import ethernet, ipv4, udp
+
+
+def make_packet (rand):
+  u = udp(srcport=rand.randint(1024, 1100), dstport=rand.choice((53, 123)))
+  ip = ipv4(srcip=IPAddr("10.0.%i.%i" % (rand.randint(0, 15),
+                                         rand.randint(1, 254))),
+            dstip=IPAddr("10.1.%i.%i" % (rand.randint(0, 15),
+                                         rand.randint(1, 254))),
+            protocol=ipv4.UDP_PROTOCOL)
+  ip.payload = u
+  e = ethernet(src=EthAddr("02:00:00:00:%02x:%02x" % (rand.randint(0, 15),
+                                                     rand.randint(0, 255))),
+               dst=EthAddr("02:00:00:01:00:01"), type=ethernet.IP_TYPE)
+  e.payload = ip
+  return e
+
+
+def fill (table, count, rand):
+  packets = []
+  for i in range(count):
+    r = rand.random()
+    if r < 0.7:
+      p = make_packet(rand)
+      packets.append(p)
+      m = of.ofp_match.from_packet(p, rand.randint(1, 4), spec_frags=True)
+      priority = of.OFP_DEFAULT_PRIORITY
+    elif r < 0.8:
+      m = of.ofp_match(dl_type=0x800, nw_dst=(IPAddr("10.1.%i.0"
+                       % rand.randint(0, 15)), 24))
+      priority = 100
+    elif r < 0.9:
+      m = of.ofp_match(dl_src=EthAddr("02:00:00:00:%02x:%02x"
+                       % (rand.randint(0, 15), rand.randint(0, 255))))
+      priority = 50
+    else:
+      m = of.ofp_match(in_port=rand.randint(1, 4), dl_type=0x800,
+                       nw_proto=17, tp_dst=rand.randint(1, 2000))
+      priority = 200
+    table.add_entry(TableEntry(priority=priority, cookie=i, match=m,
+                               actions=[of.ofp_action_output(port=1)]))
+  return packets
+
+
+def scan_entry_for_packet (table, packet, in_port):
+  packet_match = of.ofp_match.from_packet(packet, in_port, spec_frags = True)
+  for entry in table.entries:
+    if entry.match.matches_with_wildcards(packet_match,
+                                          consider_other_wildcards=False):
+      return entry
+  return None
+
+
+def scan_matching_entries (table, match, priority, strict):
+  return [e for e in table.entries if e.is_matched_by(match, priority, strict)]
+
+
+def scan_overlap (table, in_entry):
+  priority = in_entry.effective_priority
+  for e in table.entries:
+    if e.effective_priority < priority:
+      break
+    elif e.effective_priority > priority:
+      continue
+    if e.is_matched_by(in_entry.match) or in_entry.is_matched_by(e.match):
+      return True
+  return False
+
+
+def timeit (f, items):
+  t = time.time()
+  for i in items: f(*i)
+  return (time.time() - t) / len(items)
+
+
+def bench (count, lookups):
+  rand = random.Random(count)
+  table = FlowTable()
+  t = time.time()
+  packets = fill(table, count, rand)
+  fill_time = time.time() - t
+
+  # Half installed flows, half random (mostly misses on the exact table)
+  packets = [(p, rand.randint(1, 4)) for p in
+             rand.sample(packets, min(len(packets), lookups // 2))]
+  packets += [(make_packet(rand), rand.randint(1, 4))
+              for _ in range(lookups - len(packets))]
+  for p,in_port in packets[:50]:
+    assert (table.entry_for_packet(p, in_port)
+            is scan_entry_for_packet(table, p, in_port))
+
+  entries = rand.sample(table.entries, min(len(table), 200))
+  mods = [(e.match, e.priority, True) for e in entries]
+  overlaps = [(TableEntry(priority=e.priority, match=e.match),)
+              for e in entries]
+
+  print("%i entries (%i masks), filled in %.2fs"
+        % (count, len(table._spaces) + 1, fill_time))
+  def row (name, indexed, scan):
+    print("  %-22s %10.1f us %10.1f us %8.1fx" % (name, indexed * 1e6,
+                                                 scan * 1e6, scan / indexed))
+  print("  %-22s %13s %13s" % ("", "indexed", "scan"))
+  row("entry_for_packet", timeit(table.entry_for_packet, packets),
+      timeit(lambda p,i: scan_entry_for_packet(table, p, i), packets))
+  row("matching_entries/strict", timeit(table.matching_entries, mods),
+      timeit(lambda *a: scan_matching_entries(table, *a), mods))
+  row("check_for_overlap", timeit(table.check_for_overlapping_entry,
+                                  overlaps),
+      timeit(lambda e: scan_overlap(table, e), overlaps))
+
+
+def sweep_expired (table, now):
+  """
+  The old remove_expired_entries()
+  """
+  idle = []
+  hard = []
+  for entry in table._table:
+    if entry.is_idle_timed_out(now):
+      idle.append(entry)
+    elif entry.is_hard_timed_out(now):
+      hard.append(entry)
+  table._remove_specific_entries(idle, of.OFPRR_IDLE_TIMEOUT)
+  table._remove_specific_entries(hard, of.OFPRR_HARD_TIMEOUT)
+
+
+def bench_expire (count, idle_fraction = 1.0, ticks = 20, warmup = 30):
+  """
+  Ticks once a second, timing after the warmup ticks
+
+  idle_fraction of the flows have idle timeouts; the rest have none.
+  """
+  def run (expire):
+    rand = random.Random(count)
+    table = FlowTable()
+    for i in range(count):
+      m = of.ofp_match(in_port=1, dl_type=0x800,
+                       nw_dst=IPAddr(0x0a000000 + i), nw_proto=17, tp_dst=53)
+      idle = 10 if rand.random() < idle_fraction else 0
+      table.add_entry(TableEntry(cookie=i, match=m, idle_timeout=idle,
+                                 now=rand.uniform(-10, 0)))
+    total = 0
+    removed = 0
+    for now in range(warmup + ticks):
+      # Most flows see traffic every few seconds
+      for e in rand.sample(table.entries, len(table) // 4):
+        e.touch_packet(100, now=now)
+      before = len(table)
+      t = time.time()
+      expire(table, now)
+      if now >= warmup:
+        total += time.time() - t
+        removed += before - len(table)
+    return total / ticks, removed
+
+  t_heap,removed = run(lambda table, now: table.remove_expired_entries(now))
+  t_sweep,removed2 = run(sweep_expired)
+  assert removed == removed2
+  print("%i entries (%i%% with idle timeouts), %i expired over %i ticks"
+        % (count, idle_fraction * 100, removed, ticks))
+  print("  %-22s %10.1f ms %10.1f ms %8.1fx" % ("remove_expired_entries",
+        t_heap * 1e3, t_sweep * 1e3, t_sweep / t_heap))
+
+
+def main (argv):
+  sizes = None
+  lookups = 2000
+  expire = False
+  for a in argv:
+    if a.startswith("--entries="):
+      sizes = [int(x) for x in a.split("=",1)[1].split(",")]
+    elif a.startswith("--lookups="):
+      lookups = int(a.split("=",1)[1])
+    elif a == "--expire":
+      expire = True
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+  if expire:
+    for size in sizes or [10000, 100000]:
+      bench_expire(size)
+      bench_expire(size, idle_fraction=0.1)
+  else:
+    for size in sizes or [1000, 10000, 50000]:
+      bench(size, lookups)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+revent listener churn
+
+Like lots of switches connecting and disconnecting: --count sinks each
+add listeners for a few event types (some with priorities) to one
+source, and then they're all removed again, in random order.  This is
+timed against the old list-based addListener()/removeListener().
+
+Usage: listener_bench.py [--count=N]
+"""
+
+import sys
+import os.path
+import time
+import random
+import operator
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.revent import EventMixin, Event
+import pox.lib.revent.revent as revent
+
+
+class Up (Event): pass
+class Down (Event): pass
+class PacketIn (Event): pass
+class Stats (Event): pass
+
+
+class Source (EventMixin):
+  _eventMixin_events = set([Up, Down, PacketIn, Stats])
+
+
+class LegacySource (Source):
+  """
+  A source with the old listener bookkeeping
+  """
+  def _eventMixin_init (self):
+    if self._eventMixin_initialized: return
+    EventMixin._eventMixin_init(self)
+    self._eventMixin_prioritized = set()
+
+  def addListener (self, eventType, handler, once=False, weak=False,
+                   priority=0, byName=False):
+    self._eventMixin_init()
+    handlers = self._eventMixin_handlers.setdefault(eventType, [])
+    eid = revent._generateEventID()
+    handlers.append((priority, handler, once, eid))
+    if priority != 0 or eventType in self._eventMixin_prioritized:
+      self._eventMixin_prioritized.add(eventType)
+      handlers.sort(reverse = True, key = operator.itemgetter(0))
+    self._eventMixin_dispatch.pop(eventType, None)
+    return (eventType, eid)
+
+  def removeListener (self, handlerOrEID, eventType=None):
+    self._eventMixin_init()
+    eventType,eid = handlerOrEID
+    handlers = self._eventMixin_handlers[eventType]
+    l = len(handlers)
+    self._eventMixin_handlers[eventType] = [x for x in handlers
+                                            if x[3] != eid]
+    altered = l != len(self._eventMixin_handlers[eventType])
+    if altered:
+      self._eventMixin_dispatch.clear()
+    return altered
+
+
+class Sink (object):
+  def _handle_Up (self, event): pass
+  def _handle_Down (self, event): pass
+  def _handle_PacketIn (self, event): pass
+  def _handle_Stats (self, event): pass
+
+
+def run (source_class, count):
+  source = source_class()
+  sinks = [Sink() for _ in range(count)]
+  r = random.Random(0)
+  t = time.time()
+  listeners = []
+  for i,sink in enumerate(sinks):
+    listeners.append(source.addListeners(sink, priority=i % 3))
+  add_time = time.time() - t
+  r.shuffle(listeners)
+  t = time.time()
+  for l in listeners:
+    source.removeListeners(l)
+  remove_time = time.time() - t
+  assert source._eventMixin_get_listener_count() == 0
+  return add_time, remove_time
+
+
+def main (argv):
+  count = 5000
+  for a in argv:
+    if a.startswith("--count="):
+      count = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  print("%i sinks, 4 listeners each" % (count,))
+  print("  %-10s %12s %12s" % ("", "add (s)", "remove (s)"))
+  for name,cls in (("legacy", LegacySource), ("current", Source)):
+    add_time,remove_time = run(cls, count)
+    print("  %-10s %12.3f %12.3f" % (name, add_time, remove_time))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+LLDPSender with lots of ports
+
+Sets up --switches switches with --ports ports each (to fake
+connections), as after a controller restart, then times a whole send
+cycle's worth of timer runs and taking some ports down.  This is timed
+against the old flat-list LLDPSender which built every packet from
+scratch.
+
+Usage: lldp_bench.py [--switches=N] [--ports=N]
+"""
+
+import sys
+import os.path
+import time
+from collections import namedtuple
+from random import random
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.core
+pox.core.initialize()
+from pox.core import POXCore
+from pox.lib.revent import EventMixin
+from pox.lib.addresses import EthAddr
+from pox.openflow import PortStatus, ConnectionUp, ConnectionDown
+import pox.openflow.discovery as discovery
+import pox.openflow.libopenflow_01 as of
+
+
+class Connection (object):
+  congested = False
+  def __init__ (self):
+    self.writes = 0
+  def send (self, data):
+    self.writes += 1
+
+
+class Nexus (EventMixin):
+  _eventMixin_events = set([PortStatus, ConnectionUp, ConnectionDown])
+  def __init__ (self):
+    self.connections = {}
+  def getConnection (self, dpid):
+    return self.connections.get(dpid)
+  def sendToDPID (self, dpid, data):
+    if dpid in self.connections:
+      self.connections[dpid].send(data)
+      return True
+    return False
+
+
+class LegacyLLDPSender (discovery.LLDPSender):
+  """
+  The old flat-list version
+  """
+  SendItem = namedtuple("LLDPSenderItem", ('dpid','port_num','packet'))
+
+  def __init__ (self, *args, **kw):
+    discovery.LLDPSender.__init__(self, *args, **kw)
+    self._this_cycle = []
+    self._next_cycle = []
+
+  def del_port (self, dpid, port_num, set_timer = True):
+    if port_num > of.OFPP_MAX: return
+    self._this_cycle = [p for p in self._this_cycle
+                        if p.dpid != dpid or p.port_num != port_num]
+    self._next_cycle = [p for p in self._next_cycle
+                        if p.dpid != dpid or p.port_num != port_num]
+
+  def add_port (self, dpid, port_num, port_addr, set_timer = True):
+    if port_num > of.OFPP_MAX: return
+    self.del_port(dpid, port_num, set_timer = False)
+    packet = self.create_packet_out(dpid, port_num, port_addr)
+    self._next_cycle.insert(0, self.SendItem(dpid, port_num, packet))
+    discovery.core.openflow.sendToDPID(dpid, packet)
+
+  def create_packet_out (self, dpid, port_num, port_addr):
+    eth = self._create_discovery_packet(dpid, port_num, port_addr, self._ttl)
+    po = of.ofp_packet_out(action = of.ofp_action_output(port=port_num))
+    po.data = eth.pack()
+    return po.pack()
+
+  def _timer_handler (self):
+    num = int(self._send_chunk_size)
+    fpart = self._send_chunk_size - num
+    if random() < fpart: num += 1
+
+    for _ in range(num):
+      if len(self._this_cycle) == 0:
+        self._this_cycle = self._next_cycle
+        self._next_cycle = []
+      item = self._this_cycle.pop(0)
+      self._next_cycle.append(item)
+      discovery.core.openflow.sendToDPID(item.dpid, item.packet)
+
+
+def run (cls, switches, ports):
+  nexus = Nexus()
+  discovery.core = POXCore(handle_signals=False)
+  discovery.core.register("openflow", nexus)
+  sender = cls(5)
+  mac = EthAddr("02:00:00:00:00:01")
+  t = time.time()
+  for dpid in range(1, switches + 1):
+    nexus.connections[dpid] = Connection()
+    for port in range(1, ports + 1):
+      sender.add_port(dpid, port, mac, set_timer = False)
+  connect_time = time.time() - t
+  for con in nexus.connections.values(): con.writes = 0
+
+  # One cycle at the usual rate
+  total = switches * ports
+  sender._send_chunk_size = float(total) / 5 / sender._sends_per_sec
+  runs = 5 * sender._sends_per_sec
+  t = time.time()
+  for _ in range(runs):
+    sender._timer_handler()
+  cycle_time = time.time() - t
+  writes = sum(c.writes for c in nexus.connections.values())
+
+  # A couple hundred ports going down
+  t = time.time()
+  for dpid in range(1, switches + 1, max(1, switches // 200)):
+    sender.del_port(dpid, 1, set_timer = False)
+  del_time = time.time() - t
+
+  discovery.core.scheduler.quit()
+  return connect_time, cycle_time, runs, writes, del_time
+
+
+def main (argv):
+  switches = 1000
+  ports = 50
+  for a in argv:
+    if a.startswith("--switches="):
+      switches = int(a.split("=",1)[1])
+    elif a.startswith("--ports="):
+      ports = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  discovery.log.setLevel("ERROR")
+  print("%i switches, %i ports each" % (switches, ports))
+  print("  %-8s %12s %14s %10s %14s" % ("", "connect (s)", "per run (ms)",
+                                        "writes", "deletes (ms)"))
+  for name,cls in (("legacy", LegacyLLDPSender),
+                   ("current", discovery.LLDPSender)):
+    connect_time,cycle_time,runs,writes,del_time = run(cls, switches, ports)
+    print("  %-8s %12.3f %14.3f %10i %14.1f" % (name, connect_time,
+          cycle_time / runs * 1000, writes, del_time * 1000))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
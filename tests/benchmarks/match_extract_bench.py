@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cost of building an exact match for a packet-in's data
+
+Times ofp_match.from_packet(ethernet(data)) against
+ofp_match.from_packet_data(data) for a few common kinds of frame.
+
+Usage: match_extract_bench.py [--count=N]
+"""
+
+import sys
+import os.path
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.openflow.libopenflow_01 as of
+import pox.lib.packet as pkt
+from pox.lib.addresses import EthAddr, IPAddr
+
+
+def make_frames ():
+  def eth (payload, type, vlan_id = None):
+    e = pkt.ethernet(src=EthAddr("02:00:00:00:00:01"),
+                     dst=EthAddr("02:00:00:00:00:02"), type=type)
+    if vlan_id is not None:
+      v = pkt.vlan(id=vlan_id, eth_type=type)
+      v.payload = payload
+      e.type = pkt.ethernet.VLAN_TYPE
+      payload = v
+    e.payload = payload
+    return e.pack()
+  def ip (payload, protocol):
+    i = pkt.ipv4(srcip=IPAddr("10.0.0.1"), dstip=IPAddr("10.0.0.2"),
+                 protocol=protocol)
+    i.payload = payload
+    return i
+
+  tcp = pkt.tcp(srcport=40000, dstport=80, off=5)
+  tcp.payload = b"x" * 1000
+  syn = pkt.tcp(srcport=40000, dstport=80, off=6, SYN=True,
+                options=[pkt.tcp_opt(pkt.tcp_opt.MSS, 1460)])
+  udp = pkt.udp(srcport=40000, dstport=123)
+  udp.payload = b"x" * 48
+  icmp = pkt.icmp(type=pkt.TYPE_ECHO_REQUEST)
+  icmp.payload = pkt.echo(id=1, seq=1)
+  arp = pkt.arp(opcode=pkt.arp.REQUEST, protosrc=IPAddr("10.0.0.1"),
+                protodst=IPAddr("10.0.0.2"))
+  return [
+    ("tcp", eth(ip(tcp, pkt.ipv4.TCP_PROTOCOL), pkt.ethernet.IP_TYPE)),
+    ("tcp syn+options", eth(ip(syn, pkt.ipv4.TCP_PROTOCOL),
+                            pkt.ethernet.IP_TYPE)),
+    ("vlan udp", eth(ip(udp, pkt.ipv4.UDP_PROTOCOL), pkt.ethernet.IP_TYPE,
+                     vlan_id=10)),
+    ("icmp echo", eth(ip(icmp, pkt.ipv4.ICMP_PROTOCOL),
+                      pkt.ethernet.IP_TYPE)),
+    ("arp", eth(arp, pkt.ethernet.ARP_TYPE)),
+  ]
+
+
+def timeit (f, data, count):
+  t = time.time()
+  for _ in range(count): f(data, 1)
+  return (time.time() - t) / count
+
+
+def main (argv):
+  count = 20000
+  for a in argv:
+    if a.startswith("--count="):
+      count = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  parse = lambda data, in_port: of.ofp_match.from_packet(pkt.ethernet(data),
+                                                          in_port)
+  print("  %-18s %13s %13s" % ("", "from_packet", "from_data"))
+  for name,data in make_frames():
+    assert parse(data, 1) == of.ofp_match.from_packet_data(data, 1)
+    slow = timeit(parse, data, count)
+    fast = timeit(of.ofp_match.from_packet_data, data, count)
+    print("  %-18s %10.1f us %10.1f us %8.1fx" % (name, slow * 1e6,
+                                                 fast * 1e6, slow / fast))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Receive-path throughput of of_01.Connection.read()
+
+Replays a stream of switch-to-controller OpenFlow messages through a
+Connection (with a fake socket) and through the old bytes-concatenating
+read loop.  By default, the stream is a synthetic packet-in storm.  You
+can also pass a file containing a raw switch-to-controller OpenFlow byte
+stream (e.g., extracted from a capture made with openflow.debug).
+
+Usage: of_read_bench.py [--read-size=N] [--message-size=N] [stream_file]
+
+--message-size makes all the synthetic packet-ins the given size, which
+is useful for seeing how partial reads of large messages behave.
+"""
+
+import sys
+import os.path
+import random
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.core
+pox.core.initialize()
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01 as of_01
+
+
+class ReplaySocket (object):
+  """
+  Hands out the stream in randomly sized segments (like TCP does)
+  """
+  def __init__ (self, data, seed = 1):
+    self.data = data
+    self.offset = 0
+    self.rand = random.Random(seed)
+
+  def _next (self, size):
+    size = min(size, self.rand.randint(60, 9000))
+    o = min(self.offset, len(self.data))
+    self.offset = min(o + size, len(self.data))
+    return o,self.offset
+
+  def recv (self, size):
+    a,b = self._next(size)
+    return self.data[a:b]
+
+  def recv_into (self, buf):
+    a,b = self._next(len(buf))
+    buf[:b-a] = self.data[a:b]
+    return b - a
+
+  def send (self, data):
+    return len(data)
+
+  def fileno (self):
+    return -1
+
+
+def make_stream (count = 50000, message_size = None):
+  rand = random.Random(0)
+  out = []
+  if message_size: count = min(count, 20000000 // message_size)
+  for i in range(count):
+    size = message_size or rand.choice((64, 128, 128, 256, 1500))
+    pi = of.ofp_packet_in(xid=i, buffer_id=i, in_port=1+i%48,
+                          data=bytes(size))
+    out.append(pi.pack())
+  return b''.join(out)
+
+
+def legacy_read (con, sock, handler):
+  """
+  The old Connection.read() receive loop
+  """
+  d = sock.recv(2048)
+  if len(d) == 0: return False
+  con.buf += d
+  buf_len = len(con.buf)
+  offset = 0
+  while buf_len - offset >= 8:
+    ofp_type = con.buf[offset+1]
+    msg_length = con.buf[offset+2] << 8 | con.buf[offset+3]
+    if buf_len - offset < msg_length: break
+    new_offset,msg = of_01.unpackers[ofp_type](con.buf, offset)
+    offset = new_offset
+    handler(con, msg)
+  if offset != 0:
+    con.buf = con.buf[offset:]
+  return True
+
+
+def main (argv):
+  read_size = None
+  message_size = None
+  stream = None
+  for a in argv:
+    if a.startswith("--read-size="):
+      read_size = int(a.split("=",1)[1])
+    elif a.startswith("--message-size="):
+      message_size = min(int(a.split("=",1)[1]), 0xffff - 18)
+    else:
+      stream = open(a, "rb").read()
+  if stream is None:
+    stream = make_stream(message_size=message_size)
+
+  count = [0]
+  def handler (con, msg):
+    count[0] += 1
+
+  class Legacy (object):
+    buf = b''
+  sock = ReplaySocket(stream)
+  t = time.time()
+  while legacy_read(Legacy, sock, handler): pass
+  legacy_time = time.time() - t
+  legacy_count = count[0]
+
+  count[0] = 0
+  sock = ReplaySocket(stream)
+  con = of_01.Connection(sock, read_size=read_size)
+  con.handlers = [handler] * len(con.handlers)
+  t = time.time()
+  while con.read(): pass
+  new_time = time.time() - t
+  assert count[0] == legacy_count, (count[0], legacy_count)
+
+  mb = len(stream) / 1e6
+  print("%i messages, %.1f MB, read size %s" % (count[0], mb, con.read_size))
+  print("%-12s %10.0f msg/s %8.1f MB/s" % ("legacy", legacy_count/legacy_time,
+                                          mb/legacy_time))
+  print("%-12s %10.0f msg/s %8.1f MB/s" % ("recv_into", count[0]/new_time,
+                                          mb/new_time))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
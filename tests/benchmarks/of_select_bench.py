@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-event cost of waiting on switch sockets, as switch count grows
+
+Compares what OpenFlow_01_Task used to do on every wakeup (hand all of
+its sockets to the SelectHub, which rebuilds its lists and calls select()
+or EpollSelect) with polling a persistent SelectorSet.
+
+Usage: of_select_bench.py [switch counts...]
+"""
+
+import sys
+import os.path
+import socket
+import select
+import time
+import resource
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.epoll_select import EpollSelect, SelectorSet
+
+EVENTS = 2000
+
+
+def raise_fd_limit (n):
+  soft,hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+  want = n * 2 + 64
+  if soft < want:
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(want, hard), hard))
+
+
+def legacy (pairs, select_func):
+  sockets = [a for a,b in pairs]
+  n = len(pairs)
+  t = time.time()
+  for i in range(EVENTS):
+    a,b = pairs[(i * 7919) % n]
+    b.send(b"x")
+    # This is roughly what SelectHub._select() did for each wakeup
+    rl = {}
+    xl = {}
+    for s in sockets: rl[s] = None
+    for s in sockets: xl[s] = None
+    ro,wo,xo = select_func(list(rl.keys()), [], list(xl.keys()), 1)
+    for s in ro: s.recv(1)
+  return (time.time() - t) / EVENTS
+
+
+def persistent (pairs):
+  ss = SelectorSet()
+  for a,b in pairs: ss.register(a)
+  n = len(pairs)
+  t = time.time()
+  for i in range(EVENTS):
+    a,b = pairs[(i * 7919) % n]
+    b.send(b"x")
+    ro,wo,xo = ss.poll(1)
+    for s in ro: s.recv(1)
+  r = (time.time() - t) / EVENTS
+  ss.close()
+  return r
+
+
+def main (counts):
+  print("%8s %14s %14s %14s" % ("switches", "select() us", "EpollSelect us",
+                                "SelectorSet us"))
+  for n in counts:
+    raise_fd_limit(n)
+    pairs = [socket.socketpair() for _ in range(n)]
+    if n < 1000:
+      s = "%14.1f" % (legacy(pairs, select.select) * 1e6,)
+    else:
+      s = "%14s" % ("n/a",) # FD_SETSIZE
+    es = EpollSelect()
+    e = legacy(pairs, es.select) * 1e6
+    es.close()
+    p = persistent(pairs) * 1e6
+    print("%8i %s %14.1f %14.1f" % (n, s, e, p))
+    for a,b in pairs:
+      a.close()
+      b.close()
+
+
+if __name__ == '__main__':
+  counts = [int(x) for x in sys.argv[1:]] or [100, 500, 1500, 3000]
+  main(counts)
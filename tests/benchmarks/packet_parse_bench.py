@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Eager vs. lazy packet parsing
+
+For several kinds of frame, times ethernet(data) against
+ethernet.unpack_lazy(data) when the caller only reads the Ethernet
+addresses ("l2"), and when it goes on to find() the innermost header and
+read a field from it ("deep").  For "dns", deep only goes as far as
+the UDP header, which is typical of a forwarding application.
+
+Lazy parsing has some overhead per header, so "deep" is where it has
+the least to offer.
+
+Usage: packet_parse_bench.py [--count=N]
+"""
+
+import sys
+import os.path
+import time
+import struct
+import logging
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.lib.packet as pkt
+from pox.lib.addresses import EthAddr, IPAddr
+
+
+def make_frames ():
+  def eth (payload, type, vlan_id = None):
+    e = pkt.ethernet(src=EthAddr("02:00:00:00:00:01"),
+                     dst=EthAddr("02:00:00:00:00:02"), type=type)
+    if vlan_id is not None:
+      v = pkt.vlan(id=vlan_id, eth_type=type)
+      v.payload = payload
+      e.type = pkt.ethernet.VLAN_TYPE
+      payload = v
+    e.payload = payload
+    return e.pack()
+  def ip (payload, protocol):
+    i = pkt.ipv4(srcip=IPAddr("10.0.0.1"), dstip=IPAddr("10.0.0.2"),
+                 protocol=protocol)
+    i.payload = payload
+    return i
+
+  tcp = pkt.tcp(srcport=40000, dstport=80, off=5)
+  tcp.payload = b"x" * 1400
+  udp = pkt.udp(srcport=40000, dstport=123)
+  udp.payload = b"x" * 48
+  dns = pkt.udp(srcport=40000, dstport=53)
+  dns.payload = (struct.pack("!HHHHHH", 1, 0x0100, 1, 0, 0, 0) # One query
+                 + b"\x04pox1\x07example\x03com\x00"
+                 + struct.pack("!HH", 1, 1))
+  icmp = pkt.icmp(type=pkt.TYPE_ECHO_REQUEST)
+  icmp.payload = pkt.echo(id=1, seq=1)
+  icmp.payload.payload = b"x" * 56
+  arp = pkt.arp(opcode=pkt.arp.REQUEST, protosrc=IPAddr("10.0.0.1"),
+                protodst=IPAddr("10.0.0.2"))
+  return [
+    ("tcp", eth(ip(tcp, pkt.ipv4.TCP_PROTOCOL), pkt.ethernet.IP_TYPE),
+     "tcp", "dstport"),
+    ("udp", eth(ip(udp, pkt.ipv4.UDP_PROTOCOL), pkt.ethernet.IP_TYPE),
+     "udp", "dstport"),
+    ("vlan udp", eth(ip(udp, pkt.ipv4.UDP_PROTOCOL), pkt.ethernet.IP_TYPE,
+                     vlan_id=10), "udp", "dstport"),
+    ("dns", eth(ip(dns, pkt.ipv4.UDP_PROTOCOL), pkt.ethernet.IP_TYPE),
+     "udp", "dstport"),
+    ("icmp echo", eth(ip(icmp, pkt.ipv4.ICMP_PROTOCOL),
+                      pkt.ethernet.IP_TYPE), "echo", "seq"),
+    ("arp", eth(arp, pkt.ethernet.ARP_TYPE), "arp", "protodst"),
+  ]
+
+
+def timeit (f, count, repeat = 3):
+  best = None
+  for _ in range(repeat):
+    t = time.time()
+    for _ in range(count): f()
+    t = time.time() - t
+    if best is None or t < best: best = t
+  return best / count
+
+
+def main (argv):
+  count = 20000
+  logging.getLogger("packet").setLevel(logging.CRITICAL) # Parse warnings
+  for a in argv:
+    if a.startswith("--count="):
+      count = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  print("  %-10s %-5s %10s %10s" % ("", "", "eager", "lazy"))
+  for name,data,proto,field in make_frames():
+    assert (getattr(pkt.ethernet(data).find(proto), field)
+            == getattr(pkt.ethernet.unpack_lazy(data).find(proto), field))
+    for what,use in (("l2", lambda p: (p.src, p.dst, p.type)),
+                     ("deep", lambda p: getattr(p.find(proto), field))):
+      eager = timeit(lambda: use(pkt.ethernet(data)), count)
+      lazy = timeit(lambda: use(pkt.ethernet.unpack_lazy(data)), count)
+      print("  %-10s %-5s %7.1f us %7.1f us %6.1fx" % (name, what,
+            eager * 1e6, lazy * 1e6, eager / lazy))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
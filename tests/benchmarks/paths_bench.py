@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shortest paths for forwarding
+
+For each size in --sizes, builds two topologies: a sparse one (a ring
+with random chords, about four links per switch) and a dense leaf/spine
+one (a tenth of the switches are spines, connected to every leaf).  It
+then times:
+
+ * The old Floyd-Warshall _calc_paths(), which ran again after every
+   link change.  It's O(V^3), so it's only run up to --legacy-max.
+ * Computing a shortest-path tree (per source) with ShortestPaths,
+   with plain Python and with the NumPy backend (if NumPy is available).
+ * A link flap (a link going down and coming back) with --sources trees
+   cached: how long it takes, and how many trees it throws away.
+
+Usage: paths_bench.py [--sizes=100,500,2000] [--sources=N]
+                      [--legacy-max=N]
+"""
+
+import sys
+import os.path
+import time
+import random
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.graph.paths import ShortestPaths
+import pox.lib.graph.paths as paths_module
+
+
+def sparse_topology (n, r):
+  links = set()
+  for i in range(n):
+    links.add((i, (i + 1) % n))
+  while len(links) < n * 2:
+    a,b = r.sample(range(n), 2)
+    if (b,a) not in links: links.add((a,b))
+  return sorted(links)
+
+
+def dense_topology (n, r):
+  spines = max(2, n // 10)
+  return [(s, l) for s in range(spines) for l in range(spines, n)]
+
+
+def legacy_calc_paths (sws, adjacency):
+  """
+  The old Floyd-Warshall from l2_multi
+  """
+  path_map = defaultdict(lambda:defaultdict(lambda:(None,None)))
+  for k in sws:
+    for j,port in adjacency[k].items():
+      if port is None: continue
+      path_map[k][j] = (1,None)
+    path_map[k][k] = (0,None)
+  for k in sws:
+    for i in sws:
+      for j in sws:
+        if path_map[i][k][0] is not None:
+          if path_map[k][j][0] is not None:
+            ikj_dist = path_map[i][k][0]+path_map[k][j][0]
+            if path_map[i][j][0] is None or ikj_dist < path_map[i][j][0]:
+              path_map[i][j] = (ikj_dist, k)
+  return path_map
+
+
+def run_legacy (n, links):
+  adjacency = defaultdict(lambda:defaultdict(lambda:None))
+  for a,b in links:
+    adjacency[a][b] = 1
+    adjacency[b][a] = 1
+  t = time.time()
+  legacy_calc_paths(list(range(n)), adjacency)
+  return time.time() - t
+
+
+def run_engine (n, links, dense, sources, r):
+  sp = ShortestPaths(dense=dense)
+  for a,b in links:
+    sp.set_edge(a, b)
+    sp.set_edge(b, a)
+  srcs = r.sample(range(n), sources)
+
+  t = time.time()
+  for s in srcs:
+    sp.tree(s)
+  tree_time = (time.time() - t) / sources
+
+  flaps = 20
+  flap_time = 0
+  invalidated = sp.invalidated
+  for a,b in r.sample(links, flaps):
+    t = time.time()
+    sp.remove_edge(a, b)
+    sp.remove_edge(b, a)
+    sp.set_edge(a, b)
+    sp.set_edge(b, a)
+    flap_time += time.time() - t
+    for s in srcs:
+      sp.tree(s)
+  invalidated = (sp.invalidated - invalidated) / float(flaps)
+  return tree_time, flap_time / flaps, invalidated
+
+
+def main (argv):
+  sizes = [100, 500, 2000]
+  sources = 20
+  legacy_max = 200
+  for a in argv:
+    if a.startswith("--sizes="):
+      sizes = [int(x) for x in a.split("=",1)[1].split(",")]
+    elif a.startswith("--sources="):
+      sources = int(a.split("=",1)[1])
+    elif a.startswith("--legacy-max="):
+      legacy_max = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  backends = [("python", False)]
+  if paths_module.numpy is not None:
+    backends.append(("numpy", True))
+  else:
+    print("(NumPy isn't installed; skipping the NumPy backend)")
+
+  print("%-6s %6s %8s %12s  %-7s %10s %10s %12s" % ("topo", "sws", "links",
+        "legacy (s)", "engine", "tree (ms)", "flap (ms)", "trees lost"))
+  for n in sizes:
+    for topo,make in (("sparse", sparse_topology), ("dense", dense_topology)):
+      r = random.Random(n)
+      links = make(n, r)
+      if n <= legacy_max:
+        legacy = "%12.3f" % (run_legacy(n, links),)
+      else:
+        legacy = "%12s" % ("-",)
+      for name,dense in backends:
+        tree_time,flap_time,lost = run_engine(n, links, dense,
+                                              min(sources, n), r)
+        print("%-6s %6i %8i %s  %-7s %10.3f %10.3f %9.1f/%-2i" % (topo, n,
+              len(links), legacy, name, tree_time * 1000, flap_time * 1000,
+              lost, min(sources, n)))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+revent raise throughput
+
+Times EventMixin.raiseEvent() and raiseEventNoErrors() against the old
+interpreted raiseEvent() for a range of listener setups, including a
+PacketIn raised on a connection and then on the nexus like of_01 does.
+
+Usage: revent_bench.py [--count=N]
+"""
+
+import sys
+import os.path
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.revent import EventMixin, Event, EventHalt, ReventError
+import pox.lib.revent.revent as revent
+
+
+class Ping (Event):
+  def __init__ (self, a, b):
+    self.a = a
+    self.b = b
+
+class Source (EventMixin):
+  _eventMixin_events = set([Ping])
+
+
+def legacy_raise (self, event, *args, **kw):
+  """
+  The old EventMixin.raiseEvent()
+  """
+  if self._eventMixin_initialized is False:
+    self._eventMixin_init()
+
+  if isinstance(event, Event):
+    eventType = event.__class__
+    classCall = True
+    if event.source is None: event.source = self
+  elif issubclass(event, Event):
+    # Check for early-out
+    if event not in self._eventMixin_handlers:
+      return None
+    if len(self._eventMixin_handlers[event]) == 0:
+      return None
+
+    classCall = True
+    eventType = event
+    event = eventType(*args, **kw)
+    args = ()
+    kw = {}
+    if event.source is None:
+      event.source = self
+  else:
+    classCall = False
+
+  if (self._eventMixin_events is not True
+      and eventType not in self._eventMixin_events):
+    raise ReventError("Event %s not defined on object of type %s"
+                      % (eventType, type(self)))
+
+  handlers = self._eventMixin_handlers.get(eventType, [])
+  for (priority, handler, once, eid) in handlers:
+    if classCall:
+      rv = event._invoke(handler, *args, **kw)
+    else:
+      rv = handler(event, *args, **kw)
+    if once: self.removeListener(eid)
+    if rv is None: continue
+    if rv is False:
+      self.removeListener(eid)
+    if rv is True:
+      if classCall: event.halt = True
+      break
+    if type(rv) == tuple:
+      if len(rv) >= 2 and rv[1] == True:
+        self.removeListener(eid)
+      if len(rv) >= 1 and rv[0]:
+        if classCall: event.halt = True
+        break
+      if len(rv) == 0:
+        if classCall: event.halt = True
+        break
+    if classCall and event.halt:
+      break
+  return event
+
+
+def legacy_raise_no_errors (self, event, *args, **kw):
+  try:
+    return legacy_raise(self, event, *args, **kw)
+  except ReventError:
+    raise
+  except:
+    pass
+  return None
+
+
+def handler (event):
+  pass
+
+def halter (event):
+  return EventHalt
+
+
+def setups ():
+  """
+  Yields (name, source, raise function name, event) for each case
+
+  The raise function name is used to pick the new or legacy version.
+  """
+  s = Source()
+  yield "class, no listeners", s, "raiseEvent", Ping
+
+  s = Source()
+  s.addListener(Ping, handler)
+  yield "class, 1 listener", s, "raiseEvent", Ping
+  yield "instance, 1 listener", s, "raiseEvent", None
+
+  s = Source()
+  for _ in range(5): s.addListener(Ping, handler)
+  yield "class, 5 listeners", s, "raiseEvent", Ping
+
+  s = Source()
+  s.addListener(Ping, halter, priority=1)
+  for _ in range(4): s.addListener(Ping, handler)
+  yield "class, halted by 1st", s, "raiseEvent", Ping
+
+  s = Source()
+  s.addListener(Ping, handler)
+  s.addListener(Ping, handler)
+  yield "no errors, 2 listeners", s, "raiseEventNoErrors", Ping
+
+
+def timeit (f, count, repeat = 3):
+  best = None
+  for _ in range(repeat):
+    t = time.time()
+    for _ in range(count): f()
+    t = time.time() - t
+    if best is None or t < best: best = t
+  return best / count
+
+
+def main (argv):
+  count = 200000
+  for a in argv:
+    if a.startswith("--count="):
+      count = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  legacy = {"raiseEvent":legacy_raise,
+            "raiseEventNoErrors":legacy_raise_no_errors}
+
+  print("  %-24s %10s %10s" % ("", "legacy", "compiled"))
+  def row (name, old, new):
+    print("  %-24s %7.3f us %7.3f us %6.1fx" % (name, old * 1e6, new * 1e6,
+                                                old / new))
+
+  for name,s,func,event in setups():
+    new_raise = getattr(s, func)
+    old_raise = legacy[func]
+    if event is None:
+      e = Ping(1, 2)
+      old = timeit(lambda: old_raise(s, e), count)
+      new = timeit(lambda: new_raise(e), count)
+    else:
+      old = timeit(lambda: old_raise(s, event, 1, 2), count)
+      new = timeit(lambda: new_raise(event, 1, 2), count)
+    row(name, old, new)
+
+  # Like of_01's handle_PACKET_IN: nexus, then the connection
+  nexus = Source()
+  con = Source()
+  nexus.addListener(Ping, handler)
+  con.addListener(Ping, handler)
+  def old_pair ():
+    e = legacy_raise_no_errors(nexus, Ping, 1, 2)
+    if e is None or e.halt != True:
+      legacy_raise_no_errors(con, Ping, 1, 2)
+  def new_pair ():
+    e = nexus.raiseEventNoErrors(Ping, 1, 2)
+    if e is None or e.halt != True:
+      con.raiseEventNoErrors(Ping, 1, 2)
+  row("nexus + connection", timeit(old_pair, count), timeit(new_pair, count))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
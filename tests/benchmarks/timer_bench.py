@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cost of pending timers in the recoco SelectHub
+
+With N timers pending, times how long the SelectHub spends working out
+when to wake up on each cycle, against the old scan over every waiting
+task.  Also times starting and cancelling a Timer.
+
+Usage: timer_bench.py [timer counts...]
+"""
+
+import sys
+import os.path
+import random
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.lib.recoco import Scheduler, Timer
+
+CYCLES = 2000
+
+
+def legacy_cycle (tasks, now):
+  """
+  Roughly what SelectHub._select() used to do on each cycle
+  """
+  rl = {}
+  wl = {}
+  xl = {}
+  timeout = None
+  for t,trl,twl,txl,tto in tasks.values():
+    if tto != None:
+      tt = tto - now
+      if timeout is None or tt < timeout:
+        timeout = tt
+    if trl:
+      for i in trl: rl[i] = t
+  return timeout
+
+
+def main (counts):
+  rand = random.Random(0)
+  s = Scheduler(isDefaultScheduler=False, startInThread=False,
+                threaded_selecthub=False)
+  hub = s._selectHub
+  print("%8s %14s %14s %14s" % ("timers", "legacy us", "heap us",
+                                "start+cancel us"))
+  for n in counts:
+    now = time.time()
+    tasks = {}
+    for i in range(n):
+      tasks[i] = (i, None, None, None, now + rand.uniform(10, 100))
+    t = time.time()
+    for _ in range(CYCLES): legacy_cycle(tasks, now)
+    legacy = (time.time() - t) / CYCLES
+
+    t = time.time()
+    timers = [Timer(rand.uniform(10, 100), None, scheduler=s)
+              for _ in range(n)]
+    start = (time.time() - t) / n
+
+    t = time.time()
+    for _ in range(CYCLES):
+      with hub._timer_lock:
+        hub._timers.next_time()
+        hub._task_deadlines.next_time()
+      with hub._timer_lock:
+        hub._timers.pop_due(now, hub._due)
+    heap = (time.time() - t) / CYCLES
+
+    t = time.time()
+    for timer in timers: timer.cancel()
+    cancel = (time.time() - t) / n
+    print("%8i %14.1f %14.1f %14.1f" % (n, legacy * 1e6, heap * 1e6,
+                                        (start + cancel) * 1e6))
+
+
+if __name__ == '__main__':
+  counts = [int(x) for x in sys.argv[1:]] or [100, 1000, 10000, 50000]
+  main(counts)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+call_when_ready() with lots of waiters
+
+Sets up --waiters callbacks, each waiting on two of --components
+components, and then times registering the components one by one.
+
+Usage: waiter_bench.py [--components=N] [--waiters=N]
+"""
+
+import sys
+import os.path
+import time
+import random
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+import pox.core
+from pox.core import POXCore
+
+
+def main (argv):
+  components = 50
+  waiters = 1000
+  for a in argv:
+    if a.startswith("--components="):
+      components = int(a.split("=",1)[1])
+    elif a.startswith("--waiters="):
+      waiters = int(a.split("=",1)[1])
+    else:
+      raise RuntimeError("Unknown argument: " + a)
+
+  pox.core.log.setLevel("ERROR")
+  core = POXCore(handle_signals=False)
+  names = ["c%i" % (i,) for i in range(components)]
+  r = random.Random(0)
+  calls = [0]
+  def cb ():
+    calls[0] += 1
+  t = time.time()
+  for _ in range(waiters):
+    core.call_when_ready(cb, r.sample(names, 2))
+  setup = time.time() - t
+  t = time.time()
+  for n in names:
+    core.register(n, object())
+  t = time.time() - t
+  core.scheduler.quit()
+  assert calls[0] == waiters
+  print("%i waiters on %i components" % (waiters, components))
+  print("  call_when_ready(): %8.2f us each" % (setup / waiters * 1e6,))
+  print("  register():        %8.2f us each" % (t / components * 1e6,))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../..")
+
+from pox.core import POXCore
+from pox.lib.revent import EventMixin, Event
+
+
+class Thing (object):
+  pass
+
+
+class Ping (Event):
+  pass
+
+
+class PingSource (EventMixin):
+  _eventMixin_events = set([Ping])
+
+
+class Sink (object):
+  def __init__ (self):
+    self.pings = 0
+    self.met = False
+
+  def _handle_source_Ping (self, event):
+    self.pings += 1
+
+  def _all_dependencies_met (self):
+    self.met = True
+
+
+class WaiterTest (unittest.TestCase):
+  def setUp (self):
+    self.core = POXCore(handle_signals=False)
+
+  def tearDown (self):
+    self.core.scheduler.quit()
+
+  def test_call_when_ready (self):
+    core = self.core
+    calls = []
+    core.call_when_ready(lambda: calls.append("ab"), ["a", "b"])
+    core.call_when_ready(lambda: calls.append("b"), "b")
+    core.call_when_ready(lambda: calls.append("core"), "core")
+    self.assertEqual(calls, ["core"])
+    core.register("a", Thing())
+    self.assertEqual(calls, ["core"])
+    self.assertEqual(set(core._waiting_on), set(["b"]))
+    core.register("b", Thing())
+    self.assertEqual(calls, ["core", "ab", "b"])
+    self.assertEqual(core._waiters, {})
+    self.assertEqual(core._waiting_on, {})
+
+  def test_chained (self):
+    # A callback registering something another callback is waiting for
+    core = self.core
+    calls = []
+    core.call_when_ready(lambda: calls.append("c"), ["a", "c"])
+    core.call_when_ready(lambda: core.register("c", Thing()), "b")
+    core.register("a", Thing())
+    core.register("b", Thing())
+    self.assertEqual(calls, ["c"])
+
+  def test_listen_to_dependencies (self):
+    core = self.core
+    sink = Sink()
+    core.listen_to_dependencies(sink)
+    self.assertFalse(sink.met)
+    source = PingSource()
+    core.register("source", source)
+    self.assertTrue(sink.met)
+    self.assertTrue(sink._source_ is source)
+    source.raiseEvent(Ping)
+    self.assertEqual(sink.pings, 1)
+
+  def test_dependency_graph (self):
+    core = self.core
+    core.call_when_ready(lambda: None, "a", name="first")
+    core.call_when_ready(lambda: None, ["a", "b"], name="second")
+    core.register("a", Thing())
+    g = core.dependency_graph()
+    self.assertEqual(set(g['components']), set(["core", "a"]))
+    first,second = g['waiters']
+    self.assertEqual(first['name'], "first")
+    self.assertEqual(first['depends_on'], ["a"])
+    self.assertTrue(first['ready'] >= first['requested'])
+    self.assertEqual(second['ready'], None)
+    self.assertEqual(second['missing'], ["b"])
+    dot = core.dependency_dot()
+    self.assertTrue(dot.startswith("digraph"))
+    self.assertTrue('-> "b" [style=dashed]' in dot)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -159,6 +159,43 @@ class SwitchImplTest (unittest.TestCase):
     self.assertEqual(event.port.port_no,3)
     self.assertEqual(event.packet, self.packet)
 
+  def test_flow_cache(self):
+    c = self.conn
+    s = self.switch
+    received = []
+    s.addListener(DpPacketOut, lambda event: received.append(event.port.port_no))
+
+    c.to_switch(ofp_flow_mod(priority=1, match=ofp_match(in_port=1),
+                             actions=[ofp_action_output(port=3)]))
+    s.rx_packet(self.packet, in_port=1)
+    s.rx_packet(self.packet, in_port=1)
+    self.assertEqual(received, [3, 3])
+    self.assertEqual((s.flow_cache_misses, s.flow_cache_hits), (1, 1))
+
+    # A new higher priority flow must take over from the cached one
+    c.to_switch(ofp_flow_mod(priority=2,
+                             match=ofp_match(dl_dst=self.packet.dst),
+                             actions=[ofp_action_output(port=4)]))
+    s.rx_packet(self.packet, in_port=1)
+    s.rx_packet(self.packet, in_port=1)
+    self.assertEqual(received, [3, 3, 4, 4])
+    self.assertEqual((s.flow_cache_misses, s.flow_cache_hits), (2, 2))
+
+    # A different flow stays cached when some other flow is deleted
+    s.rx_packet(self.packet, in_port=2)
+    c.to_switch(ofp_flow_mod(command=OFPFC_DELETE_STRICT, priority=1,
+                             match=ofp_match(in_port=1)))
+    s.rx_packet(self.packet, in_port=2)
+    self.assertEqual((s.flow_cache_misses, s.flow_cache_hits), (3, 3))
+
+    # ...and a deleted flow is no longer used
+    c.to_switch(ofp_flow_mod(command=OFPFC_DELETE, match=ofp_match()))
+    c.received = []
+    s.rx_packet(self.packet, in_port=1)
+    self.assertEqual(received, [3, 3, 4, 4, 4, 4])
+    self.assertTrue(isinstance(c.last, ofp_packet_in))
+    self.assertEqual(len(s._flow_cache), 0)
+
   def test_delete_port(self):
     c = self.conn
     s = self.switch
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.core import POXCore
+from pox.lib.addresses import EthAddr, IPAddr
+from pox.lib.graph.paths import ShortestPaths
+from pox.openflow.discovery import Link, LinkEvent
+import pox.forwarding.l2_multi as l2_multi
+import pox.openflow.libopenflow_01 as of
+import pox.lib.packet as pkt
+
+
+class MockConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.sent = []
+
+  def send (self, data):
+    self.sent.append(data)
+
+
+class MockDiscovery (object):
+  def __init__ (self):
+    self.adjacency = {} # Link -> time
+
+  def is_edge_port (self, dpid, port):
+    for link in self.adjacency:
+      if (link.dpid1,link.port1) == (dpid,port): return False
+      if (link.dpid2,link.port2) == (dpid,port): return False
+    return True
+
+
+class MockPacketIn (object):
+  def __init__ (self, port, data):
+    self.port = port
+    self.data = data
+    self.ofp = of.ofp_packet_in(in_port=port, data=data)
+    self.parsed = pkt.ethernet(data)
+
+
+def mac (n):
+  return EthAddr("02:00:00:00:00:%02x" % (n,))
+
+
+class L2MultiTest (unittest.TestCase):
+  """
+  Six switches in a ring, with an optional chord between 1 and 4
+
+  Port 1 of each switch goes to the next switch, port 2 to the previous
+  one, and port 3 is the chord.  Hosts are on other ports.
+  """
+  def setUp (self):
+    self.old_core = l2_multi.core
+    l2_multi.core = POXCore(handle_signals=False)
+    self.discovery = MockDiscovery()
+    l2_multi.core.register("openflow_discovery", self.discovery)
+    self.app = l2_multi.l2_multi.__new__(l2_multi.l2_multi)
+
+    l2_multi.adjacency.clear()
+    l2_multi.switches.clear()
+    l2_multi.mac_map.clear()
+    l2_multi.waiting_paths.clear()
+    l2_multi.installed_paths.clear()
+    l2_multi.match_paths.clear()
+    l2_multi.port_paths.clear()
+    l2_multi.port_load.clear()
+    self.old_paths = l2_multi.paths
+    l2_multi.paths = ShortestPaths()
+    self.old_ecmp = l2_multi._ecmp
+
+    for dpid in range(1, 7):
+      sw = l2_multi.Switch()
+      sw.dpid = dpid
+      sw.connection = MockConnection(dpid)
+      sw._connected_at = time.time() - l2_multi.FLOOD_HOLDDOWN # No holddown
+      l2_multi.switches[dpid] = sw
+    for dpid in range(1, 7):
+      self.link_up(dpid, 1, dpid % 6 + 1, 2)
+
+  def tearDown (self):
+    l2_multi.core.scheduler.quit()
+    l2_multi.core = self.old_core
+    l2_multi.paths = self.old_paths
+    l2_multi._ecmp = self.old_ecmp
+
+  def link_up (self, dpid1, port1, dpid2, port2):
+    for l in (Link(dpid1,port1,dpid2,port2), Link(dpid2,port2,dpid1,port1)):
+      self.discovery.adjacency[l] = time.time()
+      self.app._handle_openflow_discovery_LinkEvent(LinkEvent(True, l))
+
+  def link_down (self, dpid1, port1, dpid2, port2):
+    for l in (Link(dpid1,port1,dpid2,port2), Link(dpid2,port2,dpid1,port1)):
+      del self.discovery.adjacency[l]
+      self.app._handle_openflow_discovery_LinkEvent(LinkEvent(False, l))
+
+  def send (self, dpid, port, src, dst, sport = 1000, dport = 2000):
+    """
+    A UDP packet from host src to host dst arrives at a switch
+    """
+    u = pkt.udp(srcport=sport, dstport=dport)
+    u.payload = b"hi"
+    ip = pkt.ipv4(srcip=IPAddr("10.0.0.%i" % (src,)),
+                  dstip=IPAddr("10.0.0.%i" % (dst,)),
+                  protocol=pkt.ipv4.UDP_PROTOCOL)
+    ip.payload = u
+    e = pkt.ethernet(src=mac(src), dst=mac(dst), type=pkt.ethernet.IP_TYPE)
+    e.payload = ip
+    sw = l2_multi.switches[dpid]
+    sw._handle_PacketIn(MockPacketIn(port, e.pack()))
+
+  def learn (self, *hosts):
+    """
+    Has each (host,dpid,port) send something so that it's learned
+    """
+    for host,dpid,port in hosts:
+      self.send(dpid, port, host, 99)
+
+  def clear_sent (self):
+    for sw in l2_multi.switches.values():
+      sw.connection.sent = []
+
+  def deletes (self):
+    """
+    The DELETE_STRICTs sent as (dpid,in_port,out_port,dl_dst)
+    """
+    r = set()
+    for sw in l2_multi.switches.values():
+      for m in sw.connection.sent:
+        if not isinstance(m, of.ofp_flow_mod): continue
+        if m.command != of.OFPFC_DELETE_STRICT: continue
+        r.add((sw.dpid, m.match.in_port, m.out_port, m.match.dl_dst))
+    return r
+
+  def hops (self, src, dst):
+    """
+    The installed path from host src to host dst as deletes() would be
+    """
+    p = l2_multi.match_paths[self.match(src, dst)]
+    return set((sw.dpid, in_port, out_port, mac(dst))
+               for sw,in_port,out_port in p.path)
+
+  def match (self, src, dst):
+    for m in l2_multi.match_paths:
+      if m.dl_src == mac(src) and m.dl_dst == mac(dst):
+        return m
+    return None
+
+  def test_link_down (self):
+    self.link_up(1, 3, 4, 3)
+    self.learn((1,1,10), (2,2,10), (4,4,10))
+    self.send(1, 10, 1, 4) # Over the chord
+    self.send(1, 10, 1, 2) # Not
+    self.assertEqual(self.hops(1, 4), set([(1,10,3,mac(4)), (4,3,10,mac(4))]))
+    expected = self.hops(1, 4) | self.hops(4, 1)
+    self.clear_sent()
+
+    self.link_down(1, 3, 4, 3)
+    self.assertEqual(self.deletes(), expected)
+    self.assertEqual(self.match(1, 4), None)
+    self.assertNotEqual(self.match(1, 2), None)
+    self.assertEqual(len(l2_multi.installed_paths), 2)
+
+  def test_link_up (self):
+    self.learn((1,1,10), (3,3,5), (4,4,10))
+    self.send(1, 10, 1, 4) # Three hops either way around
+    self.send(1, 10, 1, 3)
+    self.assertEqual(len(self.hops(1, 4)), 4)
+    expected = self.hops(1, 4) | self.hops(4, 1)
+    self.clear_sent()
+
+    # Shortens the paths between 1 and 4
+    self.link_up(1, 3, 4, 3)
+    self.assertEqual(self.deletes(), expected)
+    self.assertEqual(self.match(1, 4), None)
+    self.assertNotEqual(self.match(1, 3), None)
+
+    # Host 3's port turns out to go to a switch (and doesn't shorten
+    # anything)
+    expected = self.hops(1, 3) | self.hops(3, 1)
+    self.clear_sent()
+    self.link_up(3, 5, 6, 5)
+    self.assertEqual(self.deletes(), expected)
+    self.assertFalse(mac(3) in l2_multi.mac_map)
+    self.assertEqual(len(l2_multi.installed_paths), 0)
+
+  def test_mac_moved (self):
+    self.link_up(1, 3, 4, 3)
+    self.learn((1,1,10), (4,4,10))
+    self.send(1, 10, 1, 4)
+    self.assertEqual(self.hops(4, 1), set([(4,10,3,mac(1)), (1,3,10,mac(1))]))
+    to_4 = self.hops(1, 4)
+    self.clear_sent()
+
+    # Host 4 moves to another port on the same switch and replies.  The
+    # path to it goes, and the path from it is replaced by one from the
+    # new port which shares its second hop.
+    self.send(4, 11, 4, 1, sport=2000, dport=1000)
+    self.assertEqual(l2_multi.mac_map[mac(4)], (l2_multi.switches[4], 11))
+    self.assertEqual(self.deletes(), to_4 | set([(4,10,3,mac(1))]))
+    self.assertEqual(self.hops(4, 1), set([(4,11,3,mac(1)), (1,3,10,mac(1))]))
+    self.assertEqual(self.hops(1, 4), set([(1,10,3,mac(4)), (4,3,11,mac(4))]))
+    self.assertEqual(len(l2_multi.installed_paths), 2)
+
+  def first_hops (self, flows):
+    """
+    Sends flows from host 1 to host 4, and returns which port each left
+    switch 1 by
+    """
+    r = []
+    for sport in range(1000, 1000 + flows):
+      self.send(1, 10, 1, 4, sport=sport)
+      m = [m for m in l2_multi.match_paths
+           if m.dl_src == mac(1) and m.tp_src == sport][0]
+      r.append(l2_multi.match_paths[m].path[0][2])
+    return r
+
+  def test_ecmp_hash (self):
+    # Two ways round the ring from 1 to 4, both three hops
+    self.learn((1,1,10), (4,4,10))
+    l2_multi._ecmp = None
+    self.assertEqual(len(set(self.first_hops(32))), 1)
+
+    l2_multi._ecmp = "hash"
+    hops = self.first_hops(32)
+    self.assertEqual(sorted(set(hops)), [1, 2])
+    self.assertTrue(8 <= hops.count(1) <= 24)
+
+    # The same flows go the same way again, so reinstalling them
+    # doesn't delete anything
+    self.clear_sent()
+    self.assertEqual(self.first_hops(32), hops)
+    self.assertEqual(self.deletes(), set())
+
+  def test_ecmp_stats (self):
+    self.learn((1,1,10), (4,4,10))
+    l2_multi._ecmp = "hash"
+    hashed = self.first_hops(32).count(1)
+
+    # Switch 1's port 1 is busy, so flows are weighted away from it
+    l2_multi._ecmp = "stats"
+    l2_multi.port_load[(1,1)] = (0, 0, 1e8)
+    l2_multi.port_load[(1,2)] = (0, 0, 1e6)
+    busy = self.first_hops(32).count(1)
+    self.assertTrue(busy < hashed)
+    self.assertTrue(busy < 32 // 3)
+
+  def test_port_load_pruned (self):
+    class Event (object):
+      def __init__ (self, dpid, port = None, deleted = False):
+        self.dpid = dpid
+        self.port = port
+        self.deleted = deleted
+    for key in [(1,1), (1,2), (2,1), (2,2)]:
+      l2_multi.port_load[key] = (0, 0, 0)
+    self.app._handle_openflow_ConnectionDown(Event(1))
+    self.app._handle_openflow_PortStatus(Event(2, 2))
+    self.assertEqual(sorted(l2_multi.port_load), [(2,1), (2,2)])
+    self.app._handle_openflow_PortStatus(Event(2, 2, deleted=True))
+    self.assertEqual(sorted(l2_multi.port_load), [(2,1)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import json
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.core import POXCore, UpEvent
+from pox.lib.revent import EventMixin, Event
+import pox.info.profiler as profiler
+from pox.info.profiler import Profiler, Stat
+
+
+class Ping (Event):
+  pass
+
+
+class Source (EventMixin):
+  _eventMixin_events = set([Ping])
+
+
+class MockWebServer (object):
+  def __init__ (self):
+    self.handlers = {}
+
+  def set_handler (self, prefix, handler, args):
+    self.handlers[prefix] = (handler, args)
+
+
+class FakeTask (object):
+  pass
+
+
+class ProfilerTest (unittest.TestCase):
+  def setUp (self):
+    self.old_core = profiler.core
+    profiler.core = POXCore(handle_signals=False)
+    self.profilers = []
+
+  def tearDown (self):
+    for p in self.profilers:
+      p.stop()
+    profiler.core.scheduler.quit()
+    profiler.core = self.old_core
+
+  def _profiler (self, **kw):
+    p = Profiler(**kw)
+    self.profilers.append(p)
+    return p
+
+  def test_sampled_handler (self):
+    p = self._profiler(sample=4)
+    calls = []
+    def handler (x):
+      calls.append(x)
+      time.sleep(0.001)
+      return x * 2
+    wrapped = p._wrap_handler(handler)
+    self.assertTrue(wrapped.__wrapped__ is handler)
+    for i in range(10):
+      self.assertEqual(wrapped(i), i * 2)
+    self.assertEqual(calls, list(range(10)))
+
+    s = p.handlers[profiler._handler_name(handler)]
+    self.assertEqual(s.count, 10)
+    self.assertEqual(s.timed, 2) # The 4th and 8th calls
+    self.assertTrue(s.total > 0)
+    self.assertAlmostEqual(s.estimated_total, s.total * 5)
+    self.assertTrue(s.estimated_total >= 0.009)
+    d = s.to_dict()
+    self.assertAlmostEqual(d['mean'], s.total / 2)
+
+  def test_estimated_total (self):
+    s = Stat()
+    self.assertEqual(s.estimated_total, 0.0)
+    s.count = 12
+    s.timed = 3
+    s.total = 0.3
+    self.assertAlmostEqual(s.estimated_total, 1.2)
+
+  def test_reset_rewraps (self):
+    p = self._profiler()
+    p.start()
+    src = Source()
+    got = []
+    def _handle_Ping (event):
+      got.append(event)
+    src.addListener(Ping, _handle_Ping)
+    name = profiler._handler_name(_handle_Ping)
+    src.raiseEvent(Ping)
+    src.raiseEvent(Ping)
+    old = p.handlers[name]
+    self.assertEqual(old.count, 2)
+
+    p.reset()
+    self.assertFalse(name in p.handlers)
+    src.raiseEvent(Ping)
+    self.assertEqual(len(got), 3)
+    self.assertEqual(p.handlers[name].count, 1)
+    self.assertEqual(old.count, 2)
+
+    p.stop()
+    src.raiseEvent(Ping)
+    self.assertEqual(p.handlers[name].count, 1)
+    self.assertTrue(profiler.core.scheduler.slice_hook is None)
+    self.assertTrue(profiler.core.scheduler.timer_hook is None)
+
+  def test_summary (self):
+    p = self._profiler(slow=0.05)
+    long_name = "pox.some.very.long.module.name.which.goes.on.and.on.Task"
+    for name,elapsed in (("a", 0.01), ("b", 0.03), ("c", 0.02),
+                         (long_name, 0.06)):
+      t = FakeTask()
+      t.target = lambda: None
+      t.target.__module__ = "m"
+      t.target.__qualname__ = name
+      p._slice_hook(t, elapsed, 0.001)
+    p._slice_hook(FakeTask(), 0.001, 0)
+
+    lines = p.summary(top=3).split("\n")
+    self.assertTrue(lines[0].startswith("Task"))
+    self.assertTrue(lines[0].endswith("queue max"))
+    tasks = [l.split()[0] for l in lines[1:4]]
+    # Busiest first, long names cut down to fit, and only the top 3
+    self.assertEqual(tasks[0], "..." + ("m." + long_name)[-53:])
+    self.assertEqual(tasks[1:], ["m.b", "m.c"])
+    self.assertEqual(lines[4], "Recent slow slices:")
+    self.assertEqual(len(lines), 6)
+    self.assertTrue(lines[5].split()[1] == "m." + long_name)
+
+    self.assertEqual(len(p.slow_slices), 1)
+    t,name,d = p.slow_slices[0]
+    self.assertEqual((name, d), ("m." + long_name, 0.06))
+
+  def test_snapshot (self):
+    p = self._profiler(slow=0)
+    p.start()
+    p._slice_hook(FakeTask(), 0.002, 0.001)
+    p._wrap_handler(len)("abc")
+    snap = json.loads(json.dumps(p.snapshot()))
+    self.assertEqual(snap['sample'], 1)
+    self.assertTrue(snap['duration'] >= 0)
+    task = snap['tasks'][profiler._task_name(FakeTask())]
+    self.assertEqual(task['count'], 1)
+    self.assertAlmostEqual(task['queue_max'], 0.001)
+    self.assertEqual(snap['handlers']['builtins.len']['count'], 1)
+    self.assertEqual(len(snap['slow_slices']), 1)
+
+  def test_collapsed_stacks (self):
+    p = self._profiler()
+    p._stack_samples["main;run;b"] += 2
+    p._stack_samples["main;run;a"] += 5
+    self.assertEqual(p.collapsed_stacks(), "main;run;a 5\nmain;run;b 2\n")
+
+  def test_web_handler (self):
+    web = MockWebServer()
+    profiler.core.register("WebServer", web)
+    profiler.launch(interval=0)
+    self.profilers.append(profiler.core.profiler)
+    profiler.core.raiseEvent(UpEvent())
+    handler,args = web.handlers["/profiler"]
+    mime,data = args["/stats.json"](None)
+    self.assertEqual(mime, "application/json")
+    self.assertTrue("tasks" in json.loads(data))
+
+  def test_no_web_server (self):
+    profiler.launch(interval=0)
+    self.profilers.append(profiler.core.profiler)
+    profiler.core.raiseEvent(UpEvent())
+    self.assertFalse(profiler.core.hasComponent("WebServer"))
+    # Nothing is left waiting on it
+    self.assertFalse(profiler.core._waiters)
+
+
+if __name__ == '__main__':
+  unittest.main()
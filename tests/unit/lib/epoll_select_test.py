@@ -21,12 +21,13 @@ import socketserver
 import threading
 import socket
 import signal
+import select
 
 from copy import copy
 
 sys.path.append(os.path.dirname(__file__) + "/../../..")
 
-from pox.lib.epoll_select import EpollSelect
+from pox.lib.epoll_select import EpollSelect, SelectorSet
 
 class TCPEcho(socketserver.StreamRequestHandler):
   def handle(self):
@@ -100,5 +101,72 @@ class EpollSelectTest(unittest.TestCase):
       check( ([],[],[]), self.es.select(sockets, [], sockets, 0))
       check( ([],sockets,[]), self.es.select(sockets, sockets, sockets, 0))
 
+class SelectorSetTest(unittest.TestCase):
+  def setUp(self):
+    self.pairs = [socket.socketpair() for _ in range(4)]
+
+  def tearDown(self):
+    for a,b in self.pairs:
+      a.close()
+      b.close()
+
+  def _check_read(self, ss):
+    for a,b in self.pairs:
+      ss.register(a)
+    self.assertEqual(len(ss), 4)
+    self.assertEqual(([],[],[]), ss.poll(0))
+
+    self.pairs[1][1].send(b"x")
+    self.pairs[3][1].send(b"x")
+    rl,wl,xl = ss.poll(0.5)
+    self.assertEqual(sort_fdlists(rl,wl,[]),
+                     sort_fdlists([self.pairs[1][0],self.pairs[3][0]],[],[]))
+
+    ss.unregister(self.pairs[1][0])
+    self.assertFalse(self.pairs[1][0] in ss)
+    self.assertEqual(([self.pairs[3][0]],[],[]), ss.poll(0))
+
+  def test_read(self):
+    ss = SelectorSet()
+    self._check_read(ss)
+    ss.close()
+
+  def test_read_unselectored(self):
+    ss = SelectorSet(use_selectors=False)
+    self.assertFalse(ss.pollable)
+    self._check_read(ss)
+    ss.close()
+
+  def test_write(self):
+    ss = SelectorSet()
+    a = self.pairs[0][0]
+    ss.register(a, read=False, write=True)
+    self.assertEqual(([],[a],[]), ss.poll(0))
+    ss.register(a, read=True, write=False)
+    self.assertEqual(([],[],[]), ss.poll(0))
+    ss.close()
+
+  def test_unregister_closed(self):
+    ss = SelectorSet()
+    a,b = socket.socketpair()
+    ss.register(a)
+    a.close()
+    b.close()
+    ss.unregister(a)
+    self.assertEqual(len(ss), 0)
+    ss.close()
+
+  @unittest.skipUnless(sys.platform.startswith("linux"), "requires Linux")
+  def test_pollable(self):
+    # The set's own fd should become readable when a member is
+    ss = SelectorSet()
+    self.assertTrue(ss.pollable)
+    a,b = self.pairs[0]
+    ss.register(a)
+    self.assertEqual([], select.select([ss],[],[],0)[0])
+    b.send(b"x")
+    self.assertEqual([ss], select.select([ss],[],[],0.5)[0])
+    ss.close()
+
 if __name__ == '__main__':
   unittest.main()
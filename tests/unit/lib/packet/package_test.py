@@ -0,0 +1,65 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import subprocess
+import types
+sys.path.append(os.path.dirname(__file__) + "/../../../..")
+
+import pox.lib.packet as pkt
+from pox.lib.packet.icmp import unreach
+from pox.lib.addresses import IPAddr
+
+
+_lazy_check = """
+import sys
+import pox.lib.packet.ethernet
+import pox.lib.packet as pkt
+import pox.lib.addresses
+assert pkt.ethernet is sys.modules["pox.lib.packet.ethernet"].ethernet
+assert "pox.lib.packet.dhcp" not in sys.modules
+assert pox.lib.addresses._eth_oui_to_name is None
+assert isinstance(pkt.DHCP, type(sys)), pkt.DHCP
+assert pkt.dhcp is pkt.DHCP.dhcp
+print("ok")
+"""
+
+
+class package_test (unittest.TestCase):
+  def test_lazy_imports (self):
+    # Needs a fresh interpreter, since everything is loaded by now here
+    base = os.path.join(os.path.dirname(__file__), "../../../..")
+    out = subprocess.check_output([sys.executable, "-c", _lazy_check],
+                                  cwd=base)
+    self.assertEqual(out.strip(), b"ok")
+
+  def test_names (self):
+    self.assertTrue(isinstance(pkt.IPV4, types.ModuleType))
+    self.assertTrue(isinstance(pkt.ipv4, type))
+    self.assertTrue(isinstance(pkt.igmp, type))
+    self.assertTrue(pkt.tcp_opt is pkt.TCP.tcp_opt)
+    self.assertTrue("ETHER_BROADCAST" in dir(pkt))
+    with self.assertRaises(AttributeError):
+      pkt.no_such_thing
+
+  def test_unreach_payload (self):
+    ip = pkt.ipv4(srcip=IPAddr("1.2.3.4"), dstip=IPAddr("1.2.3.5"),
+                  protocol=pkt.ipv4.UDP_PROTOCOL)
+    u = unreach(raw=b"\0" * 4 + ip.pack() + b"\0" * 8)
+    self.assertTrue(isinstance(u.next, pkt.ipv4))
+    self.assertEqual(u.next.srcip, IPAddr("1.2.3.4"))
+
+
+if __name__ == '__main__':
+  unittest.main()
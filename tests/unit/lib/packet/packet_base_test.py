@@ -0,0 +1,109 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../../..")
+
+from pox.lib.packet import *
+from pox.lib.packet.icmp import echo, TYPE_ECHO_REQUEST
+from pox.lib.packet.packet_base import packet_base
+from pox.lib.addresses import EthAddr, IPAddr
+
+
+def _frame (l4, protocol, vlan_id = None):
+  ip = ipv4(srcip=IPAddr("10.0.0.1"), dstip=IPAddr("10.0.0.2"),
+            protocol=protocol)
+  ip.payload = l4
+  e = ethernet(src=EthAddr("00:00:00:00:00:01"),
+               dst=EthAddr("00:00:00:00:00:02"), type=ethernet.IP_TYPE)
+  if vlan_id is not None:
+    v = vlan(id=vlan_id, eth_type=ethernet.IP_TYPE)
+    v.payload = ip
+    e.type = ethernet.VLAN_TYPE
+    ip = v
+  e.payload = ip
+  return e.pack()
+
+
+class lazy_test (unittest.TestCase):
+  def test_only_parses_what_is_used (self):
+    t = tcp(srcport=1234, dstport=80, off=5)
+    t.payload = b"hello!"
+    data = _frame(t, ipv4.TCP_PROTOCOL)
+    e = ethernet.unpack_lazy(data)
+    self.assertFalse('src' in vars(e))
+    self.assertEqual(e.src, EthAddr("00:00:00:00:00:01"))
+    self.assertTrue(e.parsed)
+
+    # The IP header is there, but hasn't been parsed
+    ip = vars(e)['next']
+    self.assertTrue(isinstance(ip, ipv4))
+    self.assertFalse('srcip' in vars(ip))
+
+    t = e.find('tcp')
+    self.assertEqual(t.dstport, 80)
+    self.assertEqual(t.payload, b"hello!")
+    self.assertTrue(t.prev is ip)
+    self.assertEqual(e.pack(), data)
+
+  def test_same_as_unpack (self):
+    u = udp(srcport=1234, dstport=53)
+    u.payload = b"x" * 20
+    c = icmp(type=TYPE_ECHO_REQUEST)
+    c.payload = echo(id=1, seq=2)
+    short = tcp(srcport=1, dstport=2)
+    frames = [
+      _frame(u, ipv4.UDP_PROTOCOL, vlan_id=5),
+      _frame(c, ipv4.ICMP_PROTOCOL),
+      _frame(short, ipv4.TCP_PROTOCOL)[:40], # Truncated TCP header
+      b"\x00" * 10,
+    ]
+    for data in frames:
+      eager = ethernet(data)
+      lazy = ethernet.unpack_lazy(data)
+      self.assertEqual(lazy.dump(), eager.dump())
+      self.assertEqual(lazy.pack(), eager.pack())
+
+    # A payload header which doesn't parse turns into bytes
+    lazy = ethernet.unpack_lazy(frames[2])
+    self.assertEqual(lazy.next.next, ethernet(frames[2]).next.next)
+    self.assertTrue(isinstance(lazy.next.next, bytes))
+
+  def test_set_before_parse (self):
+    u = udp(srcport=1234, dstport=99)
+    u.payload = b"data"
+    data = _frame(u, ipv4.UDP_PROTOCOL)
+    ip = ethernet.unpack_lazy(data).next
+    self.assertFalse('srcip' in vars(ip))
+    ip.dstip = IPAddr("9.9.9.9")
+    self.assertEqual(ip.srcip, IPAddr("10.0.0.1"))
+    self.assertEqual(ip.dstip, IPAddr("9.9.9.9"))
+
+    e = ethernet.unpack_lazy(data)
+    e.next.next.payload = b"other"
+    self.assertEqual(e.next.next.srcport, 1234)
+    self.assertEqual(e.next.next.payload, b"other")
+
+  def test_parsed_headers_are_plain (self):
+    # Once parsed, lazy headers are just like any others
+    data = _frame(tcp(srcport=1, dstport=2, off=5), ipv4.TCP_PROTOCOL)
+    e = ethernet.unpack_lazy(data)
+    self.assertTrue(isinstance(e, ethernet))
+    self.assertEqual(e.dst, EthAddr("00:00:00:00:00:02"))
+    self.assertTrue(type(e) is ethernet)
+    self.assertFalse(hasattr(packet_base, '__getattr__'))
+    t = e.find('tcp')
+    self.assertTrue(type(t) is tcp)
+    self.assertTrue(type(t.prev) is ipv4)
+    self.assertTrue(isinstance(t.payload, bytes))
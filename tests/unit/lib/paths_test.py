@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import random
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.graph.paths import ShortestPaths
+import pox.lib.graph.paths as paths_module
+
+
+def brute_force (edges, src):
+  """
+  Bellman-Ford distances from src over {(u,v):weight}
+  """
+  dist = {src:0}
+  for _ in range(len(edges) + 1):
+    changed = False
+    for (u,v),w in edges.items():
+      if u in dist and (v not in dist or dist[u] + w < dist[v]):
+        dist[v] = dist[u] + w
+        changed = True
+    if not changed: break
+  return dist
+
+
+class ShortestPathsTest (unittest.TestCase):
+  dense = False
+
+  def make (self):
+    return ShortestPaths(dense=self.dense)
+
+  def check (self, sp, edges, nodes):
+    to = dict((dst, brute_force(dict(((v,u),w) for (u,v),w in edges.items()),
+                                dst))
+              for dst in nodes)
+    for src in nodes:
+      for dst in nodes:
+        self.assertEqual(sp.reverse_tree(dst)[0].get(src), to[dst].get(src))
+        hops = [v for (u,v),w in edges.items()
+                if u == src and src != dst and v in to[dst]
+                and src in to[dst] and to[dst][v] + w == to[dst][src]]
+        self.assertEqual(sorted(sp.next_hops(src, dst)), sorted(hops))
+
+    for src in nodes:
+      expected = brute_force(edges, src)
+      for dst in nodes:
+        self.assertEqual(sp.distance(src, dst), expected.get(dst))
+        p = sp.path(src, dst)
+        if dst not in expected:
+          self.assertEqual(p, None)
+          continue
+        self.assertEqual(p[0], src)
+        self.assertEqual(p[-1], dst)
+        self.assertEqual(sum(edges[e] for e in zip(p[:-1], p[1:])),
+                         expected[dst])
+
+  def churn (self, weights):
+    r = random.Random(1)
+    nodes = list(range(12))
+    sp = self.make()
+    edges = {}
+    for _ in range(300):
+      u,v = r.sample(nodes, 2)
+      if (u,v) in edges and r.random() < 0.6:
+        del edges[(u,v)]
+        self.assertTrue(sp.remove_edge(u, v))
+      else:
+        w = r.choice(weights)
+        edges[(u,v)] = w
+        sp.set_edge(u, v, w)
+      # Only look at a few sources, so some trees are left stale-able
+      for src in r.sample(nodes, 3):
+        expected = brute_force(edges, src)
+        for dst in nodes:
+          self.assertEqual(sp.distance(src, dst), expected.get(dst))
+      for dst in r.sample(nodes, 2):
+        sp.next_hops(r.choice(nodes), dst)
+    self.check(sp, edges, nodes)
+
+  def test_unit_weights (self):
+    self.churn([1])
+
+  def test_weights (self):
+    self.churn([1, 2, 5])
+
+  def test_basic (self):
+    sp = self.make()
+    for u,v in (("a","b"), ("b","c"), ("c","d"), ("a","d")):
+      sp.set_edge(u, v)
+      sp.set_edge(v, u)
+    self.assertEqual(sp.path("a", "a"), ["a"])
+    self.assertEqual(sp.path("a", "d"), ["a", "d"])
+    self.assertEqual(len(sp.path("b", "d")), 3)
+    self.assertEqual(sp.path("a", "x"), None)
+    self.assertEqual(sp.path("x", "a"), None)
+    self.assertFalse(sp.remove_edge("a", "c"))
+
+  def test_invalidation (self):
+    # A line a-b-c-d, plus an unconnected e
+    sp = self.make()
+    for u,v in (("a","b"), ("b","c"), ("c","d")):
+      sp.set_edge(u, v)
+      sp.set_edge(v, u)
+    sp.add_node("e")
+    for n in "abcde":
+      sp.tree(n)
+    self.assertEqual(sp.computed, 5)
+
+    # Makes no path shorter for anyone
+    sp.set_edge("e", "a")
+    self.assertEqual(sp.invalidated, 1) # Only e's own tree
+    sp.tree("e")
+
+    # Shortcut a->d only affects trees where it's shorter (a's and e's)
+    sp.set_edge("a", "d")
+    self.assertEqual(sp.invalidated, 3)
+    self.assertEqual(sp.path("a", "d"), ["a", "d"])
+
+    # Only trees using c->d are affected (b's and c's)
+    for n in "abcde":
+      sp.tree(n)
+    sp.remove_edge("c", "d")
+    self.assertEqual(sp.invalidated, 5)
+    self.assertEqual(sp.distance("b", "d"), 2)
+    self.assertEqual(sp.distance("c", "d"), 3)
+
+  def test_next_hops (self):
+    # A little leaf/spine
+    sp = self.make()
+    for spine in ("s1", "s2", "s3"):
+      for leaf in ("l1", "l2"):
+        sp.set_edge(spine, leaf)
+        sp.set_edge(leaf, spine)
+    self.assertEqual(sorted(sp.next_hops("l1", "l2")), ["s1", "s2", "s3"])
+    self.assertEqual(sp.next_hops("s1", "l2"), ["l2"])
+    self.assertEqual(sp.next_hops("l2", "l2"), [])
+    sp.remove_edge("s2", "l2")
+    self.assertEqual(sorted(sp.next_hops("l1", "l2")), ["s1", "s3"])
+    sp.set_edge("s2", "l2")
+    self.assertEqual(sorted(sp.next_hops("l1", "l2")), ["s1", "s2", "s3"])
+
+  def test_remove_node (self):
+    sp = self.make()
+    for u,v in (("a","b"), ("b","c")):
+      sp.set_edge(u, v)
+      sp.set_edge(v, u)
+    self.assertEqual(sp.distance("a", "c"), 2)
+    sp.remove_node("b")
+    self.assertEqual(sp.path("a", "c"), None)
+    self.assertFalse("b" in sp)
+    sp.set_edge("a", "c")
+    self.assertEqual(sp.path("a", "c"), ["a", "c"])
+
+
+@unittest.skipIf(paths_module.numpy is None, "NumPy is not installed")
+class DenseShortestPathsTest (ShortestPathsTest):
+  dense = True
+
+  def test_growth (self):
+    sp = self.make()
+    for i in range(99):
+      sp.set_edge(i, i+1)
+    self.assertEqual(sp.distance(0, 99), 99)
+    sp.remove_node(50)
+    self.assertEqual(sp.path(0, 99), None)
+    sp.set_edge(49, "x")
+    sp.set_edge("x", 51)
+    self.assertEqual(sp.distance(0, 99), 99)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import unittest
+import sys
+import os.path
+import socket
+import threading
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.recoco import Scheduler, Timer, Task, BaseTask, Select, Sleep
+from pox.lib.recoco.recoco import _Deadlines
+from pox.lib.recoco.asyncio_scheduler import AsyncioScheduler
+
+
+class DeadlinesTest (unittest.TestCase):
+  def test_order_and_cancel (self):
+    d = _Deadlines()
+    entries = {}
+    for i in (5, 3, 9, 1, 7, 3):
+      entries[i] = d.push(i, i)
+    d.cancel(entries[9])
+    d.cancel(entries[9])
+    self.assertEqual(len(d), 5)
+    self.assertEqual(d.next_time(), 1)
+    out = []
+    d.pop_due(5, out)
+    self.assertEqual(out, [1, 3, 3, 5])
+    d.cancel(entries[1]) # Already popped; no effect
+    self.assertEqual(len(d), 1)
+    d.pop_due(100, out)
+    self.assertEqual(out, [1, 3, 3, 5, 7])
+    self.assertEqual(d.next_time(), None)
+
+  def test_compaction (self):
+    d = _Deadlines()
+    entries = [d.push(i, i) for i in range(1000)]
+    for e in entries[:900]:
+      d.cancel(e)
+    self.assertEqual(len(d), 100)
+    self.assertTrue(len(d._heap) < 500)
+    out = []
+    d.pop_due(2000, out)
+    self.assertEqual(out, list(range(900, 1000)))
+
+
+class Recorder (BaseTask):
+  def __init__ (self, name, log, priority = 1, slices = 1):
+    BaseTask.__init__(self, name, log, slices)
+    self.priority = priority
+
+  def run (self, name, log, slices):
+    for _ in range(slices):
+      log.append(name)
+      yield 0
+
+
+class RunQueueTest (unittest.TestCase):
+  def setUp (self):
+    self.scheduler = Scheduler(isDefaultScheduler=False, startInThread=False,
+                               threaded_selecthub=False)
+
+  def _run_all (self):
+    while self.scheduler.cycle(): pass
+
+  def test_levels (self):
+    s = self.scheduler
+    log = []
+    Recorder("low", log, priority=0.5, slices=3).start(s, fast=True)
+    Recorder("normal", log, slices=6).start(s, fast=True)
+    Recorder("high", log, priority=2, slices=10).start(s, fast=True)
+    self._run_all()
+    # Each round is up to 4 high, 2 normal, 1 low
+    self.assertEqual(log, ["high"] * 4 + ["normal"] * 2 + ["low"]
+                          + ["high"] * 4 + ["normal"] * 2 + ["low"]
+                          + ["high"] * 2 + ["normal"] * 2 + ["low"])
+    self.assertEqual(len(s), 0)
+
+  def test_first (self):
+    s = self.scheduler
+    log = []
+    Recorder("high", log, priority=2).start(s, fast=True)
+    s.fast_schedule(Recorder("first", log, priority=0.5), first=True)
+    self._run_all()
+    self.assertEqual(log, ["first", "high"])
+
+  def test_schedule_and_stats (self):
+    s = self.scheduler
+    log = []
+    t = Recorder("a", log, slices=2)
+    s._thread = threading.current_thread()
+    self.assertTrue(s.schedule(t))
+    self.assertFalse(s.schedule(t)) # Already scheduled
+    self.assertEqual(len(s), 1)
+    time.sleep(0.01)
+    self._run_all()
+    self.assertEqual(log, ["a", "a"])
+    self.assertEqual(t.run_count, 3) # Two yields and then the end
+    self.assertTrue(t.queue_time >= 0.01)
+    self.assertTrue(t.max_queue_time >= 0.01)
+    self.assertTrue(t.run_time > 0)
+
+  def test_slice_hook (self):
+    s = self.scheduler
+    log = []
+    slices = []
+    s.slice_hook = lambda task, elapsed, waited: slices.append(task)
+    t = Recorder("a", log, slices=2)
+    t.start(s, fast=True)
+    self._run_all()
+    self.assertEqual(slices, [t, t, t])
+
+
+class SchedulerTest (unittest.TestCase):
+  def setUp (self):
+    self.scheduler = Scheduler(isDefaultScheduler=False, daemon=True)
+
+  def tearDown (self):
+    self.scheduler.quit()
+    self.scheduler._selectHub._cycle()
+
+  def _wait (self, event):
+    self.assertTrue(event.wait(5), "Timed out")
+
+  def test_timers (self):
+    fired = []
+    done = threading.Event()
+    s = self.scheduler
+    def cb (name):
+      fired.append(name)
+      if name == "last": done.set()
+    Timer(0.05, cb, args=("b",), scheduler=s)
+    Timer(0.01, cb, args=("a",), scheduler=s)
+    Timer(0.03, cb, args=("cancelled",), scheduler=s).cancel()
+    t = Timer(0.02, cb, args=("not started",), scheduler=s, started=False)
+    Timer(0.1, cb, args=("last",), scheduler=s)
+    self._wait(done)
+    self.assertEqual(fired, ["a", "b", "last"])
+    self.assertFalse(t._started)
+
+  def test_timer_hook (self):
+    s = self.scheduler
+    hooked = []
+    done = threading.Event()
+    def cb ():
+      time.sleep(0.01)
+    def hook (timer, elapsed):
+      hooked.append((timer._callback, elapsed))
+      done.set()
+    s.timer_hook = hook
+    Timer(0.01, cb, scheduler=s)
+    self._wait(done)
+    self.assertEqual(len(hooked), 1)
+    self.assertTrue(hooked[0][0] is cb)
+    self.assertTrue(hooked[0][1] >= 0.009)
+
+  def test_recurring (self):
+    count = [0]
+    done = threading.Event()
+    def cb ():
+      count[0] += 1
+      if count[0] == 3:
+        done.set()
+        return False # Stop
+    Timer(0.01, cb, recurring=True, scheduler=self.scheduler)
+    self._wait(done)
+    time.sleep(0.05)
+    self.assertEqual(count[0], 3)
+
+  def test_many_timers (self):
+    fired = []
+    done = threading.Event()
+    s = self.scheduler
+    # (Leave plenty of time to set them up, since each start and cancel has
+    # to reach the scheduler thread when it's an AsyncioScheduler.)
+    timers = [Timer(0.3 + i * 0.0001, fired.append, args=(i,), scheduler=s)
+              for i in range(2000)]
+    for t in timers[::2]: t.cancel()
+    Timer(0.7, done.set, scheduler=s)
+    self._wait(done)
+    self.assertEqual(fired, list(range(1, 2000, 2)))
+
+  def test_select (self):
+    a,b = socket.socketpair()
+    results = []
+    done = threading.Event()
+    def run ():
+      # Times out
+      results.append((yield Select([a], [], [], 0.05)))
+      # Readable
+      b.send(b"x")
+      rl,wl,xl = yield Select([a], [], [], 5)
+      results.append(rl == [a])
+      a.recv(1)
+      yield Sleep(0.01)
+      done.set()
+    Task(target=run).start(scheduler=self.scheduler)
+    self._wait(done)
+    self.assertEqual(results, [([],[],[]), True])
+    self._assert_not_waiting(a)
+    a.close()
+    b.close()
+
+  def _assert_not_waiting (self, sock):
+    self.assertNotIn(sock, self.scheduler._selectHub._rl)
+
+  def test_call_later_batches (self):
+    s = self.scheduler
+    results = {}
+    done = threading.Event()
+    count = 2000
+    def cb (n, i):
+      results.setdefault(n, []).append(i)
+      if sum(len(r) for r in results.values()) == count * 4: done.set()
+    def submit (n):
+      for i in range(count // 2):
+        s.callLater(cb, n, i)
+      s.callLaterMany([(cb, (n, i)) for i in range(count // 2, count)])
+    threads = [threading.Thread(target=submit, args=(n,)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    self._wait(done)
+    for n in range(4):
+      self.assertEqual(results[n], list(range(count)))
+    self._check_call_later_stats(count * 4)
+
+  def _check_call_later_stats (self, count):
+    t = self.scheduler._callLaterTask
+    self.assertEqual(t.total_calls, count)
+    self.assertTrue(t.total_batches < count)
+    self.assertTrue(t.max_depth > 1)
+    self.assertTrue(t.max_latency >= t.total_latency / t.total_calls)
+    self.assertEqual(t.depth, 0)
+
+  def test_call_later_many_forms (self):
+    results = []
+    done = threading.Event()
+    self.scheduler.callLaterMany([lambda: results.append(1),
+                                  (results.append, (2,)),
+                                  (lambda x=0: results.append(x), (), {'x':3}),
+                                  done.set])
+    self._wait(done)
+    self.assertEqual(results, [1, 2, 3])
+
+  def test_schedule_from_thread (self):
+    s = self.scheduler
+    log = []
+    done = threading.Event()
+    def run ():
+      log.append(1)
+      yield False # Sleep until scheduled again
+      log.append(2)
+      done.set()
+    t = Task(target=run)
+    t.start(scheduler=s)
+    while not log: time.sleep(0.001)
+    s.schedule(t)
+    self._wait(done)
+    self.assertEqual(log, [1, 2])
+
+
+class AsyncioSchedulerTest (SchedulerTest):
+  """
+  Runs the SchedulerTest tests on an AsyncioScheduler, and some more
+  """
+  def setUp (self):
+    self.scheduler = AsyncioScheduler(isDefaultScheduler=False, daemon=True)
+
+  def tearDown (self):
+    self.scheduler.quit()
+    self.scheduler._thread.join(5)
+    self.scheduler.loop.close()
+
+  def _check_call_later_stats (self, count):
+    pass # callLater() is call_soon_threadsafe()
+
+  def _assert_not_waiting (self, sock):
+    for w in self.scheduler._selectHub._waits.values():
+      self.assertNotIn(sock, w.rlist)
+
+  def test_call_later (self):
+    s = self.scheduler
+    results = []
+    done = threading.Event()
+    def cb (x):
+      results.append((x, threading.current_thread() is s._thread))
+      if x == 2: done.set()
+    s.callLater(cb, 1)
+    s.callLater(lambda: 1/0) # Logged, and doesn't stop the loop
+    s.callLater(cb, x=2)
+    self._wait(done)
+    self.assertEqual(results, [(1, True), (2, True)])
+
+  def test_coroutine (self):
+    s = self.scheduler
+    a,b = socket.socketpair()
+    async def echo ():
+      loop = asyncio.get_running_loop()
+      data = await loop.sock_recv(a, 10)
+      await asyncio.sleep(0.01)
+      return data.upper()
+    f = s.run_coroutine(echo())
+    b.send(b"hi")
+    self.assertEqual(f.result(5), b"HI")
+    a.close()
+    b.close()
+
+  def test_bad_fd (self):
+    a,b = socket.socketpair()
+    results = []
+    done = threading.Event()
+    a.close()
+    def run ():
+      results.append((yield Select([a], [], [], 5)))
+      done.set()
+    Task(target=run).start(scheduler=self.scheduler)
+    self._wait(done)
+    self.assertEqual(results, [([], [], [a])])
+    b.close()
+
+  def test_fd_already_waited_on (self):
+    a,b = socket.socketpair()
+    results = []
+    done = threading.Event()
+    first_waiting = threading.Event()
+    def first ():
+      first_waiting.set()
+      results.append(("first", (yield Select([a], [], [], 5))))
+      done.set()
+    second_done = threading.Event()
+    def second ():
+      results.append(("second", (yield Select([a], [], [], 5))))
+      second_done.set()
+    Task(target=first).start(scheduler=self.scheduler)
+    self._wait(first_waiting)
+    time.sleep(0.05)
+    logging.getLogger("recoco").disabled = True
+    try:
+      Task(target=second).start(scheduler=self.scheduler)
+      # Well before the timeout
+      self.assertTrue(second_done.wait(1), "Timed out")
+    finally:
+      logging.getLogger("recoco").disabled = False
+    # The second gets an error right away; the first keeps its wait
+    self.assertEqual(results, [("second", ([], [], [a]))])
+    b.send(b"x")
+    self._wait(done)
+    self.assertEqual(results[1], ("first", ([a], [], [])))
+    self.assertEqual(self.scheduler._selectHub._fd_waits, ({}, {}))
+    a.close()
+    b.close()
+
+  def test_quit (self):
+    s = self.scheduler
+    self.assertFalse(s._allDone)
+    s.quit()
+    s._thread.join(5)
+    self.assertTrue(s._allDone)
+
+
+if __name__ == '__main__':
+  unittest.main()
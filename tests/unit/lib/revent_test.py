@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+from random import Random
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.revent import *
+
+
+class Ping (Event):
+  def __init__ (self, n = 0):
+    self.n = n
+
+class Pong (Event):
+  def _invoke (self, handler, *args, **kw):
+    return handler(self, "pong", *args, **kw)
+
+class Undeclared (Event):
+  pass
+
+class Source (EventMixin):
+  _eventMixin_events = set([Ping, Pong])
+
+
+class Sink (object):
+  def _handle_Ping (self, event):
+    event.n += 1
+
+
+class raise_test (unittest.TestCase):
+  def test_no_listeners (self):
+    s = Source()
+    self.assertIs(s.raiseEvent(Ping, 1), None)
+    self.assertIs(s.raiseEvent(Undeclared), None)
+    e = Ping()
+    self.assertIs(s.raiseEvent(e), e)
+    self.assertIs(e.source, s)
+    self.assertRaises(ReventError, s.raiseEvent, Undeclared())
+
+  def test_return_values (self):
+    s = Source()
+    calls = []
+    def h (name, rv):
+      def handler (event):
+        calls.append(name)
+        return rv
+      return handler
+    s.addListener(Ping, h("a", None))
+    s.addListener(Ping, h("b", False)) # Removes itself
+    s.addListener(Ping, h("c", EventRemove))
+    s.addListener(Ping, h("d", 5))
+    s.addListener(Ping, h("e", EventHaltAndRemove))
+    s.addListener(Ping, h("f", None))
+    e = s.raiseEvent(Ping)
+    self.assertTrue(e.halt)
+    self.assertEqual(calls, list("abcde"))
+    del calls[:]
+    e = s.raiseEvent(Ping)
+    self.assertFalse(e.halt)
+    self.assertEqual(calls, list("adf"))
+
+  def test_halt_attribute (self):
+    s = Source()
+    calls = []
+    def halt_none (event):
+      calls.append(1)
+      event.halt = True
+    def halt_value (event):
+      calls.append(2)
+      event.halt = True
+      return 0
+    def other (event):
+      calls.append(3)
+    # Setting .halt only stops later handlers if the handler returns a value
+    s.addListener(Ping, halt_none)
+    s.addListener(Ping, halt_value)
+    s.addListener(Ping, other)
+    self.assertTrue(s.raiseEvent(Ping).halt)
+    self.assertEqual(calls, [1, 2])
+
+  def test_once_priority_and_invoke (self):
+    s = Source()
+    calls = []
+    s.addListener(Ping, lambda e: calls.append("low"), priority=-1)
+    s.addListener(Ping, lambda e: calls.append("once"), once=True)
+    s.addListener(Ping, lambda e: calls.append("high"), priority=10)
+    s.addListener(Pong, lambda e, x: calls.append(x))
+    s.raiseEvent(Ping)
+    s.raiseEvent(Ping)
+    s.raiseEvent(Pong)
+    self.assertEqual(calls, ["high", "once", "low", "high", "low", "pong"])
+
+  def test_listener_changes (self):
+    s = Source()
+    sink = Sink()
+    self.assertEqual(s.raiseEvent(Ping, 0), None)
+    listeners = s.addListeners(sink)
+    self.assertEqual(s.raiseEvent(Ping, 0).n, 1)
+    s.addListener(Ping, sink._handle_Ping)
+    self.assertEqual(s.raiseEvent(Ping, 0).n, 2)
+    s.removeListeners(listeners)
+    self.assertEqual(s.raiseEvent(Ping, 0).n, 1)
+    s.clearHandlers()
+    self.assertEqual(s.raiseEvent(Ping, 0), None)
+
+  def test_changes_during_raise (self):
+    # Handlers called are the ones listening when the event was raised
+    s = Source()
+    calls = []
+    def first (event):
+      calls.append(1)
+      s.removeListener(second)
+      s.addListener(Ping, lambda event: calls.append(3))
+    def second (event):
+      calls.append(2)
+    s.addListener(Ping, first, once=True)
+    s.addListener(Ping, second)
+    s.raiseEvent(Ping)
+    self.assertEqual(calls, [1, 2])
+    s.raiseEvent(Ping)
+    self.assertEqual(calls, [1, 2, 3])
+
+  def test_weak (self):
+    s = Source()
+    sink = Sink()
+    s.addListener(Ping, sink._handle_Ping, weak=True)
+    self.assertEqual(s.raiseEvent(Ping, 0).n, 1)
+    del sink
+    self.assertEqual(s.raiseEvent(Ping, 0), None)
+
+  def test_same_as_slow_path (self):
+    rand = Random(0)
+    returns = [None, None, None, True, False, 1, 0, (), (False,), (True,),
+               EventHalt, EventRemove, EventHaltAndRemove, EventContinue]
+    for _ in range(300):
+      results = []
+      sources = []
+      seed = rand.random()
+      for slow in (False, True):
+        r = Random(seed)
+        s = Source()
+        sources.append(s)
+        calls = []
+        results.append(calls)
+        for i in range(r.randint(1, 6)):
+          rv = r.choice(returns)
+          sets_halt = r.random() < 0.1
+          def handler (event, i=i, rv=rv, sets_halt=sets_halt):
+            calls.append(i)
+            if sets_halt: event.halt = True
+            return rv
+          s.addListener(Ping, handler, once=r.random() < 0.2,
+                        priority=r.choice([0, 0, 0, 1, -1]))
+        for _ in range(4):
+          if slow:
+            e = s._eventMixin_raise(Ping(), Ping, True, (), {})
+          else:
+            e = s.raiseEvent(Ping)
+          calls.append(e is not None and e.halt)
+      self.assertEqual(results[0], results[1])
+      self.assertEqual(sources[0]._eventMixin_get_listener_count(),
+                       sources[1]._eventMixin_get_listener_count())
+
+  def test_handler_wrapper (self):
+    import pox.lib.revent.revent as revent
+    s = Source()
+    calls = []
+    s.addListener(Ping, lambda event: calls.append("handler"))
+    s.raiseEvent(Ping) # Compiles the dispatch function
+    def wrapper (handler):
+      def wrapped (event):
+        calls.append("wrapped")
+        return handler(event)
+      return wrapped
+    revent.set_handler_wrapper(wrapper)
+    try:
+      s.raiseEvent(Ping)
+    finally:
+      revent.set_handler_wrapper(None)
+    s.raiseEvent(Ping)
+    self.assertEqual(calls, ["handler", "wrapped", "handler", "handler"])
+
+
+class listener_test (unittest.TestCase):
+  def test_priority_order (self):
+    # Same order as a stable sort by priority, highest first
+    r = Random(0)
+    for _ in range(50):
+      s = Source()
+      calls = []
+      expected = []
+      for i in range(r.randint(1, 20)):
+        priority = r.choice([0, 0, 0, 1, 2, -1, 5])
+        s.addListener(Ping, lambda event, i=i: calls.append(i),
+                      priority=priority)
+        expected.append((priority, i))
+      expected.sort(key=lambda x: x[0], reverse=True)
+      s.raiseEvent(Ping)
+      self.assertEqual(calls, [i for p,i in expected])
+
+  def test_remove (self):
+    s = Source()
+    sink = Sink()
+    calls = []
+    def f (event):
+      calls.append(event)
+    eid1 = s.addListener(Ping, f)
+    eid2 = s.addListener(Pong, f)
+    s.addListener(Ping, sink._handle_Ping)
+    self.assertEqual(s._eventMixin_get_listener_count(), 3)
+    self.assertTrue(s.removeListener(eid1))
+    self.assertFalse(s.removeListener(eid1))
+    self.assertFalse(s.removeListener(eid2[1], Ping)) # Wrong type
+    self.assertTrue(s.removeListener(eid2[1]))
+    self.assertFalse(s.removeListener(f))
+    self.assertTrue(s.removeListener(sink._handle_Ping))
+    self.assertEqual(s._eventMixin_get_listener_count(), 0)
+    self.assertEqual(s.raiseEvent(Ping), None)
+    s.addListener(Ping, f)
+    s.addListener(Pong, f)
+    self.assertFalse(s.removeListener(f, Undeclared))
+    self.assertTrue(s.removeListener(f, Pong))
+    s.raiseEvent(Pong)
+    self.assertEqual(calls, [])
+    s.raiseEvent(Ping)
+    self.assertEqual(len(calls), 1)
+
+  def test_remove_listeners_of (self):
+    s = Source()
+    sink = Sink()
+    other = Sink()
+    s.addListeners(sink)
+    s.addListener(Ping, sink._handle_Ping, weak=True)
+    s.addListener(Ping, other._handle_Ping)
+    self.assertEqual(s.raiseEvent(Ping, 0).n, 3)
+    self.assertEqual(s.removeListenersOf(sink), 2)
+    self.assertEqual(s.removeListenersOf(sink), 0)
+    self.assertEqual(s.raiseEvent(Ping, 0).n, 1)
+    self.assertEqual(s._eventMixin_owners.keys(), set([id(other)]))
+
+
+if __name__ == '__main__':
+  unittest.main()
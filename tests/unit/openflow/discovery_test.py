@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import struct
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.core import POXCore
+from pox.lib.revent import EventMixin
+from pox.lib.addresses import EthAddr
+from pox.openflow import PortStatus, ConnectionUp, ConnectionDown
+import pox.openflow.discovery as discovery
+import pox.openflow.libopenflow_01 as of
+import pox.lib.packet as pkt
+
+
+class MockConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.congested = False
+    self.sent = []
+
+  def send (self, data):
+    self.sent.append(data)
+
+
+class MockNexus (EventMixin):
+  _eventMixin_events = set([PortStatus, ConnectionUp, ConnectionDown])
+
+  def __init__ (self):
+    self.connections = {}
+
+  def getConnection (self, dpid):
+    return self.connections.get(dpid)
+
+  def sendToDPID (self, dpid, data):
+    self.connections[dpid].send(data)
+
+
+class LLDPSenderTest (unittest.TestCase):
+  def setUp (self):
+    self.old_core = discovery.core
+    discovery.core = POXCore(handle_signals=False)
+    self.nexus = MockNexus()
+    discovery.core.register("openflow", self.nexus)
+    self.sender = discovery.LLDPSender(5)
+    self.ports = {1:4, 2:1, 3:2} # dpid -> number of ports
+    for dpid,count in self.ports.items():
+      self.nexus.connections[dpid] = MockConnection(dpid)
+      for port in range(1, count + 1):
+        self.sender.add_port(dpid, port, EthAddr("02:00:00:00:00:%02x" % port),
+                             set_timer = False)
+    for con in self.nexus.connections.values():
+      # Forget about the packets sent immediately
+      con.sent = []
+
+  def tearDown (self):
+    discovery.core.scheduler.quit()
+    discovery.core = self.old_core
+
+  def run_cycle (self):
+    # One packet per run, so we need one run per switch at least
+    self.sender._send_chunk_size = 1
+    order = []
+    for _ in range(10):
+      before = dict((d, len(c.sent)) for d,c in self.nexus.connections.items())
+      self.sender._timer_handler()
+      for d,c in self.nexus.connections.items():
+        if len(c.sent) != before[d]: order.append(d)
+    return order
+
+  def test_batched (self):
+    order = self.run_cycle()
+    self.assertEqual(order[:3], [1, 2, 3])
+    for dpid,con in self.nexus.connections.items():
+      # Each switch gets all of its packets in one write each time
+      self.assertTrue(len(con.sent) >= 1)
+      self.assertEqual(len(set(con.sent)), 1)
+      data = con.sent[0]
+      packets = list(self.sender._packets[dpid].values())
+      self.assertEqual(data, b''.join(packets))
+    stats = self.sender.last_cycle
+    self.assertEqual(stats['switches'], 3)
+    self.assertEqual(stats['packets'], 7)
+    self.assertEqual(stats['deferred'], 0)
+
+  def test_congested (self):
+    self.nexus.connections[1].congested = True
+    order = self.run_cycle()
+    # Put off once, then sent anyway
+    self.assertEqual(order[:3], [2, 3, 1])
+    self.assertEqual(self.sender.last_cycle['deferred'], 1)
+
+  def test_disconnected (self):
+    # Switches we have packets for but no connection to don't spin
+    self.nexus.connections.clear()
+    self.run_cycle()
+    self.assertEqual(self.sender._queued, set([1, 2, 3]))
+
+  def test_template (self):
+    # Patched packets are just like ones built from scratch
+    sender = self.sender
+    for dpid in (1, 0x123456789abc):
+      for port in (1, 9, 10, 48, 100, 65000, of.OFPP_LOCAL):
+        mac = EthAddr("02:00:00:00:%02x:%02x" % (port >> 8, port & 0xff))
+        packet = sender.create_packet_out(dpid, port, mac)
+        eth = sender._create_discovery_packet(dpid, port, mac, sender._ttl)
+        po = of.ofp_packet_out(action = of.ofp_action_output(port=port))
+        po.data = eth.pack()
+        po.xid = struct.unpack_from("!L", packet, 4)[0]
+        self.assertEqual(packet, po.pack())
+        parsed = pkt.ethernet(packet[24:])
+        self.assertEqual(parsed.src, mac)
+        self.assertEqual(parsed.next.tlvs[1].id, str(port).encode())
+    sender.del_switch(1, set_timer = False)
+    self.assertTrue(all(k[0] != 1 for k in sender._templates))
+
+  def test_del (self):
+    self.sender.del_switch(2, set_timer = False)
+    self.sender.del_port(1, 4, set_timer = False)
+    self.sender.del_port(3, 1, set_timer = False)
+    self.sender.del_port(3, 2, set_timer = False)
+    self.assertEqual(self.sender._num_packets, 3)
+    order = self.run_cycle()
+    self.assertEqual(set(order), set([1]))
+    self.assertEqual(self.sender._queued, set([1]))
+
+
+if __name__ == '__main__':
+  unittest.main()
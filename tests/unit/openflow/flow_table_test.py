@@ -23,6 +23,7 @@ import unittest
 import sys
 import os.path
 import itertools
+from random import Random
 
 sys.path.append(os.path.dirname(__file__) + "/../../..")
 from pox.openflow.libopenflow_01 import *
@@ -111,7 +112,140 @@ class FlowTableTest(unittest.TestCase):
       t.remove_expired_entries(now=time)
       self.assertEqual(sorted([e.cookie for e in t.entries]), remaining)
 
-  # def test_check_for_overlap_entries(self):
+  def test_remove_expired_entries_touched(self):
+    """ expiration agrees with is_expired() as entries are touched """
+    rand = Random(1)
+    t = FlowTable()
+    removed = []
+    t.addListener(FlowTableModification,
+                  lambda event: removed.append((event.reason, event.removed)))
+    for i in range(200):
+      t.add_entry(TableEntry(now=0, cookie=i, priority=i % 7,
+                             idle_timeout=rand.choice((0, 2, 5)),
+                             hard_timeout=rand.choice((0, 10, 20))))
+    t.remove_entry(t.entries[0])
+    for now in range(1, 30):
+      for e in t.entries:
+        if rand.random() < 0.3: e.touch_packet(1, now=now)
+      expected = [e for e in t.entries if e.is_expired(now + 0.5)]
+      del removed[:]
+      t.remove_expired_entries(now=now + 0.5)
+      self.assertEqual(sorted(e.cookie for r,es in removed for e in es),
+                       sorted(e.cookie for e in expected))
+      for reason,entries in removed:
+        self.assertIn(reason, (OFPRR_IDLE_TIMEOUT, OFPRR_HARD_TIMEOUT))
+        for e in entries:
+          self.assertEqual(reason == OFPRR_IDLE_TIMEOUT,
+                           e.is_idle_timed_out(now + 0.5))
+      self.assertFalse(any(e.is_expired(now + 0.5) for e in t.entries))
+
+  def _packet(self, src=1, dst=2, srcip="10.0.0.1", dstip="10.0.0.2",
+              srcport=1000, dstport=80):
+    from pox.lib.packet import ethernet, ipv4, tcp
+    t = tcp(srcport=srcport, dstport=dstport)
+    ip = ipv4(srcip=IPAddr(srcip), dstip=IPAddr(dstip),
+              protocol=ipv4.TCP_PROTOCOL)
+    ip.payload = t
+    e = ethernet(src=EthAddr("00:00:00:00:00:%02x" % src),
+                 dst=EthAddr("00:00:00:00:00:%02x" % dst),
+                 type=ethernet.IP_TYPE)
+    e.payload = ip
+    return e
+
+  def test_entry_for_packet(self):
+    t = FlowTable()
+    low = TableEntry(priority=1, cookie=1, match=ofp_match())
+    subnet = TableEntry(priority=5, cookie=2,
+                        match=ofp_match(dl_type=0x800, nw_dst="10.0.0.0/24"))
+    port = TableEntry(priority=5, cookie=3,
+                      match=ofp_match(dl_type=0x800, nw_proto=6, tp_dst=80))
+    for e in (low, subnet, port):
+      t.add_entry(e)
+    self.assertIs(t.entry_for_packet(self._packet(dstip="10.0.1.2"), 1), port)
+    self.assertIs(t.entry_for_packet(self._packet(dstip="10.0.1.2",
+                                                  dstport=22), 1), low)
+    # subnet and port have the same priority; the newer one wins
+    self.assertIs(t.entry_for_packet(self._packet(), 1), port)
+    exact = ofp_match.from_packet(self._packet(), 1, spec_frags=True)
+    exact = TableEntry(priority=0, cookie=4, match=exact)
+    t.add_entry(exact)
+    self.assertIs(t.entry_for_packet(self._packet(), 1), exact)
+    self.assertIs(t.entry_for_packet(self._packet(), 2), port)
+    t.remove_entry(exact)
+    t.remove_entry(port)
+    self.assertIs(t.entry_for_packet(self._packet(), 1), subnet)
+    t.remove_matching_entries(ofp_match(), strict=False)
+    self.assertIs(t.entry_for_packet(self._packet(), 1), None)
+    self.assertEqual(len(t), 0)
+
+  def test_index_matches_scan(self):
+    """ indexed lookups give the same results as a linear scan """
+    rand = Random(0)
+    def random_match():
+      m = ofp_match()
+      if rand.random() < 0.3: m.in_port = rand.randint(1, 3)
+      if rand.random() < 0.3:
+        m.dl_src = EthAddr("00:00:00:00:00:%02x" % rand.randint(1, 3))
+      if rand.random() < 0.5:
+        m.dl_type = 0x800
+        if rand.random() < 0.5: m.nw_proto = 6
+        if rand.random() < 0.5:
+          m.nw_dst = (IPAddr("10.0.%i.%i" % (rand.randint(0, 1),
+                                             rand.randint(0, 3))),
+                      rand.choice((8, 16, 24, 30, 32)))
+        if rand.random() < 0.3:
+          m.tp_dst = rand.choice((22, 80))
+      return m
+
+    t = FlowTable()
+    for i in range(300):
+      m = random_match()
+      if rand.random() < 0.2:
+        m = ofp_match.from_packet(self._packet(src=rand.randint(1, 3),
+                                  dstip="10.0.1.%i" % rand.randint(0, 3)),
+                                  rand.randint(1, 3), spec_frags=True)
+      t.add_entry(TableEntry(priority=rand.randint(0, 10), cookie=i,
+                             match=m))
+      if rand.random() < 0.1:
+        t.remove_entry(rand.choice(t.entries))
+
+    def scan_for_packet(packet, in_port):
+      pm = ofp_match.from_packet(packet, in_port, spec_frags=True)
+      for e in t.entries:
+        if e.match.matches_with_wildcards(pm, consider_other_wildcards=False):
+          return e
+
+    for i in range(300):
+      p = self._packet(src=rand.randint(1, 3),
+                       dstip="10.0.%i.%i" % (rand.randint(0, 1),
+                                             rand.randint(0, 3)),
+                       dstport=rand.choice((22, 80)))
+      in_port = rand.randint(1, 3)
+      self.assertIs(t.entry_for_packet(p, in_port), scan_for_packet(p, in_port))
+
+    for i in range(100):
+      m = random_match()
+      priority = rand.randint(0, 10)
+      for strict in (False, True):
+        scan = [e for e in t.entries if e.is_matched_by(m, priority, strict)]
+        self.assertEqual(t.matching_entries(m, priority, strict), scan)
+      e = TableEntry(priority=priority, match=m)
+      overlap = any(o.effective_priority == e.effective_priority and
+                    (o.is_matched_by(m) or e.is_matched_by(o.match))
+                    for o in t.entries)
+      self.assertEqual(t.check_for_overlapping_entry(e), overlap)
+
+  def test_check_for_overlap_entries(self):
+    t = FlowTable()
+    t.add_entry(TableEntry(priority=5, match=ofp_match(dl_type=0x800,
+                                                       nw_src="10.0.0.0/8")))
+    narrow = TableEntry(priority=5, match=ofp_match(dl_type=0x800,
+                                                    nw_src="10.1.0.0/16"))
+    self.assertTrue(t.check_for_overlapping_entry(narrow))
+    narrow.priority = 6
+    self.assertFalse(t.check_for_overlapping_entry(narrow))
+    other = TableEntry(priority=5, match=ofp_match(dl_type=0x806))
+    self.assertFalse(t.check_for_overlapping_entry(other))
 
 
 
@@ -23,6 +23,8 @@ sys.path.append(os.path.dirname(__file__) + "/../../..")
 
 from pox.openflow.libopenflow_01 import *
 from pox.datapaths.switch import *
+import pox.lib.packet as pkt
+from random import Random
 
 def extract_num(buf, start, length):
   """ extracts a number from a raw byte string. Assumes network byteorder  """
@@ -83,6 +85,109 @@ class ofp_match_test(unittest.TestCase):
       self.assertEquals(getattr(m, "get_"+attr)(), (None, 0), "get_%s for unset %s should return (None,0)" % (attr, attr))
       self.assertTrue( ((m.wildcards & bitmask) >> shift) >= 32)
 
+  def test_key(self):
+    """ ofp_match: equality and hashing via the cached key """
+    a = ofp_match(in_port=1, dl_type=0x800, nw_src="10.0.0.0/8", tp_dst=80)
+    b = ofp_match(tp_dst=80, nw_src="10.0.0.0/8", dl_type=0x800, in_port=1)
+    self.assertEqual(len(a.key), 40)
+    self.assertEqual(a, b)
+    self.assertEqual(a.hash_code(), b.hash_code())
+
+    # Changing a field must update the key
+    key = b.key
+    b.dl_src = "00:00:00:00:00:01"
+    self.assertNotEqual(b.key, key)
+    self.assertNotEqual(a, b)
+    b.dl_src = None
+    self.assertEqual(b.key, key)
+    self.assertEqual(a, b)
+
+    # Values of wildcarded fields don't matter, but prefix host bits do
+    c = a.clone()
+    c._tp_src = 1234
+    self.assertEqual(a, c)
+    c.nw_src = (IPAddr("10.1.0.0"), 8)
+    self.assertNotEqual(a, c)
+
+    # Different types for the same value are equal
+    self.assertEqual(ofp_match(dl_src="00:00:00:00:00:01"),
+                     ofp_match(dl_src=EthAddr("00:00:00:00:00:01")))
+
+    # Hashing locks the match
+    d = {a:True}
+    self.assertRaises(AttributeError, setattr, a, 'in_port', 2)
+    self.assertRaises(AttributeError, setattr, a, 'nw_dst', "1.2.3.4")
+    self.assertTrue(b in d)
+    self.assertFalse(a.clone()._locked)
+
+  def test_from_packet_data(self):
+    """ ofp_match: from_packet_data() agrees with from_packet() """
+    def eth (payload, type, vlan_id = None):
+      e = pkt.ethernet(src=EthAddr("00:00:00:00:00:01"),
+                       dst=EthAddr("00:00:00:00:00:02"), type=type)
+      if vlan_id is not None:
+        v = pkt.vlan(id=vlan_id, pcp=3, eth_type=type)
+        v.payload = payload
+        e.type = pkt.ethernet.VLAN_TYPE
+        payload = v
+      e.payload = payload
+      return e.pack()
+    def ip (payload, protocol, frag = 0, flags = 0):
+      i = pkt.ipv4(srcip=IPAddr("10.0.0.1"), dstip=IPAddr("10.0.0.2"),
+                   protocol=protocol)
+      i.frag = frag
+      i.flags = flags
+      i.tos = 0x10
+      i.payload = payload
+      return i
+    t = pkt.tcp(srcport=1234, dstport=80, off=5)
+    t_opts = pkt.tcp(srcport=1234, dstport=80, off=6,
+                     options=[pkt.tcp_opt(pkt.tcp_opt.MSS, 1460)])
+    u = pkt.udp(srcport=1234, dstport=53)
+    c = pkt.icmp(type=pkt.TYPE_ECHO_REQUEST, code=0)
+    a = pkt.arp(opcode=pkt.arp.REQUEST, protosrc=IPAddr("10.0.0.1"),
+                protodst=IPAddr("10.0.0.2"))
+    frames = [
+      eth(ip(t, pkt.ipv4.TCP_PROTOCOL), pkt.ethernet.IP_TYPE),
+      eth(ip(t_opts, pkt.ipv4.TCP_PROTOCOL), pkt.ethernet.IP_TYPE),
+      eth(ip(u, pkt.ipv4.UDP_PROTOCOL), pkt.ethernet.IP_TYPE, vlan_id=5),
+      eth(ip(c, pkt.ipv4.ICMP_PROTOCOL), pkt.ethernet.IP_TYPE),
+      eth(ip(u, pkt.ipv4.UDP_PROTOCOL, flags=pkt.ipv4.MF_FLAG),
+          pkt.ethernet.IP_TYPE),
+      eth(ip(b"x" * 8, pkt.ipv4.UDP_PROTOCOL, frag=10),
+          pkt.ethernet.IP_TYPE),
+      eth(a, pkt.ethernet.ARP_TYPE),
+      eth(a, pkt.ethernet.ARP_TYPE, vlan_id=7),
+      eth(b"\xaa\xaa\x03\x00\x00\x00\x08\x00" + b"x" * 20, 28),
+      eth(b"x" * 20, pkt.ethernet.LLDP_TYPE),
+      b"\x00" * 10,
+    ]
+    # Throw in some truncated and mangled ones
+    rand = Random(0)
+    for f in list(frames[:-1]):
+      frames.append(f[:rand.randint(10, len(f))])
+      for _ in range(20):
+        b = bytearray(f)
+        b[rand.randrange(12, len(b))] = rand.randrange(256)
+        frames.append(bytes(b))
+
+    for f in frames:
+      for in_port in (None, 3):
+        for spec_frags in (False, True):
+          try:
+            expected = ofp_match.from_packet(pkt.ethernet(f), in_port,
+                                             spec_frags)
+          except Exception:
+            continue # The parser didn't like it
+          m = ofp_match.from_packet_data(f, in_port, spec_frags)
+          self.assertEqual(m, expected)
+          self.assertEqual(m.wildcards, expected.wildcards)
+          self.assertEqual(m.pack(), expected.pack())
+
+    pi = ofp_packet_in(in_port=2, data=frames[0])
+    self.assertEqual(ofp_match.from_packet(pi).in_port, 2)
+    self.assertEqual(ofp_match.from_packet(pi).tp_dst, 80)
+
   def test_match_with_wildcards(self):
     """ ofp_match: test the matches_with_wildcards method """
     def create(wildcards=(), **kw):
@@ -194,6 +299,13 @@ class ofp_command_test(unittest.TestCase):
     unpacked = type(o)()
     unpacked.unpack(pack)
     self.assertEqual(o, unpacked, "pack_unpacked -- original != unpacked\n===Original:\n%s\n===Repacked:%s\n" % (show(o), show(unpacked)))
+    # unpacking in place from a memoryview (as of_01 does) should match
+    buf = bytearray(b"\xff" * 5) + pack + bytearray(b"\xff" * 3)
+    in_place = type(o)()
+    offset = in_place.unpack(memoryview(buf)[:5+len(pack)], 5)[0]
+    self.assertEqual(offset, 5 + len(pack))
+    buf[:] = b"\x00" * len(buf) # Shouldn't reference the buffer
+    self.assertEqual(o, in_place, "memoryview unpack -- original != unpacked\n===Original:\n%s\n===Repacked:%s\n" % (show(o), show(in_place)))
     return unpacked
 
   def test_header_pack_unpack(self):
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+import threading
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.of_01 import Connection, DefaultOpenFlowHandlers
+from pox.openflow.of_01 import SendFlusher
+import pox.openflow.of_01 as of_01
+from pox.lib.recoco import Scheduler
+from pox.openflow import ConnectionBackpressure, PacketIn, PacketInBatch
+from pox.lib.revent import EventMixin
+from pox.lib.epoll_select import SelectorSet
+
+
+class ChunkedSocket (object):
+  """
+  Hands out data a few bytes at a time
+  """
+  def __init__ (self, data, chunk):
+    self.data = data
+    self.chunk = chunk
+    self.sent = []
+
+  def recv_into (self, buf):
+    n = min(self.chunk, len(buf), len(self.data))
+    buf[:n] = self.data[:n]
+    self.data = self.data[n:]
+    return n
+
+  def send (self, data):
+    self.sent.append(bytes(data))
+    return len(data)
+
+
+class ConnectionReadTest (unittest.TestCase):
+  def _read_all (self, data, chunk, read_size):
+    sock = ChunkedSocket(data, chunk)
+    con = Connection(sock, read_size=read_size)
+    got = []
+    con.handlers = [lambda con, msg: got.append(msg)] * len(con.handlers)
+    while con.read(): pass
+    self.assertEqual(con.buf, b'')
+    return got
+
+  def test_chunked (self):
+    msgs = [of.ofp_packet_in(xid=i, in_port=i, data=b"x" * (i * 37))
+            for i in range(1, 60)]
+    msgs += [of.ofp_echo_request(xid=100, body=b"y" * 60000)]
+    data = b''.join(m.pack() for m in msgs)
+    for chunk,read_size in ((1,8), (7,64), (1000,100), (9000,32768)):
+      got = self._read_all(data, chunk, read_size)
+      self.assertEqual(got, msgs)
+
+
+class FakeNexus (EventMixin):
+  _eventMixin_events = set([PacketIn, PacketInBatch])
+
+
+class PacketInBatchTest (unittest.TestCase):
+  def setUp (self):
+    msgs = [of.ofp_packet_in(xid=i, in_port=i, data=b"x" * 60)
+            for i in range(1, 11)]
+    msgs.insert(5, of.ofp_echo_reply(xid=100))
+    self.data = b''.join(m.pack() for m in msgs)
+    self.con = Connection(ChunkedSocket(self.data, len(self.data)))
+    self.con.handlers = DefaultOpenFlowHandlers().handlers
+    self.con.ofnexus = FakeNexus()
+    self.packet_ins = []
+    self.con.addListener(PacketIn, self.packet_ins.append)
+
+  def test_batch (self):
+    batches = []
+    self.con.ofnexus.addListener(PacketInBatch, batches.append)
+    def halt_odd (event):
+      if event.port % 2: return True # Halt
+    self.con.ofnexus.addListener(PacketIn, halt_odd)
+    self.assertTrue(self.con.read())
+    self.assertEqual(len(batches), 1)
+    self.assertEqual([e.port for e in batches[0].events], [2,4,6,8,10])
+    self.assertEqual(batches[0].events, self.packet_ins)
+    self.assertIs(batches[0].connection, self.con)
+    self.assertIs(self.con._packet_in_batch, None)
+
+  def test_connection_listener (self):
+    batches = []
+    self.con.addListener(PacketInBatch, batches.append)
+    self.assertTrue(self.con.read())
+    self.assertEqual(len(batches), 1)
+    self.assertEqual(batches[0].events, self.packet_ins)
+    self.assertEqual(len(self.packet_ins), 10)
+
+  def test_no_listeners (self):
+    # Without any PacketInBatch listeners, individual events still fire
+    self.assertTrue(self.con.read())
+    self.assertEqual([e.port for e in self.packet_ins], list(range(1, 11)))
+
+
+class ConnectionSendTest (unittest.TestCase):
+  def setUp (self):
+    self.a,self.b = socket.socketpair()
+    self.a.setblocking(0)
+    self.a.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    self.sockets = SelectorSet()
+    self.con = Connection(self.a, selector_set=self.sockets)
+    self.sockets.register(self.con)
+    self.events = []
+    self.con.addListener(ConnectionBackpressure, self.events.append)
+
+  def tearDown (self):
+    self.sockets.close()
+    self.a.close()
+    self.b.close()
+
+  def _drain (self):
+    self.b.setblocking(0)
+    data = b''
+    try:
+      while True:
+        d = self.b.recv(65536)
+        if not d: break
+        data += d
+    except socket.error:
+      pass
+    return data
+
+  def test_backpressure (self):
+    con = self.con
+    con.send_high_water = 20000
+    con.send_low_water = 5000
+    msgs = [of.ofp_echo_request(xid=i, body=b"z" * 1000) for i in range(100)]
+    for m in msgs:
+      con.send(m)
+    self.assertTrue(con.congested)
+    self.assertEqual(len(self.events), 1)
+    self.assertTrue(self.events[0].congested)
+    self.assertTrue(con in self.sockets.write_list)
+
+    data = self._drain()
+    while con.send_queued:
+      con._flush()
+      data += self._drain()
+
+    self.assertFalse(con.congested)
+    self.assertEqual(len(self.events), 2)
+    self.assertFalse(self.events[1].congested)
+    self.assertFalse(con in self.sockets.write_list)
+    expected = b''.join(m.pack() for m in msgs)
+    self.assertTrue(data.endswith(expected))
+
+
+class SendFlusherTest (unittest.TestCase):
+  def setUp (self):
+    self.scheduler = Scheduler(isDefaultScheduler=False, startInThread=False,
+                               threaded_selecthub=False)
+    self.scheduler._thread = threading.current_thread()
+    self.old_flusher = of_01.sendFlusher
+    of_01.sendFlusher = SendFlusher(self.scheduler)
+
+  def tearDown (self):
+    of_01.sendFlusher = self.old_flusher
+
+  def test_coalesce (self):
+    s = self.scheduler
+    sock = ChunkedSocket(b'', 0)
+    con = Connection(sock)
+    while s.cycle(): pass
+    del sock.sent[:] # The hello
+    for rounds in range(3):
+      for i in range(5):
+        con.send(of.ofp_echo_request(xid=i))
+      self.assertEqual(sock.sent, [])
+      while s.cycle(): pass
+      self.assertEqual(sock.sent,
+                       [b''.join(of.ofp_echo_request(xid=i).pack()
+                                 for i in range(5))])
+      del sock.sent[:]
+
+  def test_threads (self):
+    # Sends from several threads at once (with the scheduler running in
+    # its own) all get flushed
+    s = Scheduler(isDefaultScheduler=False, daemon=True)
+    of_01.sendFlusher = SendFlusher(s)
+    try:
+      cons = [Connection(ChunkedSocket(b'', 0)) for _ in range(20)]
+      hello = len(of.ofp_hello().pack())
+      msg = of.ofp_echo_request(xid=1).pack()
+      def sender ():
+        for _ in range(200):
+          for con in cons:
+            con.send(msg)
+      threads = [threading.Thread(target=sender) for _ in range(8)]
+      interval = sys.getswitchinterval()
+      sys.setswitchinterval(1e-6) # Switch threads a lot more
+      try:
+        for t in threads: t.start()
+        for t in threads: t.join()
+      finally:
+        sys.setswitchinterval(interval)
+      expected = hello + len(msg) * 200 * len(threads)
+      deadline = time.time() + 5
+      while time.time() < deadline:
+        if all(sum(len(d) for d in con.sock.sent) == expected
+               for con in cons):
+          break
+        time.sleep(0.01)
+      for con in cons:
+        self.assertEqual(sum(len(d) for d in con.sock.sent), expected)
+        self.assertFalse(con._flush_pending)
+    finally:
+      s.quit()
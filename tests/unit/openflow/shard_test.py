@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.of_01 import Connection
+from pox.openflow.shard import shard_for_dpid, Channel, PendingSwitch
+
+
+class ShardForDPIDTest (unittest.TestCase):
+  def test_spread (self):
+    for count in (1, 2, 3, 8):
+      counts = [0] * count
+      for dpid in range(1, 1001):
+        counts[shard_for_dpid(dpid, count)] += 1
+      self.assertTrue(min(counts) > 1000 / count / 2)
+      # Only the upper bytes differ
+      counts = [0] * count
+      for i in range(1, 101):
+        counts[shard_for_dpid(i << 48, count)] += 1
+      self.assertTrue(min(counts) > 0)
+
+
+class ChannelTest (unittest.TestCase):
+  def test_messages_and_fds (self):
+    a,b = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    got = []
+    sender = Channel(a, None)
+    receiver = Channel(b, lambda c, m, fds: got.append((m, fds)))
+    x,y = socket.socketpair()
+    sender.send(("switch", 1, b"data"), [x])
+    sender.send(("broadcast", "hi", {"n":[1,2]}))
+    self.assertEqual(x.fileno(), -1) # Closed once sent
+    self.assertTrue(receiver.read())
+    self.assertEqual([m for m,fds in got],
+                     [("switch", 1, b"data"), ("broadcast", "hi", {"n":[1,2]})])
+    self.assertEqual(len(got[0][1]), 1)
+    self.assertEqual(got[1][1], [])
+    passed = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, 0, got[0][1][0])
+    passed.send(b"through")
+    self.assertEqual(y.recv(100), b"through")
+    passed.close()
+    y.close()
+    sender.close()
+    self.assertFalse(receiver.read())
+    receiver.close()
+
+
+class FakeFront (object):
+  def __init__ (self):
+    self.handed = []
+  def _hand_off (self, pending, dpid):
+    self.handed.append((dpid, bytes(pending.data)))
+    return True
+
+
+class PendingSwitchTest (unittest.TestCase):
+  def test_handshake (self):
+    front = FakeFront()
+    a,b = socket.socketpair()
+    p = PendingSwitch(a, front)
+    self.assertEqual(b.recv(100)[:4], of.ofp_hello().pack()[:4])
+    hello = of.ofp_hello(xid=5).pack()
+    b.send(hello[:5])
+    self.assertTrue(p.read())
+    b.send(hello[5:])
+    self.assertTrue(p.read())
+    request = of.ofp_features_request()
+    request.unpack(b.recv(100))
+    reply = of.ofp_features_reply(xid=request.xid, datapath_id=0x1234)
+    extra = of.ofp_echo_request(xid=6).pack()
+    b.send(reply.pack() + extra)
+    self.assertFalse(p.read()) # Done
+    self.assertEqual(front.handed, [(0x1234, hello + reply.pack() + extra)])
+    p.close() # Handed off, so this leaves the socket alone
+    self.assertNotEqual(a.fileno(), -1)
+    a.close()
+    b.close()
+
+
+class SentSocket (object):
+  def __init__ (self):
+    self.sent = []
+  def send (self, data):
+    self.sent.append(bytes(data))
+    return len(data)
+
+
+class HandoffTest (unittest.TestCase):
+  def test_take_over (self):
+    sock = SentSocket()
+    data = of.ofp_hello().pack() + of.ofp_features_reply().pack()
+    con = Connection(sock, handoff_data=data)
+    self.assertEqual(con.buf, data)
+    # No hello or features request, just the desc stats request
+    sent = b''.join(sock.sent)
+    self.assertEqual(sent[1], of.OFPT_STATS_REQUEST)
+    self.assertEqual(len(sent), sent[2] << 8 | sent[3])
+
+
+if __name__ == '__main__':
+  unittest.main()